@@ -17,7 +17,7 @@ setup(
         "Development Status :: 4 - Beta",
     ],
     packages=["testify", "testify.utils"],
-	scripts=['bin/testify'],
+	scripts=['bin/testify', 'bin/testify-client'],
 	long_description="""\
 Testify is a replacement for Python's unittest module.  It is modeled after unittest, and tests written for unittest will run under testify with a minimum of adjustments, but it has features above and beyond unittest:
 
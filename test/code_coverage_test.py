@@ -0,0 +1,145 @@
+import os
+import StringIO
+import tempfile
+
+try:
+    import coverage.data
+except ImportError:
+    # it may well not be installed, in which case there is no coverage to check
+    coverage = None
+
+from testify import *
+from testify import code_coverage
+from testify.test_logger import ColorlessTextTestLogger, VERBOSITY_SILENT
+from testify.test_runner import TestRunner
+from test.test_runner_test import PassingTestCase
+
+def covered_function(x):
+    if x:
+        return 'yes'
+    return 'no'
+
+def straight_function():
+    x = 1
+    return x
+
+def covered_lines(function):
+    first_line = function.func_code.co_firstlineno
+    return first_line + 1, first_line + 2, first_line + 3
+
+class ForkedCoveredTestCase(TestCase):
+    __test__ = False
+    fork_test_methods = True
+
+    def test_covered(self):
+        assert_equal(covered_function(True), 'yes')
+
+def source_file(function):
+    """Return the name the coverage package files function's lines under."""
+    return os.path.realpath(os.path.abspath(function.func_code.co_filename))
+
+class ContextCollectorTest(TestCase):
+    __test__ = code_coverage.can_collect
+
+    def test_lines_are_filed_by_context(self):
+        collector = code_coverage.ContextCollector()
+        collector.switch_context('first')
+        collector.start()
+        covered_function(True)
+        collector.switch_context('second')
+        covered_function(False)
+        collector.stop()
+
+        if_line, yes_line, no_line = covered_lines(covered_function)
+        contexts = collector.contexts()
+        assert_equal(contexts['first'][source_file(covered_function)] & set([if_line, yes_line, no_line]), set([if_line, yes_line]))
+        assert_equal(contexts['second'][source_file(covered_function)] & set([if_line, yes_line, no_line]), set([if_line, no_line]))
+
+    def test_only_source_roots_are_traced(self):
+        collector = code_coverage.ContextCollector(source_roots=[os.path.dirname(code_coverage.__file__)])
+        collector.start()
+        covered_function(True)
+        collector.stop()
+        assert_not_in(source_file(covered_function), collector.contexts()[''])
+
+        collector = code_coverage.ContextCollector(source_roots=[os.path.dirname(__file__)])
+        collector.start()
+        covered_function(True)
+        collector.stop()
+        assert_in(source_file(covered_function), collector.contexts()[''])
+
+    def test_estimated_overhead(self):
+        collector = code_coverage.ContextCollector()
+        collector.start()
+        covered_function(True)
+        collector.stop()
+        overhead = collector.estimated_overhead()
+        assert 0.0 <= overhead['harvest_time'] <= overhead['estimated_seconds']
+        assert overhead['traced_time'] > 0.0
+        assert_in("of %.2fs traced" % overhead['traced_time'], code_coverage.format_overhead(overhead))
+
+class DataFileTest(TestCase):
+    def test_merge(self):
+        directory = tempfile.mkdtemp()
+        first_file, second_file, merged_file = [os.path.join(directory, name) for name in ('first', 'second', 'merged')]
+        code_coverage.write_data_file(first_file, {'SomeTestCase': {'a.py': set([1, 2])}})
+        code_coverage.write_data_file(second_file, {'SomeTestCase': {'a.py': set([3])}, 'OtherTestCase': {'b.py': set([1])}})
+        code_coverage.merge(merged_file, [first_file, second_file])
+        assert_equal(code_coverage.read_data_file(merged_file),
+            {'SomeTestCase': {'a.py': set([1, 2, 3])}, 'OtherTestCase': {'b.py': set([1])}})
+
+class CoverageRunTest(TestCase):
+    __test__ = code_coverage.can_collect
+
+    def test_one_data_file_per_run(self):
+        coverage_file = os.path.join(tempfile.mkdtemp(), 'coverage.json')
+        runner = TestRunner(coverage=True, coverage_file=coverage_file, test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(PassingTestCase)
+        assert runner.run()
+
+        contexts = code_coverage.read_data_file(coverage_file)
+        assert_in('test.test_runner_test.PassingTestCase', contexts)
+        assert_equal(os.listdir(os.path.dirname(coverage_file)), ['coverage.json'])
+
+    def test_overhead_is_reported_by_the_logger(self):
+        coverage_file = os.path.join(tempfile.mkdtemp(), 'coverage.json')
+        runner = TestRunner(coverage=True, coverage_file=coverage_file, test_logger_class=ColorlessTextTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(PassingTestCase)
+        assert runner.run()
+        assert_in("Coverage cost an estimated ", runner.logger.stream.getvalue())
+
+    def test_forked_test_methods_send_back_their_lines(self):
+        coverage_file = os.path.join(tempfile.mkdtemp(), 'coverage.json')
+        runner = TestRunner(coverage=True, coverage_file=coverage_file, coverage_source_roots=[os.path.dirname(__file__)],
+            test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(ForkedCoveredTestCase)
+        assert runner.run()
+
+        if_line, yes_line, no_line = covered_lines(covered_function)
+        contexts = code_coverage.read_data_file(coverage_file)
+        forked_lines = contexts['test.code_coverage_test.ForkedCoveredTestCase.test_covered'][source_file(covered_function)]
+        assert set([if_line, yes_line]).issubset(forked_lines)
+        assert_not_in(no_line, forked_lines)
+
+class CoverageReportDataTest(TestCase):
+    """Checks the lines we hand the coverage package for its HTML report against the real thing."""
+    __test__ = code_coverage.can_collect
+
+    def test_data_file_loads_into_coverage_data(self):
+        collector = code_coverage.ContextCollector()
+        collector.switch_context('SomeTestCase')
+        collector.start()
+        covered_function(True)
+        collector.stop()
+        data_file = os.path.join(tempfile.mkdtemp(), 'coverage.json')
+        code_coverage.write_data_file(data_file, collector.contexts())
+
+        coverage_data = coverage.data.CoverageData()
+        code_coverage.add_line_data(coverage_data, code_coverage.read_data_file(data_file))
+
+        if_line, yes_line, no_line = covered_lines(covered_function)
+        executed_lines = set(coverage_data.lines(source_file(covered_function)))
+        assert_equal(executed_lines & set([if_line, yes_line, no_line]), set([if_line, yes_line]))
@@ -0,0 +1,124 @@
+import os
+import StringIO
+import tempfile
+
+from testify import *
+from testify.coverage_index import CoverageIndex, diff_changed_lines
+from testify.test_case import MetaTestCase
+from testify.test_logger import ColorlessTextTestLogger, VERBOSITY_SILENT
+from testify.test_runner import TestRunner
+
+def used_by_first():
+    return 1
+
+def used_by_second():
+    return 2
+
+class FirstTestCase(TestCase):
+    __test__ = False
+
+    def test_first(self):
+        assert_equal(used_by_first(), 1)
+
+class SecondTestCase(TestCase):
+    __test__ = False
+
+    def test_second(self):
+        assert_equal(used_by_second(), 2)
+
+DIFF = """\
+diff --git a/a.py b/a.py
+--- a/a.py
++++ b/a.py
+@@ -2,4 +2,4 @@ def f():
+ one
+-two
++deux
+ three
+ four
+@@ -10,2 +10,3 @@
+ ten
++ten and a half
+ eleven
+diff --git a/new.py b/new.py
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1 @@
++new
+"""
+
+class DiffChangedLinesTest(TestCase):
+    def test_removed_lines_and_neighbours_of_added_lines(self):
+        assert_equal(diff_changed_lines(StringIO.StringIO(DIFF)), {'a.py': set([3, 10, 11])})
+
+class CoverageIndexTest(TestCase):
+    @setup
+    def create_index(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'coverage_index.json')
+        self.index = CoverageIndex(self.filename)
+
+    def test_update_replaces_only_the_tests_run(self):
+        self.index.update({
+            'mod.SomeTestCase.test_a': {'a.py': set([1, 2])},
+            'mod.SomeTestCase.test_b': {'a.py': set([2, 3])},
+        }, ['mod.SomeTestCase'])
+        self.index.update({'mod.SomeTestCase.test_a': {'a.py': set([3])}}, ['mod.SomeTestCase'])
+
+        index = CoverageIndex(self.filename)
+        assert_equal(index.affected_tests({'a.py': set([2])}), set(['mod.SomeTestCase.test_b']))
+        assert_equal(index.affected_tests({'a.py': set([3])}), set(['mod.SomeTestCase.test_a', 'mod.SomeTestCase.test_b']))
+
+    def test_tests_that_ran_nothing_keep_their_lines(self):
+        self.index.update({'mod.SomeTestCase.test_a': {'a.py': set([1])}}, ['mod.SomeTestCase'])
+        self.index.update({'mod.SomeTestCase.test_a': {}}, ['mod.SomeTestCase'])
+        assert_equal(self.index.affected_tests({'a.py': set([1])}), set(['mod.SomeTestCase.test_a']))
+
+    def test_affected_test_cases(self):
+        self.index.update({
+            'mod.SomeTestCase': {'a.py': set([1])},
+            'mod.SomeTestCase.test_a': {'b.py': set([1])},
+            'mod.OtherTestCase.test_a': {'b.py': set([2])},
+        }, ['mod.SomeTestCase', 'mod.OtherTestCase'])
+        assert_equal(self.index.affected_test_cases({'a.py': set([1])}), set(['mod.SomeTestCase']))
+        assert_equal(self.index.affected_test_cases({'b.py': set([2]), 'README': set([1])}), set(['mod.OtherTestCase']))
+        # nothing ran line 3, so it may be run at import time
+        assert_equal(self.index.affected_test_cases({'b.py': set([3])}), set(['mod.SomeTestCase', 'mod.OtherTestCase']))
+
+    def test_uncovered_line_affects_the_whole_file_alongside_covered_lines(self):
+        self.index.update({
+            'mod.SomeTestCase.test_a': {'lib.py': set([10])},
+            'mod.SomeTestCase.test_b': {'lib.py': set([20])},
+        }, ['mod.SomeTestCase'])
+        assert_equal(self.index.affected_tests({'lib.py': set([10])}), set(['mod.SomeTestCase.test_a']))
+        assert_equal(self.index.affected_tests({'lib.py': set([3, 10])}), set(['mod.SomeTestCase.test_a', 'mod.SomeTestCase.test_b']))
+
+    def test_unindexed_python_file_affects_every_test(self):
+        self.index.update({
+            'mod.SomeTestCase.test_a': {'a.py': set([1])},
+            'mod.OtherTestCase.test_a': {'b.py': set([1])},
+        }, ['mod.SomeTestCase', 'mod.OtherTestCase'])
+        # e.g. a settings module, only ever run as it's imported
+        assert_equal(self.index.affected_test_cases({'a.py': set([1]), 'settings.py': set([5])}), set(['mod.SomeTestCase', 'mod.OtherTestCase']))
+
+class AffectedByTest(TestCase):
+    def run_tests(self, **kwargs):
+        # module_method_overrides defaults to a dict shared with other runners
+        runner = TestRunner(test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT, module_method_overrides={}, **kwargs)
+        runner.logger.stream = StringIO.StringIO()
+        test_case_classes = dict((MetaTestCase._cmp_str(test_case_class), test_case_class) for test_case_class in (FirstTestCase, SecondTestCase))
+        for test_case_name in runner.select_test_cases(sorted(test_case_classes)):
+            runner.add_test_case(test_case_classes[test_case_name])
+        assert runner.run()
+        return set(test_case_class.__name__ for test_case_class in runner.test_case_classes)
+
+    def test_only_affected_test_cases_are_selected(self):
+        directory = tempfile.mkdtemp()
+        index_file = os.path.join(directory, 'coverage_index.json')
+        self.run_tests(coverage=True, coverage_file=os.path.join(directory, 'coverage.json'), coverage_index_file=index_file)
+
+        diff_file = os.path.join(directory, 'change.diff')
+        source_file = os.path.relpath(__file__.replace('.pyc', '.py'))
+        line = used_by_second.func_code.co_firstlineno + 1
+        open(diff_file, 'w').write("--- a/%s\n+++ b/%s\n@@ -%d +%d @@\n-    return 2\n+    return 3\n" % (source_file, source_file, line, line))
+
+        assert_equal(self.run_tests(coverage_index_file=index_file, affected_by=diff_file), set(['SecondTestCase']))
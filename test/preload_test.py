@@ -0,0 +1,126 @@
+import os
+import signal
+import StringIO
+import subprocess
+import sys
+import tempfile
+import time
+
+from testify import *
+import testify
+from testify.preload import PreloadServer
+
+PASSING_TEST = """\
+from testify import *
+
+class PreloadedPassingTestCase(TestCase):
+    def test_pass(self):
+        print 'preloaded and passing'
+"""
+
+FAILING_TEST = """\
+from testify import *
+
+class PreloadedFailingTestCase(TestCase):
+    def test_fail(self):
+        assert_equal(1, 2)
+"""
+
+def write_module(directory, module_name, source):
+    filename = os.path.join(directory, module_name + '.py')
+    open(filename, 'w').write(source)
+    return filename
+
+def load_client():
+    """Load bin/testify-client, which isn't a module, without running it."""
+    client = {'__name__': 'testify_client'}
+    execfile(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(testify.__file__))), 'bin', 'testify-client'), client)
+    return client
+
+class PreloadServerTest(TestCase):
+    @setup
+    def start_server(self):
+        self.directory = tempfile.mkdtemp()
+        write_module(self.directory, 'preloaded_passing_test', PASSING_TEST)
+        write_module(self.directory, 'preloaded_failing_test', FAILING_TEST)
+        self.socket_path = os.path.join(self.directory, 'testify.sock')
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([self.directory, os.path.dirname(os.path.dirname(os.path.abspath(testify.__file__))), env.get('PYTHONPATH', '')])
+        script = "from testify.preload import PreloadServer; PreloadServer('preloaded_passing_test', %r).serve_forever()" % self.socket_path
+        self.server = subprocess.Popen([sys.executable, '-c', script], env=env)
+        deadline = time.time() + 10
+        while not os.path.exists(self.socket_path):
+            assert self.server.poll() is None, "preload server exited with status %s" % self.server.returncode
+            assert time.time() < deadline, "preload server never started listening"
+            time.sleep(0.01)
+
+    @teardown
+    def stop_server(self):
+        os.kill(self.server.pid, signal.SIGTERM)
+        self.server.wait()
+
+    def run_client(self, *args):
+        client = load_client()
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            exit_status = client['run'](self.socket_path, list(args) + ['--no-color'])
+            return exit_status, sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_passing_run(self):
+        exit_status, output = self.run_client('preloaded_passing_test')
+        assert_equal(exit_status, 0)
+        assert_in('PASSED.  1 test / 1 case', output)
+        assert_in('preloaded and passing', output)
+        assert_not_in('\0', output)
+
+    def test_failing_run(self):
+        exit_status, output = self.run_client('preloaded_failing_test')
+        assert_equal(exit_status, 1)
+        assert_in('AssertionError: assertion failed: 1 == 2', output)
+        assert_in('FAILED.  1 test / 1 case', output)
+
+STALE_MODULE = """\
+class Thing(object):
+    pass
+"""
+
+DEPENDENT_MODULE = """\
+from preload_stale_module import Thing
+"""
+
+UNRELATED_MODULE = """\
+value = 1
+"""
+
+class ForgetStaleModulesTest(TestCase):
+    module_names = ['preload_stale_module', 'preload_dependent_module', 'preload_unrelated_module']
+
+    @setup
+    def import_modules(self):
+        self.directory = tempfile.mkdtemp()
+        sys.path.insert(0, self.directory)
+        self.server = PreloadServer(None, None)
+        for module_name, source in zip(self.module_names, [STALE_MODULE, DEPENDENT_MODULE, UNRELATED_MODULE]):
+            source_file = write_module(self.directory, module_name, source)
+            __import__(module_name)
+            self.server.module_mtimes[module_name] = (source_file, os.path.getmtime(source_file))
+
+    @teardown
+    def forget_modules(self):
+        sys.path.remove(self.directory)
+        for module_name in self.module_names:
+            sys.modules.pop(module_name, None)
+
+    def test_stale_modules_and_their_dependents_are_forgotten(self):
+        source_file, mtime = self.server.module_mtimes['preload_stale_module']
+        os.utime(source_file, (mtime + 10, mtime + 10))
+        self.server._forget_stale_modules()
+
+        assert_not_in('preload_stale_module', sys.modules)
+        # it would go on using the old Thing otherwise
+        assert_not_in('preload_dependent_module', sys.modules)
+        assert_in('preload_unrelated_module', sys.modules)
@@ -0,0 +1,83 @@
+import json
+import os
+import pstats
+import StringIO
+import tempfile
+
+from testify import *
+from testify.profiling import format_summary, RunProfiler, section_filename
+from testify.test_logger import ColorlessTextTestLogger, JSONTestLogger, VERBOSITY_SILENT
+from testify.test_runner import TestRunner
+
+def profiled_function():
+    return sum(range(10))
+
+class ProfiledTestCase(TestCase):
+    __test__ = False
+
+    @setup
+    def profiled_setup(self):
+        self.total = profiled_function()
+
+    def test_profiled(self):
+        assert_equal(profiled_function(), self.total)
+
+def call_count(stats, function_name):
+    return sum(stat[1] for (filename, line, name), stat in stats.stats.iteritems() if name == function_name)
+
+class RunProfilerTest(TestCase):
+    def test_shipped_stats_are_merged(self):
+        profiler = RunProfiler()
+        profiler.profile('run', profiled_function)
+        worker_profiler = RunProfiler()
+        worker_profiler.profile('run', profiled_function)
+        profiler.add_shipped_stats(worker_profiler.stats_by_section())
+
+        assert_equal(call_count(profiler.stats(), 'profiled_function'), 2)
+        # asking again doesn't count anything twice
+        assert_equal(call_count(profiler.stats(), 'profiled_function'), 2)
+
+class ProfileRunTest(TestCase):
+    def test_one_stats_file_per_run_with_phases(self):
+        profile_file = os.path.join(tempfile.mkdtemp(), 'run.pstats')
+        runner = TestRunner(profile=True, profile_file=profile_file, profile_phases=True,
+            test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(ProfiledTestCase)
+        assert runner.run()
+
+        assert_equal(call_count(pstats.Stats(profile_file), 'profiled_function'), 2)
+        assert_equal(call_count(pstats.Stats(section_filename(profile_file, 'fixtures')), 'profiled_function'), 1)
+        assert_equal(call_count(pstats.Stats(section_filename(profile_file, 'test_methods')), 'profiled_function'), 1)
+
+    def test_summary(self):
+        profiler = RunProfiler()
+        profiler.profile('run', profiled_function)
+        summary = profiler.summary(top=5)
+        assert len(summary['cumulative']) <= 5
+        function, = [function for function in summary['time'] if function['function'].endswith('(profiled_function)')]
+        assert_equal(function['calls'], 1)
+
+        report = format_summary(summary)
+        assert_in("functions by cumulative time", report)
+        assert_in("functions by internal time", report)
+        assert_in("profiled_function", report)
+
+    def test_summary_is_reported_by_the_logger(self):
+        runner = TestRunner(profile=True, profile_file=os.path.join(tempfile.mkdtemp(), 'run.pstats'), test_logger_class=ColorlessTextTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(ProfiledTestCase)
+        assert runner.run()
+        assert_in("functions by cumulative time", runner.logger.stream.getvalue())
+
+    def test_summary_is_a_json_record(self):
+        # plenty, so that profiled_function makes the cut
+        runner = TestRunner(profile=True, profile_file=os.path.join(tempfile.mkdtemp(), 'run.pstats'), profile_top=10000,
+            test_logger_class=JSONTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(ProfiledTestCase)
+        assert runner.run()
+        records = [json.loads(line) for line in runner.logger.stream.getvalue().splitlines()]
+        profile, = [record for record in records if record['event'] == 'profile']
+        assert any(function['function'].endswith('(profiled_function)') for function in profile['cumulative'])
+        assert_equal(records[-1]['event'], 'run_complete')
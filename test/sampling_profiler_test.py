@@ -0,0 +1,106 @@
+import json
+import os
+import signal
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+
+from testify import *
+from testify.sampling_profiler import _WAITING_CODES, SamplingProfiler
+from testify.test_logger import ColorlessTextTestLogger, JSONTestLogger, VERBOSITY_SILENT
+from testify.test_runner import TestRunner
+
+def sampled_function(profiler):
+    profiler._sample(signal.SIGPROF, sys._getframe())
+
+class BusyTestCase(TestCase):
+    __test__ = False
+
+    def test_busy(self):
+        # spend enough CPU time to be sampled plenty of times
+        start = time.clock()
+        while time.clock() - start < 0.05:
+            pass
+
+class SamplingProfilerTest(TestCase):
+    def test_samples_are_labelled_and_collapsed(self):
+        profiler = SamplingProfiler()
+        profiler.label(('SomeTestCase', 'test_something', 'test_method'), lambda: sampled_function(profiler))
+        sampled_function(profiler)
+
+        # just this thread's; the run we're part of may have others about
+        stacks = dict((stack, count) for stack, count in profiler.collapsed().iteritems() if not stack.startswith('thread:'))
+        assert_equal(sum(stacks.itervalues()), 2)
+        labelled_stack, = [stack for stack in stacks if stack.startswith('SomeTestCase;test_something;test_method;')]
+        assert labelled_stack.split(';')[-1].startswith('sampled_function (')
+        phase_counts = profiler.phase_counts()
+        assert_equal((phase_counts['test_method'], phase_counts['testify']), (1, 1))
+
+    def test_other_threads_are_sampled_separately(self):
+        profiler = SamplingProfiler()
+        stop = threading.Event()
+        def spin():
+            while not stop.is_set():
+                pass
+        spinner = threading.Thread(target=spin, name='spinner')
+        waiter = threading.Thread(target=stop.wait, name='waiter')
+        spinner.start()
+        waiter.start()
+        try:
+            while getattr(sys._current_frames().get(waiter.ident), 'f_code', None) not in _WAITING_CODES:
+                time.sleep(0.001)
+            sampled_function(profiler)
+        finally:
+            stop.set()
+            spinner.join()
+            waiter.join()
+
+        phase_counts = profiler.phase_counts()
+        assert_equal(phase_counts['thread:spinner'], 1)
+        # waiting threads can't be using the CPU
+        assert_not_in('thread:waiter', phase_counts)
+
+    def test_shipped_samples_are_merged(self):
+        profiler = SamplingProfiler()
+        sampled_function(profiler)
+        worker_profiler = SamplingProfiler()
+        sampled_function(worker_profiler)
+        profiler.add_shipped_samples(worker_profiler.summary())
+
+        stacks = dict((stack, count) for stack, count in profiler.collapsed().iteritems() if not stack.startswith('thread:'))
+        assert_equal(stacks.values(), [2])
+        assert_equal(profiler.sample_count, 2)
+
+class SamplingRunTest(TestCase):
+    def test_samples_are_attributed_to_test_methods(self):
+        sampling_file = os.path.join(tempfile.mkdtemp(), 'run.collapsed')
+        runner = TestRunner(profile_sampling=True, sampling_interval=0.001, sampling_file=sampling_file,
+            test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(BusyTestCase)
+        assert runner.run()
+
+        stacks = [line.rsplit(' ', 1) for line in open(sampling_file).read().splitlines()]
+        assert any(stack.startswith('test.sampling_profiler_test.BusyTestCase;test_busy;test_method;') for stack, count in stacks)
+        assert all(int(count) > 0 for stack, count in stacks)
+
+    def test_overhead_is_reported_by_the_logger(self):
+        runner = TestRunner(profile_sampling=True, sampling_interval=0.001, sampling_file=os.path.join(tempfile.mkdtemp(), 'run.collapsed'),
+            test_logger_class=ColorlessTextTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(BusyTestCase)
+        assert runner.run()
+        assert_in("Samples by phase: ", runner.logger.stream.getvalue())
+
+    def test_overhead_is_a_json_record(self):
+        runner = TestRunner(profile_sampling=True, sampling_interval=0.001, sampling_file=os.path.join(tempfile.mkdtemp(), 'run.collapsed'),
+            test_logger_class=JSONTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(BusyTestCase)
+        assert runner.run()
+        records = [json.loads(line) for line in runner.logger.stream.getvalue().splitlines()]
+        sampling, = [record for record in records if record['event'] == 'sampling']
+        assert sampling['sample_count'] > 0
+        assert sampling['phase_counts']['test_method'] > 0
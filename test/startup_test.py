@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+from testify import *
+import testify
+
+# modules that take a while to import, and that we only want when a run actually needs them
+HEAVY_MODULES = ['IPython', 'cProfile', 'coverage', 'pkg_resources', 'multiprocessing', 'testify.code_coverage', 'testify.profiling',
+    # finding C libraries with ctypes.util runs ldconfig; nothing should start a process on import
+    'ctypes', 'ctypes.util', 'subprocess']
+
+# a generous bound, so this only fails if something heavy sneaks back in
+MAX_IMPORT_TIME = 1.0
+
+class StartupTest(TestCase):
+    """Guards how much importing testify, and the command line program, costs."""
+
+    def import_in_subprocess(self, module_name):
+        """Import module_name in a fresh interpreter, returning how long it took and which heavy modules it loaded."""
+        script = "; ".join([
+            "import sys, time",
+            "start = time.time()",
+            "import %s" % module_name,
+            "elapsed = time.time() - start",
+            "print elapsed",
+            "print ' '.join(name for name in %r if name in sys.modules)" % HEAVY_MODULES,
+        ])
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(os.path.abspath(testify.__file__))), env.get('PYTHONPATH', '')])
+        output = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, env=env).communicate()[0]
+        elapsed, heavy_modules = output.split('\n')[:2]
+        return float(elapsed), heavy_modules.split()
+
+    def test_import_testify(self):
+        elapsed, heavy_modules = self.import_in_subprocess('testify')
+        assert_equal(heavy_modules, [])
+        assert elapsed < MAX_IMPORT_TIME, "importing testify took %.2fs" % elapsed
+
+    def test_import_test_program(self):
+        elapsed, heavy_modules = self.import_in_subprocess('testify.test_program')
+        assert_equal(heavy_modules, [])
+        assert elapsed < MAX_IMPORT_TIME, "importing testify.test_program took %.2fs" % elapsed
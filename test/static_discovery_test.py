@@ -0,0 +1,97 @@
+import imp
+import os
+import tempfile
+import textwrap
+
+from testify import *
+from testify.static_discovery import describe_module
+from testify.test_index import describe_test_case
+
+class DescribeModuleTest(TestCase):
+    @setup
+    def create_directory(self):
+        self.directory = tempfile.mkdtemp()
+
+    def describe(self, source, known_test_cases={}):
+        source_file = os.path.join(self.directory, 'some_test.py')
+        open(source_file, 'w').write(textwrap.dedent(source))
+        return describe_module('tests.some_test', source_file, known_test_cases, ['package-suite'])
+
+    def test_suites_and_inherited_methods(self):
+        test_cases = self.describe("""
+            from testify import *
+
+            _suites = ['module-suite']
+
+            class BaseTestCase(TestCase):
+                __test__ = False
+
+                @suite('method-suite')
+                def test_inherited(self):
+                    pass
+
+            class SomeTestCase(BaseTestCase):
+                _suites = set(['class-suite'])
+
+                @setup
+                def make_things(self):
+                    pass
+
+                def test_own(self):
+                    pass
+            """)
+        assert_equal(test_cases, [{
+            'module': 'tests.some_test',
+            'name': 'SomeTestCase',
+            'test_methods': {
+                'test_inherited': ['class-suite', 'method-suite', 'module-suite', 'package-suite'],
+                'test_own': ['class-suite', 'module-suite', 'package-suite'],
+            },
+        }])
+
+    def test_suites_come_from_the_first_base_with_any(self):
+        source = """
+            from testify import *
+
+            class PlainBase(TestCase):
+                __test__ = False
+
+            class FirstBase(TestCase):
+                __test__ = False
+                _suites = ['first-suite']
+
+            class SecondBase(TestCase):
+                __test__ = False
+                _suites = ['second-suite']
+
+            class SomeTestCase(PlainBase, FirstBase, SecondBase):
+                def test_own(self):
+                    pass
+            """
+        test_cases = self.describe(source)
+        assert_equal(test_cases[0]['test_methods'], {'test_own': ['first-suite', 'package-suite']})
+
+        # just as when it's imported
+        module = imp.load_source('some_test', os.path.join(self.directory, 'some_test.py'))
+        assert_equal(describe_test_case(module.SomeTestCase)['test_methods'], {'test_own': ['first-suite']})
+
+    def test_imported_base_class(self):
+        base_test_case = {'module': 'tests.base_test', 'name': 'BaseTestCase', 'test_methods': {'test_base': []}}
+        test_cases = self.describe("""
+            from base_test import BaseTestCase
+
+            class SomeTestCase(BaseTestCase):
+                def test_own(self):
+                    pass
+            """, {'tests.base_test.BaseTestCase': base_test_case})
+        assert_equal([test_case['name'] for test_case in test_cases], ['SomeTestCase', 'BaseTestCase'])
+        assert_equal(sorted(test_cases[0]['test_methods']), ['test_base', 'test_own'])
+
+    def test_unresolvable_modules(self):
+        for source in [
+            "from elsewhere import BaseTestCase\nclass SomeTestCase(BaseTestCase): pass\n",
+            "import testify\nif True:\n    class SomeTestCase(testify.TestCase): pass\n",
+            "from testify import *\nclass SomeTestCase(TestCase):\n    @suite(*['a'])\n    def test_one(self): pass\n",
+            "from testify import *\nclass SomeTestCase(TestCase):\n    test_one = lambda self: None\n",
+        ]:
+            assert_equal(self.describe(source), None)
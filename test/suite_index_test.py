@@ -0,0 +1,37 @@
+from testify import *
+from testify.suite_index import SuiteExpressionError, SuiteIndex, parse_suite_expression
+
+class SuiteIndexTest(TestCase):
+    @setup
+    def build_index(self):
+        self.index = SuiteIndex()
+        self.index.update('SomeTestCase', [
+            ('test_db', ['db']),
+            ('test_db_slow', ['db', 'slow']),
+            ('test_slow', ['slow']),
+            ('test_plain', []),
+        ])
+
+    def selected(self, *args, **kwargs):
+        return sorted(self.index.keys[test_method_id] for test_method_id in self.index.select(*args, **kwargs))
+
+    def test_include_and_exclude(self):
+        assert_equal(self.selected(['db'], ['slow']), ['test_db'])
+        assert_equal(self.selected([], ['db']), ['test_plain', 'test_slow'])
+
+    def test_expressions(self):
+        assert_equal(self.selected(expression="db and not slow"), ['test_db'])
+        assert_equal(self.selected(expression="not db or slow and db"), ['test_db_slow', 'test_plain', 'test_slow'])
+        assert_equal(self.selected(expression="not (db or slow)"), ['test_plain'])
+        assert parse_suite_expression("db and not slow").matches(set(['db']))
+
+    def test_bad_expressions(self):
+        for text in ["db and", "(db or slow", "db slow", "or db"]:
+            assert_raises(SuiteExpressionError, parse_suite_expression, text)
+
+    def test_counts_and_replacement(self):
+        assert_equal(self.index.counts(self.index.select(expression="not plain")), {'db': 2, 'slow': 2})
+
+        self.index.update('SomeTestCase', [('test_db', ['db'])])
+        assert_equal(self.index.counts(), {'db': 1})
+        assert_equal(self.selected(), ['test_db'])
@@ -1,4 +1,31 @@
+from collections import defaultdict
+import os
+import signal
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
 from testify import *
+from testify.test_case import ForkedTestMethodError, SharedFixtures, TestTimeoutError
+from testify.test_logger import ColorlessTextTestLogger, VERBOSITY_SILENT
+from testify.test_runner import TestRunner
+from testify.test_runner_parallel import ParallelTestRunner
+
+
+def run_and_collect(test_case, results=None):
+    """Run test_case, returning its results, fixture methods' included, by method name.
+
+    Every result is also appended to results, if given, in the order it was reported.
+    """
+    if results is None:
+        results = []
+    test_case.register_callback(TestCase.EVENT_ON_COMPLETE_TEST_METHOD, results.append)
+    test_case.run()
+    return dict((result.test_method.__name__, result) for result in results)
+
 
 class TestMethodsGetRun(TestCase):
     def test_method_1(self):
@@ -53,6 +80,25 @@ class DeprecatedClassTeardownFixturesGetRun(TestCase):
     def test_test_var(self):
         assert self.test_var
 
+class DeprecatedFixtureMixin(object):
+    def classSetUp(self):
+        self.class_test_var = True
+
+    def setUp(self):
+        self.test_var = True
+
+class DeprecatedFixturesFromMixinGetRun(DeprecatedFixtureMixin, TestCase):
+    def test_test_vars(self):
+        assert self.class_test_var
+        assert self.test_var
+
+class DeprecatedFixturesFromMixinTest(TestCase):
+    def test_mixin_fixtures_are_not_counted_as_tests(self):
+        test_case = DeprecatedFixturesFromMixinGetRun()
+        results = run_and_collect(test_case)
+        assert_equal(sorted(name for name, result in results.iteritems() if not test_case.is_fixture_method(result.test_method)), ['test_test_vars'])
+        assert results['test_test_vars'].success
+
 class ClassSetupFixturesGetRun(TestCase):
     @class_setup
     def set_test_var(self):
@@ -191,6 +237,446 @@ class OverrideTest(TestCase):
     
     def test_method_2(self):
         pass
+
+class SuitedTestCase(TestCase):
+    __test__ = False
+    _suites = set(['class-suite'])
+
+    def __init__(self, *args, **kwargs):
+        super(SuitedTestCase, self).__init__(*args, **kwargs)
+        self._generate_test_method('test_generated', lambda self: None)
+
+    @suite('method-suite')
+    def test_suited(self):
+        pass
+
+    def test_unsuited(self):
+        pass
+
+class TestMethodTableTest(TestCase):
+    def test_suites_select_test_methods(self):
+        all_methods = SuitedTestCase(suites_include=set(['class-suite'])).runnable_test_methods()
+        assert_equal([method.__name__ for method in all_methods], ['<lambda>', 'test_suited', 'test_unsuited'])
+
+        suited_methods = SuitedTestCase(suites_include=set(['method-suite'])).runnable_test_methods()
+        assert_equal([method.__name__ for method in suited_methods], ['test_suited'])
+
+    def list_tests(self, test_case_class):
+        runner = TestRunner(test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.add_test_case(test_case_class)
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            runner.list_tests()
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+    def test_table_follows_class_changes(self):
+        def test_added(self):
+            pass
+
+        SuitedTestCase._test_methods()
+        SuitedTestCase.test_added = test_added
+        try:
+            assert_in('test_added', dict(SuitedTestCase._test_methods()))
+        finally:
+            del SuitedTestCase.test_added
+
+        assert_not_in('test_added', [method.__name__ for method in SuitedTestCase().runnable_test_methods()])
+        assert_not_in('SuitedTestCase.test_added', self.list_tests(SuitedTestCase))
+        assert_in('SuitedTestCase.test_suited', self.list_tests(SuitedTestCase))
+
+
+class TimedTestCase(TestCase):
+    __test__ = False
+
+    @class_setup
+    def class_setup_fixture(self):
+        pass
+
+    @setup
+    def setup_fixture(self):
+        pass
+
+    def test_method(self):
+        pass
+
+
+class PhaseTimesTest(TestCase):
+    def test_results_are_timed_by_phase(self):
+        results = run_and_collect(TimedTestCase())
+
+        assert_equal(sorted(results['class_setup_fixture'].phase_times), ['class_setup'])
+        assert_equal(sorted(results['test_method'].phase_times), ['setup', 'teardown', 'test_method'])
+        for result in results.itervalues():
+            assert all(phase_time >= 0 for phase_time in result.phase_times.values())
+
+
+class HangingTestCase(TestCase):
+    __test__ = False
+
+    @setup
+    def slow_setup(self):
+        if self.hang_in_setup:
+            time.sleep(10)
+
+    @timeout(0.05)
+    def test_hangs(self):
+        time.sleep(10)
+
+    def test_quick(self):
+        pass
+
+    @teardown
+    def count_teardowns(self):
+        self.teardowns += 1
+
+
+class TimeoutTest(TestCase):
+    def run_test_case(self, hang_in_setup, **kwargs):
+        test_case = HangingTestCase(**kwargs)
+        test_case.hang_in_setup = hang_in_setup
+        test_case.teardowns = 0
+        return test_case, run_and_collect(test_case)
+
+    def test_method_timeout(self):
+        test_case, results = self.run_test_case(False)
+        assert results['test_hangs'].error
+        exception_type, exception, tb = results['test_hangs'].exception_info
+        assert_equal(exception_type, TestTimeoutError)
+        # the traceback goes all the way to where the test was stuck
+        assert_in('time.sleep(10)', ''.join(traceback.format_tb(tb)))
+        assert results['test_quick'].success
+        assert_equal(test_case.teardowns, 2)
+
+    def test_default_timeout_covers_fixtures(self):
+        test_case, results = self.run_test_case(True, timeout=0.05)
+        assert_equal(results['test_quick'].exception_info[0], TestTimeoutError)
+        assert_equal(test_case.teardowns, 2)
+
+
+class ForkingTestCase(TestCase):
+    __test__ = False
+    fork_test_methods = True
+
+    @class_setup
+    def build_state(self):
+        self.state = []
+
+    def test_first(self):
+        self.state.append('first')
+        assert_equal(self.state, ['first'])
+
+    def test_second(self):
+        self.state.append('second')
+        assert_equal(self.state, ['first'])
+
+    def test_third_dies(self):
+        os._exit(3)
+
+    def test_fourth_is_killed(self):
+        os.kill(os.getpid(), signal.SIGKILL)
+
+
+class ForkTestMethodsTest(TestCase):
+    def test_each_test_method_starts_from_class_setup(self):
+        test_case = ForkingTestCase()
+        results = run_and_collect(test_case)
+
+        assert results['test_first'].success
+        assert results['test_second'].failure
+        assert_in("assertion failed: ['second'] == ['first']", results['test_second'].formatted_exception_info)
+        assert_equal(results['test_third_dies'].exception_info[0], ForkedTestMethodError)
+        assert_in("test_third_dies exited with 3", str(results['test_third_dies'].exception_info[1]))
+        assert_in("test_fourth_is_killed was killed by signal %d" % signal.SIGKILL, str(results['test_fourth_is_killed'].exception_info[1]))
+        assert_in('test_method', results['test_first'].phase_times)
+        # and none of it happened here
+        assert_equal(test_case.state, [])
+
+
+class HungForkingTestCase(TestCase):
+    __test__ = False
+    fork_test_methods = True
+    FORKED_GRACE_PERIOD = 0.1
+
+    @timeout(0.1)
+    def test_hangs_where_timeouts_cant_reach(self):
+        signal.signal(signal.SIGALRM, signal.SIG_IGN)
+        time.sleep(10)
+
+
+class HungForkedTestMethodTest(TestCase):
+    def test_parent_gives_up_on_hung_child(self):
+        forks = []
+        results = run_and_collect(HungForkingTestCase(before_fork=lambda: forks.append(True)))
+
+        assert_equal(forks, [True])
+        result = results['test_hangs_where_timeouts_cant_reach']
+        assert_equal(result.exception_info[0], ForkedTestMethodError)
+        assert_in("killed", str(result.exception_info[1]))
+
+
+class SleepingForkingTestCase(TestCase):
+    __test__ = False
+    fork_test_methods = True
+
+    def test_sleeps(self):
+        time.sleep(10)
+
+
+class InterruptedForkedTestMethodTest(TestCase):
+    def test_interrupted_parent_kills_and_reaps_child(self):
+        def interrupt(signum, frame):
+            raise KeyboardInterrupt
+        old_handler = signal.signal(signal.SIGALRM, interrupt)
+        start_time = time.time()
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0.1)
+            try:
+                run_and_collect(SleepingForkingTestCase())
+            except KeyboardInterrupt:
+                pass
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+
+        assert time.time() - start_time < 5
+        # no child left behind, running or not
+        assert_raises(OSError, os.waitpid, -1, os.WNOHANG)
+
+
+class SharedServerTestCase(TestCase):
+    __test__ = False
+    events = []
+
+    @session_setup
+    def start_server(self):
+        self.events.append('start server')
+        self.server = 'server'
+
+    @session_teardown
+    def stop_server(self):
+        self.events.append('stop server')
+
+    @module_setup
+    def load_config(self):
+        self.events.append('load config')
+
+    @module_teardown
+    def unload_config(self):
+        self.events.append('unload config')
+
+
+class FirstServerUser(SharedServerTestCase):
+    def test_server(self):
+        self.events.append('first')
+        assert_equal(self.server, 'server')
+
+
+class SecondServerUser(SharedServerTestCase):
+    def test_server(self):
+        self.events.append('second')
+
+
+class OtherModuleServerUser(SharedServerTestCase):
+    __test__ = False
+    # as if it were defined elsewhere, so it needs its own copy of the module fixture
+    __module__ = 'test.other_test'
+
+    def test_server(self):
+        self.events.append('other')
+
+
+class InterruptedServerUser(SharedServerTestCase):
+    __test__ = False
+
+    def test_server(self):
+        self.events.append('interrupted')
+        raise KeyboardInterrupt
+
+
+class FileLoggingServerTestCase(TestCase):
+    """Logs its fixtures and tests to events_file, as "pid event" lines, so that it can be run in other processes."""
+    __test__ = False
+    events_file = None
+
+    @session_setup
+    def start_server(self):
+        open(self.events_file, 'a').write("%d start\n" % os.getpid())
+
+    @session_teardown
+    def stop_server(self):
+        open(self.events_file, 'a').write("%d stop\n" % os.getpid())
+
+    def test_server(self):
+        open(self.events_file, 'a').write("%d %s\n" % (os.getpid(), type(self).__name__))
+
+
+class FirstFileLoggingServerUser(FileLoggingServerTestCase):
+    __test__ = False
+
+
+class SecondFileLoggingServerUser(FileLoggingServerTestCase):
+    __test__ = False
+
+
+class BrokenServerTestCase(TestCase):
+    __test__ = False
+
+    @session_setup
+    def fail_to_start(self):
+        raise ValueError("no server for you")
+
+    def test_server(self):
+        pass
+
+
+class SharedFixturesTest(TestCase):
+    @setup
+    def reset_events(self):
+        SharedServerTestCase.events[:] = []
+
+    def run_test_cases(self, *test_case_classes):
+        runner = TestRunner(test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        for test_case_class in test_case_classes:
+            runner.add_test_case(test_case_class)
+        return runner.run()
+
+    def test_set_up_once_and_torn_down_after_last_user(self):
+        assert self.run_test_cases(FirstServerUser, SecondServerUser)
+        assert_equal(SharedServerTestCase.events, ['start server', 'load config', 'first', 'second', 'unload config', 'stop server'])
+
+    def test_running_alone(self):
+        FirstServerUser().run()
+        assert_equal(SharedServerTestCase.events, ['start server', 'load config', 'first', 'unload config', 'stop server'])
+
+    def test_interleaved_modules_take_turns_with_module_fixtures(self):
+        assert self.run_test_cases(FirstServerUser, OtherModuleServerUser, SecondServerUser)
+        assert_equal(SharedServerTestCase.events, [
+            'start server',
+            'load config', 'first', 'unload config',
+            'load config', 'other', 'unload config',
+            'load config', 'second', 'unload config',
+            'stop server',
+        ])
+
+    def test_interrupted_run_tears_down_what_is_left(self):
+        self.run_test_cases(InterruptedServerUser, SecondServerUser)
+        assert_equal(SharedServerTestCase.events, ['start server', 'load config', 'interrupted', 'unload config', 'stop server'])
+
+    def test_parallel_workers_tear_down_when_done(self):
+        FileLoggingServerTestCase.events_file = os.path.join(tempfile.mkdtemp(), 'events')
+        runner = ParallelTestRunner(processes=2, test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(FirstFileLoggingServerUser)
+        runner.add_test_case(SecondFileLoggingServerUser)
+        assert runner.run()
+
+        events_by_worker = defaultdict(list)
+        for line in open(FileLoggingServerTestCase.events_file):
+            pid, event = line.split()
+            events_by_worker[pid].append(event)
+        assert_equal(sorted(event for events in events_by_worker.itervalues() for event in events[1:-1]),
+            ['FirstFileLoggingServerUser', 'SecondFileLoggingServerUser'])
+        # each worker that set the server up tore it down once it had nothing left to run
+        for events in events_by_worker.itervalues():
+            assert_equal((events[0], events[-1]), ('start', 'stop'))
+
+    def test_failed_setup_fails_every_user(self):
+        shared_fixtures = SharedFixtures()
+        results = []
+        for _ in range(2):
+            run_and_collect(BrokenServerTestCase(shared_fixtures=shared_fixtures), results)
+        assert_equal([(result.test_method.__name__, result.error) for result in results if not result.test_method.__name__.startswith('class')],
+            [('fail_to_start', True), ('test_server', True), ('test_server', True)])
+
+
+class ConcurrentClassSetupTestCase(TestCase):
+    __test__ = False
+    class_setup_threads = 3
+
+    @class_setup
+    def start_database(self):
+        self.database_started.set()
+        # only finishes once start_cache has started, which it can't if they run one by one
+        self.overlapped.append(self.cache_started.wait(5))
+        self.events.append('database')
+
+    @class_setup
+    def start_cache(self):
+        self.cache_started.set()
+        self.overlapped.append(self.database_started.wait(5))
+        self.events.append('cache')
+
+    @class_setup
+    @depends_on('start_database')
+    def load_data(self):
+        self.events.append('data')
+        assert_equal(1, 2)
+
+    def test_something(self):
+        pass
+
+
+class ConcurrentClassSetupTest(TestCase):
+    def test_fixtures_run_at_once_but_report_in_order(self):
+        test_case = ConcurrentClassSetupTestCase()
+        test_case.events = []
+        test_case.overlapped = []
+        test_case.database_started, test_case.cache_started = threading.Event(), threading.Event()
+        reported = []
+        results = run_and_collect(test_case, reported)
+
+        # the two fixtures that wait for each other overlapped
+        assert_equal(test_case.overlapped, [True, True])
+        assert test_case.events.index('data') > test_case.events.index('database')
+        assert_equal([result.test_method.__name__ for result in reported if not result.test_method.__name__.startswith('class')],
+            ['start_database', 'start_cache', 'load_data', 'test_something'])
+        # and load_data's failure still fails the test methods
+        assert results['test_something'].failure
+
+
+class HangingConcurrentClassSetupTestCase(TestCase):
+    __test__ = False
+    class_setup_threads = 2
+
+    @class_setup
+    @timeout(0.05)
+    def hang(self):
+        self.release.wait(5)
+
+    @class_setup
+    @depends_on('hang')
+    def after_hang(self):
+        self.events.append('after hang')
+
+    @class_setup
+    def quick(self):
+        self.events.append('quick')
+
+    def test_something(self):
+        pass
+
+
+class ConcurrentClassSetupTimeoutTest(TestCase):
+    def test_hung_fixture_times_out(self):
+        test_case = HangingConcurrentClassSetupTestCase()
+        test_case.events = []
+        test_case.release = threading.Event()
+        try:
+            results = run_and_collect(test_case)
+        finally:
+            test_case.release.set()
+
+        assert_equal(results['hang'].exception_info[0], TestTimeoutError)
+        # what depended on it never ran, but everything else did
+        assert_equal(results['after_hang'].exception_info[0], TestTimeoutError)
+        assert results['quick'].success
+        assert_equal(test_case.events, ['quick'])
+        assert results['test_something'].error
+
 # class ExceptionsInClassSetup(TestCase):
 #   def classSetUp(self):
 #       raise Exception, "oh snap"
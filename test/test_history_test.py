@@ -0,0 +1,70 @@
+import os
+import StringIO
+import sys
+import tempfile
+
+from testify import *
+from testify.test_history import ORDER_FAILED_FIRST, ORDER_RANDOM, ORDER_SLOWEST_FIRST, TestHistory, assign_buckets, hash_bucket, order_test_cases
+from testify.test_program import parse_test_runner_command_line_args
+
+class TestHistoryTest(TestCase):
+    @setup
+    def build_history(self):
+        self.filename = os.path.join(tempfile.mkdtemp(), 'history.json')
+        self.history = TestHistory(self.filename)
+
+    def test_save_merges_with_other_runs(self):
+        other_history = TestHistory(self.filename)
+        self.history.record_run_time('tests.FooTest', 1.0)
+        other_history.record_run_time('tests.BarTest', 2.0)
+        self.history.save()
+        other_history.save()
+
+        history = TestHistory(self.filename)
+        assert_equal(history.run_time('tests.FooTest'), 1.0)
+        assert_equal(history.run_time('tests.BarTest'), 2.0)
+        assert_equal(history.run_time('tests.BazTest'), None)
+
+    def test_buckets_balanced_by_run_time(self):
+        for test_case_name, run_time in [('a', 10.0), ('b', 6.0), ('c', 5.0), ('d', 4.0)]:
+            self.history.record_run_time(test_case_name, run_time)
+
+        buckets = assign_buckets(['a', 'b', 'c', 'd'], 2, history=self.history)
+        assert_equal(buckets, {'a': 0, 'b': 1, 'c': 1, 'd': 0})
+
+    def test_unseen_and_overridden_test_cases(self):
+        self.history.record_run_time('a', 1.0)
+        buckets = assign_buckets(['a', 'b', 'c'], 3, history=self.history, bucket_overrides={'c': 2})
+        assert_equal(buckets['b'], hash_bucket('b', 3))
+        assert_equal(buckets['c'], 2)
+
+    def test_slowest_first_order(self):
+        self.history.record_run_time('a', 1.0)
+        self.history.record_run_time('b', 3.0)
+        self.history.record_run_time('c', 2.0)
+        assert_equal(order_test_cases(['a', 'b', 'c', 'd'], ORDER_SLOWEST_FIRST, history=self.history), ['d', 'b', 'c', 'a'])
+
+    def test_failed_first_order(self):
+        self.history.record_failed('a', False)
+        self.history.record_failed('c', True)
+        assert_equal(order_test_cases(['a', 'b', 'c'], ORDER_FAILED_FIRST, history=self.history), ['c', 'a', 'b'])
+
+    def test_random_order_is_repeatable(self):
+        names = [str(i) for i in range(20)]
+        order = order_test_cases(names, ORDER_RANDOM, seed=1)
+        assert_equal(sorted(order), sorted(names))
+        assert_equal(order, order_test_cases(names, ORDER_RANDOM, seed=1))
+
+class OrderOptionTest(TestCase):
+    def test_orders_from_history_need_a_history_file(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO.StringIO()
+        try:
+            for order in (ORDER_SLOWEST_FIRST, ORDER_FAILED_FIRST):
+                assert_raises(SystemExit, parse_test_runner_command_line_args, ['test', '--order', order])
+        finally:
+            sys.stderr = stderr
+
+        history_file = os.path.join(tempfile.mkdtemp(), 'history.json')
+        _, _, test_runner_args, _ = parse_test_runner_command_line_args(['test', '--order', ORDER_SLOWEST_FIRST, '--history-file', history_file])
+        assert_equal(test_runner_args['test_case_order'], ORDER_SLOWEST_FIRST)
@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from testify import *
+from testify.test_index import TestIndex, describe_test_case
+
+class DescribedTestCase(TestCase):
+    __test__ = False
+    _suites = set(['class-suite'])
+
+    @suite('method-suite')
+    def test_one(self):
+        pass
+
+    def test_two(self):
+        pass
+
+    def helper(self):
+        pass
+
+class TestIndexTest(TestCase):
+    @setup
+    def build_index(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'index.json')
+        self.source_file = os.path.join(self.directory, 'some_test.py')
+        open(self.source_file, 'w').write("# some tests\n")
+
+    def test_describe_test_case(self):
+        assert_equal(describe_test_case(DescribedTestCase), {
+            'module': __name__,
+            'name': 'DescribedTestCase',
+            'test_methods': {'test_one': ['class-suite', 'method-suite'], 'test_two': ['class-suite']},
+        })
+
+    def test_entries_survive_save(self):
+        index = TestIndex(self.filename)
+        index.update('some_test', self.source_file, [describe_test_case(DescribedTestCase)])
+        index.save()
+
+        test_cases = TestIndex(self.filename).lookup('some_test', self.source_file)
+        assert_equal([test_case['name'] for test_case in test_cases], ['DescribedTestCase'])
+
+    def test_changed_module_is_stale(self):
+        index = TestIndex(self.filename)
+        index.update('some_test', self.source_file, [])
+        assert_equal(index.lookup('some_test', self.source_file), [])
+
+        open(self.source_file, 'a').write("# more tests\n")
+        assert_equal(index.lookup('some_test', self.source_file), None)
+        assert_equal(index.lookup('other_test', self.source_file), None)
+
+    def test_changed_dependency_is_stale(self):
+        base_file = os.path.join(self.directory, 'base_test.py')
+        open(base_file, 'w').write("# some base classes\n")
+        index = TestIndex(self.filename)
+        index.update('some_test', self.source_file, [], dependencies=[base_file, os.path.join(self.directory, 'missing.py')])
+        index.save()
+        index = TestIndex(self.filename)
+        assert_equal(index.dependencies('some_test'), [base_file])
+        assert_equal(index.lookup('some_test', self.source_file), [])
+
+        open(base_file, 'a').write("# more base classes\n")
+        assert_equal(index.lookup('some_test', self.source_file), None)
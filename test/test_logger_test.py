@@ -0,0 +1,122 @@
+import json
+import logging
+import StringIO
+import time
+
+from testify import *
+from testify.test_logger import _is_logged, ColorlessTextTestLogger, JSONTestLogger, ThreadedTestLogger
+from testify.test_runner import TestRunner
+from test.test_runner_test import FailingTestCase, PassingTestCase
+
+class JSONTestLoggerTest(TestCase):
+    @setup
+    def run_tests(self):
+        runner = TestRunner(test_logger_class=JSONTestLogger)
+        runner.logger.stream = StringIO.StringIO()
+        runner.add_test_case(FailingTestCase)
+        runner.run()
+        self.records = [json.loads(line) for line in runner.logger.stream.getvalue().splitlines()]
+
+    def test_records(self):
+        assert_equal([record['event'] for record in self.records], ['test_start', 'test_result'] * 2 + ['run_complete'])
+
+        results = dict((record['test_id'], record) for record in self.records if record['event'] == 'test_result')
+        failed = results['test.test_runner_test.FailingTestCase.test_fail']
+        assert_equal(failed['status'], 'failure')
+        assert_in("assertion failed: 1 == 2", failed['exception'])
+        assert_in('test_method', failed['phase_times'])
+        assert_equal(results['test.test_runner_test.FailingTestCase.test_pass']['exception'], None)
+
+        summary = self.records[-1]
+        assert_equal((summary['test_count'], summary['failed'], summary['success']), (2, 1, False))
+
+    def test_start_times_are_taken_when_tests_start(self):
+        runner = TestRunner(test_logger_class=JSONTestLogger, background_output=True)
+        runner.logger.logger.stream = StringIO.StringIO()
+        runner.add_test_case(FailingTestCase)
+        runner.run()
+        records = [json.loads(line) for line in runner.logger.logger.stream.getvalue().splitlines()]
+
+        start_times = dict((record['test_id'], record['time']) for record in records if record['event'] == 'test_start')
+        results = [record for record in records if record['event'] == 'test_result']
+        assert_equal(len(results), 2)
+        for result in results:
+            assert start_times[result['test_id']] <= result['start_time']
+
+    def test_records_are_batched(self):
+        stream = StringIO.StringIO()
+        logger = JSONTestLogger(1, stream)
+        logger.autoflush = False
+        logger.FLUSH_INTERVAL = 60
+        logger.BATCH_SIZE = 2
+        logger.report_test_name(FailingTestCase().test_pass)
+        assert_equal(stream.getvalue(), '')
+        logger.report_test_name(FailingTestCase().test_pass)
+        assert_equal(len(stream.getvalue().splitlines()), 2)
+
+    def test_records_are_written_out_when_a_test_starts(self):
+        stream = StringIO.StringIO()
+        logger = JSONTestLogger(1, stream)
+        logger.FLUSH_INTERVAL = 60
+        logger.report_test_name(FailingTestCase().test_pass)
+        assert_equal([json.loads(line)['event'] for line in stream.getvalue().splitlines()], ['test_start'])
+
+    def test_records_are_written_out_in_the_background_while_a_test_runs(self):
+        stream = StringIO.StringIO()
+        json_logger = JSONTestLogger(1, stream)
+        json_logger.FLUSH_INTERVAL = 60
+        logger = ThreadedTestLogger(json_logger)
+        logger.report_test_name(FailingTestCase().test_pass)
+        # and nothing more is reported, as if the test had hung
+        deadline = time.time() + 5
+        while not stream.getvalue() and time.time() < deadline:
+            time.sleep(0.01)
+        assert_equal([json.loads(line)['event'] for line in stream.getvalue().splitlines()], ['test_start'])
+
+class ThreadedTestLoggerTest(TestCase):
+    def run_tests(self, **kwargs):
+        runner = TestRunner(test_logger_class=ColorlessTextTestLogger, summary_mode=True, **kwargs)
+        stream = StringIO.StringIO()
+        if kwargs.get('background_output'):
+            runner.logger.logger.stream = stream
+        else:
+            runner.logger.stream = stream
+        runner.add_test_case(PassingTestCase)
+        runner.add_test_case(FailingTestCase)
+        runner.run()
+        return stream.getvalue().splitlines()
+
+    def test_same_output_as_synchronous(self):
+        output = self.run_tests(background_output=True)
+        assert_in("AssertionError: assertion failed: 1 == 2", output)
+        # all but the total time
+        assert_equal(output[:-1], self.run_tests()[:-1])
+
+class IsLoggedTest(TestCase):
+    @setup
+    def create_loggers(self):
+        self.parent = logging.getLogger('test.test_logger_test.parent')
+        self.parent.propagate = False
+        self.parent.setLevel(logging.DEBUG)
+        self.logger = logging.getLogger('test.test_logger_test.parent.child')
+
+    @teardown
+    def remove_handlers(self):
+        for handler in list(self.parent.handlers):
+            self.parent.removeHandler(handler)
+
+    def add_handler(self, level):
+        handler = logging.StreamHandler(StringIO.StringIO())
+        handler.setLevel(level)
+        self.parent.addHandler(handler)
+
+    def test_nothing_is_logged_without_handlers(self):
+        assert not _is_logged(logging.INFO, self.logger)
+
+    def test_handler_levels_are_what_count(self):
+        self.add_handler(logging.WARNING)
+        assert not _is_logged(logging.INFO, self.logger)
+        assert _is_logged(logging.WARNING, self.logger)
+
+        self.add_handler(logging.INFO)
+        assert _is_logged(logging.INFO, self.logger)
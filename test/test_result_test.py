@@ -0,0 +1,48 @@
+import gc
+import sys
+import traceback
+import weakref
+
+from testify import *
+from testify.test_result import RemoteTestMethod, TestResult
+
+class Referent(object):
+    pass
+
+class CompactedTestCase(TestCase):
+    __test__ = False
+
+    @suite('some-suite')
+    def test_fail(self):
+        self.referent = Referent()
+        assert_equal(1, 2)
+
+class TestResultTest(TestCase):
+    def test_times_are_floats(self):
+        result = TestResult(CompactedTestCase().test_fail)
+        result.start()
+        result.end_in_success()
+        assert isinstance(result.start_time, float)
+        assert_equal(result.run_time, result.end_time - result.start_time)
+
+    def test_compact_releases_traceback_and_test_case(self):
+        test_case = CompactedTestCase()
+        result = TestResult(test_case.test_fail)
+        result.start()
+        try:
+            test_case.test_fail()
+        except AssertionError:
+            result.end_in_failure(sys.exc_info())
+        # otherwise we'd hold on to the exception until we return
+        sys.exc_clear()
+        referent = weakref.ref(test_case.referent)
+        del test_case
+
+        result.compact(lambda exception_info: ''.join(traceback.format_exception(*exception_info)))
+        gc.collect()
+
+        assert_equal(referent(), None)
+        assert_equal(result.exception_info, None)
+        assert_in("assertion failed: 1 == 2", result.formatted_exception_info)
+        assert isinstance(result.test_method, RemoteTestMethod)
+        assert CompactedTestCase.in_suite(result.test_method, 'some-suite')
@@ -0,0 +1,322 @@
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+import os
+import stat
+import StringIO
+import tempfile
+import threading
+
+from testify import *
+from testify import code_coverage, test_discovery
+from testify.coverage_index import CoverageIndex
+from testify.test_history import TestHistory, assign_buckets
+from testify.test_index import TestIndex
+from testify.test_logger import ColorlessTextTestLogger, VERBOSITY_SILENT
+from testify.test_program import get_bucket_overrides, write_bucket_overrides
+from testify.test_runner import TestRunner
+from testify.test_runner_parallel import ParallelTestRunner
+from testify.test_runner_server import TestRunnerClient, TestRunnerServer, parse_address
+
+class PassingTestCase(TestCase):
+    __test__ = False
+
+    def test_pass(self):
+        pass
+
+class FailingTestCase(TestCase):
+    __test__ = False
+
+    def test_fail(self):
+        assert_equal(1, 2)
+
+    def test_pass(self):
+        pass
+
+class ModuleBucketTest(TestCase):
+    def test_unindexed_modules_are_bucketed_whole(self):
+        module_test_cases = {
+            'tests.indexed_test': [
+                {'module': 'tests.indexed_test', 'name': 'FirstTestCase', 'test_methods': {}},
+                {'module': 'tests.indexed_test', 'name': 'SecondTestCase', 'test_methods': {}},
+            ],
+            'tests.unindexed_test': None,
+            'tests.overridden_test': None,
+        }
+        buckets = TestRunner().assign_module_buckets(module_test_cases, 4, {'tests.overridden_test.SomeTestCase': 3})
+        assert_equal(sorted(buckets), [
+            'tests.indexed_test.FirstTestCase',
+            'tests.indexed_test.SecondTestCase',
+            'tests.overridden_test',
+            'tests.unindexed_test',
+        ])
+        assert_equal(buckets['tests.overridden_test'], 3)
+
+    def test_bucketing_by_module_leaves_the_index_alone(self):
+        index_file = os.path.join(tempfile.mkdtemp(), 'index.json')
+        runner = TestRunner(index_file=index_file, module_method_overrides={})
+        runner.discover('test.test_index_test', bucket=0, bucket_count=1, import_test_cases=False, bucket_by_module=True)
+        assert_equal(runner.test_case_names(), ['test.test_index_test.TestIndexTest'])
+        # other buckets have to divide things up from the index as it was
+        assert not os.path.exists(index_file)
+
+class IndexedDiscoveryTest(TestCase):
+    def test_vanished_test_case_is_skipped_and_reindexed(self):
+        index_file = os.path.join(tempfile.mkdtemp(), 'index.json')
+        __import__('test.test_index_test')
+        source_file = test_discovery.module_source_file('test.test_index_test')
+        index = TestIndex(index_file)
+        index.update('test.test_index_test', source_file, [
+            {'module': 'test.test_index_test', 'name': 'RenamedTestCase', 'test_methods': {'test_gone': []}},
+            {'module': 'test.test_index_test', 'name': 'TestIndexTest', 'test_methods': {'test_describe_test_case': []}},
+        ])
+        index.save()
+
+        runner = TestRunner(index_file=index_file, module_method_overrides={})
+        runner.discover('test.test_index_test')
+        assert_equal(runner.test_case_names(), ['test.test_index_test.TestIndexTest'])
+        test_cases = TestIndex(index_file).lookup('test.test_index_test', source_file)
+        assert_equal([test_case['name'] for test_case in test_cases], ['TestIndexTest'])
+
+class BucketHistoryTest(TestCase):
+    test_case_names = ['tests.%s.SomeTestCase' % name for name in 'abcdefgh']
+
+    @setup
+    def record_history(self):
+        self.history_file = os.path.join(tempfile.mkdtemp(), 'history.json')
+        history = TestHistory(self.history_file)
+        for position, test_case_name in enumerate(self.test_case_names[:4]):
+            history.record_run_time(test_case_name, float(position + 1))
+        history.save()
+
+    def run_buckets(self, bucket_overrides):
+        """Select each of two buckets in turn, the first finishing (and saving what it ran in) before the second starts."""
+        selected = []
+        for bucket in range(2):
+            runner = TestRunner(history_file=self.history_file, module_method_overrides={},
+                test_logger_class=ColorlessTextTestLogger, verbosity=VERBOSITY_SILENT)
+            runner.logger.stream = StringIO.StringIO()
+            selected.append(runner.select_test_cases(self.test_case_names, bucket, 2, bucket_overrides))
+            for test_case_name in selected[-1]:
+                runner.history.record_run_time(test_case_name, 100.0)
+            runner.report_results(runner.create_results_log())
+        return selected
+
+    def assert_partitioned(self, selected):
+        first, second = selected
+        assert_equal(sorted(first + second), sorted(self.test_case_names))
+
+    def test_buckets_balanced_from_history_agree(self):
+        self.assert_partitioned(self.run_buckets({}))
+        # and the history's as it was
+        assert_equal(TestHistory(self.history_file).run_time(self.test_case_names[0]), 1.0)
+
+    def test_buckets_with_overrides_agree(self):
+        self.assert_partitioned(self.run_buckets({self.test_case_names[0]: 1}))
+        assert_equal(TestHistory(self.history_file).run_time(self.test_case_names[0]), 100.0)
+
+    def test_buckets_run_with_overrides_written_from_history_refresh_it(self):
+        # how a bucketed run keeps its history current: write overrides from it, then run every bucket with them
+        overrides_file = os.path.join(tempfile.mkdtemp(), 'overrides')
+        write_bucket_overrides(overrides_file, assign_buckets(self.test_case_names, 2, history=TestHistory(self.history_file)))
+        self.assert_partitioned(self.run_buckets(get_bucket_overrides(overrides_file)))
+
+        history = TestHistory(self.history_file)
+        assert_equal([history.run_time(test_case_name) for test_case_name in self.test_case_names], [100.0] * len(self.test_case_names))
+
+class ResultsLogTest(TestCase):
+    @setup
+    def build_runner(self):
+        self.results_log_file = os.path.join(tempfile.mkdtemp(), 'results.json')
+        self.runner = TestRunner(test_logger_class=ColorlessTextTestLogger, summary_mode=True, results_log_file=self.results_log_file)
+        self.runner.logger.stream = StringIO.StringIO()
+        self.runner.add_test_case(FailingTestCase)
+
+    def test_summary_is_read_back_from_log(self):
+        assert not self.runner.run()
+        output = self.runner.logger.stream.getvalue()
+        assert_in("FAILED.  2 tests / 1 case: 1 passed (0 unexpected), 1 failed (0 expected).", output)
+        # once as it happened, once in the summary
+        assert_equal(output.count("AssertionError: assertion failed: 1 == 2"), 2)
+
+    def test_report_on_unfinished_log(self):
+        self.runner.run()
+        # as if the run had died while writing another result
+        log_file = open(self.results_log_file, 'a')
+        log_file.write('{"test_method": {"test_ca')
+        log_file.close()
+
+        reporter = TestRunner(test_logger_class=ColorlessTextTestLogger)
+        reporter.logger.stream = StringIO.StringIO()
+        assert not reporter.report_results_log(self.results_log_file)
+        output = reporter.logger.stream.getvalue()
+        assert_in("test.test_runner_test FailingTestCase.test_fail", output)
+        assert_in("FAILED.  2 tests / 1 case: 1 passed", output)
+
+class ParallelTestRunnerTest(TestCase):
+    @setup
+    def build_runner(self):
+        self.runner = ParallelTestRunner(processes=2, test_logger_class=ColorlessTextTestLogger)
+        self.runner.logger.stream = StringIO.StringIO()
+
+    def test_passing_run(self):
+        self.runner.add_test_case(PassingTestCase)
+        assert self.runner.run()
+        assert_in("PASSED.  1 test / 1 case", self.runner.logger.stream.getvalue())
+
+    def test_failures_are_reported_by_parent(self):
+        self.runner.add_test_case(PassingTestCase)
+        self.runner.add_test_case(FailingTestCase)
+        assert not self.runner.run()
+
+        output = self.runner.logger.stream.getvalue()
+        assert_in("FAILED.  3 tests / 2 cases: 2 passed (0 unexpected), 1 failed (0 expected).", output)
+        assert_in("FailingTestCase.test_fail", output)
+        assert_in("AssertionError: assertion failed: 1 == 2", output)
+
+class TestRunnerServerTest(TestCase):
+    @setup
+    def build_server(self):
+        self.address = os.path.join(tempfile.mkdtemp(), 'testify.sock')
+        self.server = TestRunnerServer(address=self.address, test_logger_class=ColorlessTextTestLogger)
+        self.server.logger.stream = StringIO.StringIO()
+        self.server.add_test_case(PassingTestCase)
+        self.server.add_test_case(FailingTestCase)
+
+    def test_client_results_are_reported_by_server(self):
+        server_results = []
+        server_thread = threading.Thread(target=lambda: server_results.append(self.server.run()))
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+
+        client = TestRunnerClient(address=self.address)
+        client.add_test_case(PassingTestCase)
+        client.add_test_case(FailingTestCase)
+        assert client.run()
+        server_thread.join()
+
+        assert_equal(server_results, [False])
+        assert_in("FAILED.  3 tests / 2 cases: 2 passed (0 unexpected), 1 failed (0 expected).", self.server.logger.stream.getvalue())
+
+    def test_test_case_of_a_client_that_goes_away_is_handed_out_again(self):
+        server_results = []
+        server_thread = threading.Thread(target=lambda: server_results.append(self.server.run()))
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+
+        # take a TestCase, then disappear without running it
+        connection = Client(self.address)
+        connection.send(('get_test_case', None))
+        assert connection.recv() is not None
+        connection.close()
+        # otherwise the next client could take everything else and be done before it's requeued
+        while self.server.tasks.qsize() < 2:
+            server_thread.join(0.01)
+
+        client = TestRunnerClient(address=self.address)
+        client.add_test_case(PassingTestCase)
+        client.add_test_case(FailingTestCase)
+        assert client.run()
+        server_thread.join()
+
+        # failed for the lost client, but with every TestCase run
+        assert_equal(server_results, [False])
+        assert_in("FAILED.  3 tests / 2 cases: 2 passed (0 unexpected), 1 failed (0 expected).", self.server.logger.stream.getvalue())
+
+    def test_test_cases_requeued_with_no_client_left_time_out(self):
+        self.server.POLL_INTERVAL = 0.01
+        self.server.REQUEUE_TIMEOUT = 0.1
+        server_results = []
+        server_thread = threading.Thread(target=lambda: server_results.append(self.server.run()))
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+
+        # the only client takes a TestCase and disappears
+        connection = Client(self.address)
+        connection.send(('get_test_case', None))
+        assert connection.recv() is not None
+        connection.close()
+        server_thread.join(10)
+
+        assert not server_thread.isAlive()
+        assert_equal(server_results, [False])
+
+    def test_unix_socket_is_only_open_to_its_owner(self):
+        server_thread = threading.Thread(target=self.server.run)
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+        mode = os.stat(self.address).st_mode
+
+        client = TestRunnerClient(address=self.address)
+        client.add_test_case(PassingTestCase)
+        client.add_test_case(FailingTestCase)
+        client.run()
+        server_thread.join()
+
+        assert_equal(mode & (stat.S_IRWXG | stat.S_IRWXO), 0)
+
+    def test_clients_must_present_the_authkey(self):
+        self.server.authkey = 'sekrit'
+        server_thread = threading.Thread(target=self.server.run)
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+
+        assert_raises(AuthenticationError, Client, self.address, authkey='wrong')
+
+        client = TestRunnerClient(address=self.address, authkey='sekrit')
+        client.add_test_case(PassingTestCase)
+        client.add_test_case(FailingTestCase)
+        assert client.run()
+        server_thread.join()
+        assert_in("FAILED.  3 tests / 2 cases", self.server.logger.stream.getvalue())
+
+    def test_server_merges_client_coverage(self):
+        directory = tempfile.mkdtemp()
+        coverage_file = os.path.join(directory, 'coverage.json')
+        index_file = os.path.join(directory, 'coverage_index.json')
+        client_coverage_file = "%s.1234" % coverage_file
+        code_coverage.write_data_file(client_coverage_file, {'test.test_runner_test.PassingTestCase.test_pass': {'some_module.py': set([1, 2])}})
+        self.server = TestRunnerServer(address=self.address, test_logger_class=ColorlessTextTestLogger,
+            coverage=True, coverage_file=coverage_file, coverage_index_file=index_file)
+        self.server.logger.stream = StringIO.StringIO()
+        self.server.add_test_case(PassingTestCase)
+        server_thread = threading.Thread(target=self.server.run)
+        server_thread.start()
+        while not os.path.exists(self.address):
+            server_thread.join(0.01)
+
+        # a client that takes the TestCase, and reports nothing but some coverage data
+        connection = Client(self.address)
+        connection.send(('get_test_case', None))
+        assert connection.recv() is not None
+        connection.send(('done', client_coverage_file))
+        assert_equal(connection.recv(), 'done')
+        connection.close()
+        server_thread.join()
+
+        assert not os.path.exists(client_coverage_file)
+        assert_equal(code_coverage.read_data_file(coverage_file), {'test.test_runner_test.PassingTestCase.test_pass': {'some_module.py': set([1, 2])}})
+        assert_equal(CoverageIndex(index_file).affected_test_cases({'some_module.py': set([2])}), set(['test.test_runner_test.PassingTestCase']))
+
+    def test_client_without_a_server_fails(self):
+        client = TestRunnerClient(address=self.address)
+        client.add_test_case(PassingTestCase)
+        assert not client.run()
+
+class ServerAddressTest(TestCase):
+    def test_ports_alone_are_on_the_loopback_interface(self):
+        assert_equal(parse_address('8000'), ('127.0.0.1', 8000))
+        assert_equal(parse_address(':8000'), ('127.0.0.1', 8000))
+        assert_equal(parse_address('example.com:8000'), ('example.com', 8000))
+        assert_equal(parse_address('/tmp/testify.sock'), '/tmp/testify.sock')
+
+    def test_tcp_addresses_always_have_an_authkey(self):
+        assert_equal(TestRunnerServer(address='0.0.0.0:8000', authkey='sekrit').authkey, 'sekrit')
+        assert TestRunnerServer(address='0.0.0.0:8000').authkey
+        # anyone on this machine can reach the loopback interface
+        assert TestRunnerServer(address='localhost:8000').authkey
+        assert_equal(TestRunnerServer(address='/tmp/testify.sock').authkey, None)
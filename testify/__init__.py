@@ -37,11 +37,21 @@ from errors import TestifyError
 from test_case import (
    						MetaTestCase,
    						TestCase,
+   						session_setup,
+   						module_setup,
    						class_setup,
    						setup,
    						teardown,
    						class_teardown,
-   						suite)
-
-import test_program
-run = lambda: test_program.TestProgram(["__main__"] + sys.argv[1:])
+   						module_teardown,
+   						session_teardown,
+   						suite,
+   						timeout,
+   						depends_on)
+
+def run():
+    """Run the tests in __main__, taking options from the command line."""
+    # imported here so that just importing testify stays cheap
+    import sys
+    from testify import test_program
+    test_program.TestProgram(["__main__"] + sys.argv[1:])
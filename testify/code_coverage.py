@@ -6,55 +6,306 @@ __date__ ="$May 25, 2009"
 """This is a module for gathing code coverage information.
 Use coverage.start() to begin collecting information, and coverage.stop() to end collection.
 See https://trac.yelpcorp.com/wiki/TestingCoverage for more information
+
+Each process has a single ContextCollector, which runs the coverage package's tracer and files the
+lines it collects under the name of the current context: start() takes the name of the TestCase
+about to run, and switch_context() moves on to each of its test methods.  Everything collected is
+kept in memory and written to one data file by save() at the end of the run (one per worker when
+running in parallel).  merge() combines data files; run this module as a script to merge them, or
+to render them as an HTML report with the coverage package.
 """
 
+from collections import defaultdict
+import json
+import os
 import sys
-import pkg_resources
+
+from testify.utils.monotonic import monotonic
 
 class FakeCoverage:
     warning_printed = False
-    
+
     @classmethod
     def start(cls):
         if not cls.warning_printed:
-            print "*** WARNING: To gather coverage information you must install the Python coverage package.\nSee: https://trac.yelpcorp.com/wiki/TestingCoverage"
+            print "*** WARNING: To gather coverage information you must install the Python coverage package, version 4.2 or later.\nSee: https://trac.yelpcorp.com/wiki/TestingCoverage"
             cls.warning_printed = True
 
-    @staticmethod   
-    def stop(): pass
-    
-    @staticmethod   
-    def save(): pass
-    
 try:
     import coverage
 except (ImportError, NameError), ex:
     coverage = None
 
+# collecting by context needs Coverage.get_data() and the disable_warnings option, from coverage 4.2;
+# older versions can still render reports
+can_collect = coverage is not None and hasattr(coverage.coverage, 'get_data')
+
+# where save() writes to, unless told otherwise
+DATA_FILE = "coverage_file.json"
+
+class ContextCollector(object):
+    """Records which lines of which files run, filed under whichever context is current.
+
+    The lines are collected by the coverage package's tracer.  Whenever the context switches, we
+    take what it has collected since the last switch, file it under the old context, and erase it,
+    so each context only gets the lines run while it was current.  With source_roots, only files
+    under those directories are traced.
+
+    We time how long tracing was on, and how long filing lines by context took, so that
+    estimated_overhead() can estimate what collecting cost.
+    """
+
+    def __init__(self, source_roots=None):
+        # context -> filename -> set of line numbers
+        self.data = {}
+        self.context = None
+        self._lines = None
+        self.source_roots = [os.path.abspath(root) for root in source_roots or []]
+        self._coverage = create_coverage(self.source_roots)
+        self.traced_time = 0.0
+        self.harvest_time = 0.0
+        self._start_time = None
+        self._started = False
+
+    def switch_context(self, context):
+        """File the lines run from now on under context."""
+        if self._started:
+            self._harvest()
+        lines = self.data.get(context)
+        if lines is None:
+            lines = self.data[context] = defaultdict(set)
+        self.context = context
+        self._lines = lines
+
+    def start(self):
+        if self._lines is None:
+            self.switch_context(None)
+        self._start_time = monotonic()
+        self._coverage.start()
+        self._started = True
+
+    def stop(self):
+        self._coverage.stop()
+        self._started = False
+        self.traced_time += monotonic() - self._start_time
+        self._harvest()
+
+    def _harvest(self):
+        """Move the lines the coverage package has collected since we last looked into the current context."""
+        harvest_start = monotonic()
+        coverage_data = self._coverage.get_data()
+        for filename in coverage_data.measured_files():
+            lines = coverage_data.lines(filename)
+            if lines:
+                self._lines[filename].update(lines)
+        coverage_data.erase()
+        self.harvest_time += monotonic() - harvest_start
+
+    def current_lines(self):
+        """Return the lines collected under the current context so far, as {filename: set of line numbers}."""
+        if self._started:
+            self._harvest()
+        return self._lines
+
+    def add_lines(self, lines_by_file):
+        """File lines run somewhere we couldn't trace (a forked child, say), as {filename: line numbers}, under the current context."""
+        for filename, lines in lines_by_file.iteritems():
+            self._lines[filename].update(lines)
+
+    def contexts(self):
+        """Return our data as {context: {filename: set of line numbers}}."""
+        return dict((context or '', dict(lines_by_file)) for context, lines_by_file in self.data.iteritems())
+
+    def estimated_overhead(self):
+        """Return how long we traced for, and an estimate of what it cost, as a dict.
+
+        Nothing is run untraced to compare with, so this isn't a measurement.  The estimate assumes all the code traced ran as much slower as a loop we time with and
+        without tracing (see estimate_slowdown), so it's only a rough guide, and errs high when
+        much of what ran was outside our source roots.  Filing lines by context is timed exactly.
+        """
+        slowdown = estimate_slowdown()
+        return {
+            'estimated_seconds': self.traced_time * (1.0 - 1.0 / slowdown) + self.harvest_time,
+            'traced_time': self.traced_time,
+            'harvest_time': self.harvest_time,
+        }
+
+def create_coverage(source_roots=None):
+    """Return a coverage package Coverage that only traces files under source_roots, if given, and never saves anything itself."""
+    include = [os.path.join(root, '*') for root in source_roots] if source_roots else None
+    coverage_instance = coverage.coverage(data_file=None, include=include)
+    # a TestCase that runs nothing we trace is nothing to warn about
+    coverage_instance.set_option('run:disable_warnings', ['no-data-collected'])
+    return coverage_instance
+
+def _calibration_lines(iterations):
+    total = 0
+    for i in xrange(iterations):
+        if i % 3:
+            total += i
+    return total
+
+def _time_calibration(iterations, traced):
+    coverage_instance = create_coverage([os.path.dirname(os.path.abspath(__file__))]) if traced else None
+    start_time = monotonic()
+    if traced:
+        coverage_instance.start()
+    _calibration_lines(iterations)
+    if traced:
+        coverage_instance.stop()
+    return monotonic() - start_time
+
+_slowdown = None
+
+def estimate_slowdown(iterations=50000):
+    """Return roughly how many times slower traced code runs than untraced code, on this machine.
+
+    This is measured once per process, by timing a loop with and without tracing it.
+    """
+    global _slowdown
+    if _slowdown is None:
+        untraced_time = min(_time_calibration(iterations, traced=False) for _ in range(3))
+        traced_time = min(_time_calibration(iterations, traced=True) for _ in range(3))
+        _slowdown = max(traced_time / untraced_time, 1.0) if untraced_time > 0 else 1.0
+    return _slowdown
+
+def format_overhead(overhead):
+    """Describe an estimated_overhead() summary in a line of text."""
+    percentage = 100.0 * overhead['estimated_seconds'] / overhead['traced_time'] if overhead['traced_time'] else 0.0
+    return "Coverage cost an estimated %.2fs of %.2fs traced (%.1f%%), %.2fs of it filing lines by test" % (
+        overhead['estimated_seconds'], overhead['traced_time'], percentage, overhead['harvest_time'])
+
 started = False
-coverage_instance = None
+collector = None
+
+def start(testcase_name = None, source_roots=None):
+    """Start collecting, under the name of the TestCase about to run.
 
-def start(testcase_name = None):
+    source_roots only counts the first time: they're the same for the whole run.
+    """
     global started
-    global coverage_instance
+    global collector
     assert not started
-    if coverage is not None:
-        coverage_instance = coverage.coverage(data_file="coverage_file.", data_suffix=testcase_name, auto_data=True)
+    if not can_collect:
+        FakeCoverage.start()
     else:
-        coverage_instance = FakeCoverage()
-    
-    coverage_instance.start()
+        if collector is None:
+            collector = ContextCollector(source_roots)
+        collector.switch_context(testcase_name)
+        collector.start()
     started = True
 
 def stop():
     global started
-    global coverage_instance
     assert started
-    coverage_instance.stop()
-    coverage_instance.save()
+    if collector is not None:
+        collector.stop()
     started = False
 
+def switch_context(context):
+    """While collecting, file the lines run from now on under context, e.g. the test method about to run."""
+    if started and collector is not None:
+        collector.switch_context(context)
+
+def current_lines():
+    """While collecting, return the lines collected under the current context, as {filename: sorted line numbers}.
+
+    A forked child (see TestCase.fork_test_methods) sends these back for add_lines() in its
+    parent, since whatever it collects is lost when it exits.
+    """
+    if not started or collector is None:
+        return None
+    return dict((source_file, sorted(lines)) for source_file, lines in collector.current_lines().iteritems())
+
+def add_lines(lines_by_file):
+    """While collecting, add lines shipped back by current_lines() in a forked child under the current context."""
+    if started and collector is not None:
+        collector.add_lines(lines_by_file)
+
+def contexts():
+    """Return everything collected in this process, as {context: {filename: set of line numbers}}."""
+    if collector is None:
+        return {}
+    return collector.contexts()
+
+def save(filename=DATA_FILE):
+    """Write out everything collected in this process, if anything, along with what collecting it cost."""
+    if collector is not None:
+        write_data_file(filename, contexts(), collector.estimated_overhead())
+
+def write_data_file(filename, contexts, overhead=None):
+    data = dict((context, dict((source_file, sorted(lines)) for source_file, lines in lines_by_file.iteritems()))
+        for context, lines_by_file in contexts.iteritems())
+    data_file = open(filename, 'w')
+    try:
+        json.dump({'contexts': data, 'overhead': overhead}, data_file, separators=(',', ':'))
+    finally:
+        data_file.close()
+
+def _load_data_file(filename):
+    data_file = open(filename)
+    try:
+        return json.load(data_file)
+    finally:
+        data_file.close()
+
+def read_data_file(filename):
+    """Return the contents of a data file written by save(), as {context: {filename: set of line numbers}}."""
+    data = _load_data_file(filename)
+    return dict((context, dict((source_file, set(lines)) for source_file, lines in lines_by_file.iteritems()))
+        for context, lines_by_file in data['contexts'].iteritems())
+
+def read_overhead(filename):
+    """Return the estimated_overhead() summary saved in a data file, or None if it doesn't have one.
+
+    For a merged file, this is the total for all the processes that collected it.
+    """
+    return _load_data_file(filename).get('overhead')
+
+def merge_overhead(overhead, more_overhead):
+    if overhead is None or more_overhead is None:
+        return overhead or more_overhead
+    return dict((key, overhead[key] + more_overhead[key]) for key in overhead)
+
+def merge_contexts(contexts, more_contexts):
+    """Add the lines in more_contexts to contexts."""
+    for context, lines_by_file in more_contexts.iteritems():
+        merged_lines_by_file = contexts.setdefault(context, {})
+        for source_file, lines in lines_by_file.iteritems():
+            merged_lines_by_file.setdefault(source_file, set()).update(lines)
+    return contexts
+
+def merge(output_filename, input_filenames):
+    """Combine data files into one.  output_filename may be one of them."""
+    contexts = {}
+    overhead = None
+    for filename in input_filenames:
+        merge_contexts(contexts, read_data_file(filename))
+        overhead = merge_overhead(overhead, read_overhead(filename))
+    write_data_file(output_filename, contexts, overhead)
+
+def lines_by_file(contexts):
+    """Return the lines run in any context, as {filename: set of line numbers}."""
+    lines = defaultdict(set)
+    for context_lines_by_file in contexts.itervalues():
+        for source_file, context_lines in context_lines_by_file.iteritems():
+            lines[source_file].update(context_lines)
+    return lines
+
+def add_line_data(coverage_data, contexts):
+    """Load the lines run in any of contexts into a coverage package CoverageData, for it to report on."""
+    # add_line_data became add_lines in coverage 4.0
+    add_lines = getattr(coverage_data, 'add_lines', None) or coverage_data.add_line_data
+    add_lines(dict((source_file, dict.fromkeys(lines)) for source_file, lines in lines_by_file(contexts).iteritems()))
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        if len(sys.argv) < 4:
+            print "Usage: python code_coverage.py merge output_file data_file..."
+            quit()
+        merge(sys.argv[2], sys.argv[3:])
+        quit()
+
     if coverage is None:
         print """You must install the Python coverage 3.0.b3 package to use coverage.\nSee: https://trac.yelpcorp.com/wiki/TestingCoverage"""
         quit()
@@ -67,17 +318,17 @@ if __name__ == "__main__":
         diff_file = sys.argv[2]
     else:
         diff_file = None
-        
+
     directory = sys.argv[1]
-    coverage_instance = coverage.coverage(data_file="coverage_file.", auto_data=True)
+    coverage_instance = coverage.coverage(data_file="coverage_file.")
     coverage_instance.exclude("^import")
     coverage_instance.exclude("from.*import")
-    coverage_instance.combine()
+    add_line_data(coverage_instance.data, read_data_file(DATA_FILE))
     if diff_file is None:
         coverage_instance.html_report(morfs=None, directory=directory, ignore_errors=False, omit_prefixes=None)
     else:
         coverage_instance.svnhtml_report(morfs=None, directory=directory, ignore_errors=False, omit_prefixes=None, filename=diff_file)
-    
+
     #coverage_result = coverage_entry_point()
     #sys.exit(coverage_result)
-    
+
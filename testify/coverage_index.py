@@ -0,0 +1,192 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the CoverageIndex class, which remembers which tests ran each line of code,
+and diff_changed_lines, which works out which lines a diff touches, so that a run can be limited to
+the TestCases a change could affect."""
+__testify = 1
+
+import os
+import re
+
+from testify.test_logger import _log
+from testify.utils.json_file import load_json_file, update_json_file
+
+def source_file_key(filename):
+    """Return how a source file is named in a CoverageIndex: relative to the current directory if it's under it, absolute otherwise."""
+    filename = os.path.abspath(filename)
+    relative_filename = os.path.relpath(filename)
+    if relative_filename.startswith(os.pardir):
+        return filename
+    return relative_filename
+
+class CoverageIndex(object):
+    """A reverse index from each (source file, line) to the tests that ran it, persisted in a JSON file.
+
+    Tests are named by coverage context: "module.ClassName.test_method" for a test method (with its
+    setup and teardown), or "module.ClassName" for a TestCase's class fixtures.  The index also
+    remembers which TestCase each test belongs to.  update() replaces what we knew about each test
+    a run covered and leaves everything else alone, so partial and bucketed runs build up the index
+    between them, and several runs may update one file at once.
+
+    Source files are keyed by source_file_key, so the index should be built and used from the same
+    directory, which is also where diffs are expected to be rooted.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._load(load_json_file(filename, {}))
+
+    def _load(self, contents):
+        # source file -> line number (as a string, since it's JSON) -> test names
+        self.lines = contents.get('lines', {})
+        # test name -> TestCase name
+        self.tests = contents.get('tests', {})
+        self._test_case_names = set(self.tests.itervalues())
+
+    def test_case_names(self):
+        """Return the "module.ClassName" names of every TestCase the index has coverage for."""
+        return self._test_case_names
+
+    def update(self, contexts, test_case_names):
+        """Replace the index's lines for each test in contexts with the ones it ran this time.
+
+        contexts is coverage data as {context: {filename: lines}}; lines run outside any test
+        (under the empty context) are ignored.  test_case_names are the TestCases that may have
+        run, to tell their class-level contexts from their test methods'.  A test that ran no lines
+        we traced keeps what we knew about it: far more likely its lines were lost (run somewhere
+        we weren't tracing) than that it no longer runs any code at all.
+        """
+        test_case_names = set(test_case_names)
+        updated_tests = {}
+        for context, lines_by_file in contexts.iteritems():
+            if not context or not any(lines_by_file.itervalues()):
+                continue
+            if context in test_case_names:
+                updated_tests[context] = context
+            else:
+                updated_tests[context] = context.rsplit('.', 1)[0]
+        if not updated_tests:
+            return
+
+        def replace_tests(contents):
+            lines = contents.setdefault('lines', {})
+            for source_file, tests_by_line in lines.items():
+                for line, tests in tests_by_line.items():
+                    remaining_tests = [test for test in tests if test not in updated_tests]
+                    if remaining_tests:
+                        tests_by_line[line] = remaining_tests
+                    else:
+                        del tests_by_line[line]
+                if not tests_by_line:
+                    del lines[source_file]
+
+            for test, lines_by_file in sorted(contexts.iteritems()):
+                if test not in updated_tests:
+                    continue
+                for source_file, test_lines in lines_by_file.iteritems():
+                    tests_by_line = lines.setdefault(source_file_key(source_file), {})
+                    for line in test_lines:
+                        tests_by_line.setdefault(str(line), []).append(test)
+            contents.setdefault('tests', {}).update(updated_tests)
+
+        self._load(update_json_file(self.filename, replace_tests, {}))
+
+    def affected_tests(self, changed_lines):
+        """Return the names of the tests that ran any of changed_lines, given as {filename: set of line numbers}.
+
+        A changed line in a file some tests ran, but that none of them ran, is probably code that
+        runs at import time (a module constant, say, or a def line), so it counts as affecting
+        every test that ran anything in the file, whatever the file's other changed lines affect.
+        (Blank lines and comments never run either, so changing one does the same.)
+
+        A changed Python file that no test ran may still be run by all of them: coverage is only
+        collected once tests are imported, so a module whose code all runs at import time never
+        makes it into the index.  It counts as affecting every test we know of.
+        """
+        tests = set()
+        for source_file, lines in changed_lines.iteritems():
+            tests_by_line = self.lines.get(source_file_key(source_file))
+            if not tests_by_line:
+                if source_file.endswith('.py'):
+                    _log.warning("no test ran %s, which may only run at import time; every test is affected", source_file)
+                    return set(self.tests)
+                continue
+            for line in lines:
+                line_tests = tests_by_line.get(str(line))
+                if line_tests is None:
+                    for line_tests in tests_by_line.itervalues():
+                        tests.update(line_tests)
+                    break
+                tests.update(line_tests)
+        return tests
+
+    def affected_test_cases(self, changed_lines):
+        """Return the names of the TestCases with a test affected by changed_lines (see affected_tests)."""
+        return set(self.tests[test] for test in self.affected_tests(changed_lines))
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+def diff_changed_lines(diff_lines, strip=1):
+    """Return the lines a unified diff changes, as {filename: set of line numbers}.
+
+    Line numbers are those of the original files, since that's what the tests ran.  A removed line
+    is changed, and so are the lines either side of anywhere lines were added (rather than put in
+    place of removed ones).  Files the diff
+    creates have no original lines, so they're left out.  Like patch -p, strip is how many leading
+    components to remove from each filename (git prefixes them with a/ and b/).
+    """
+    changed_lines = {}
+    lines = None
+    # where we are in the current hunk, and how many of its lines on each side we've yet to see
+    old_line = old_remaining = new_remaining = 0
+    replacing = False
+    for diff_line in diff_lines:
+        diff_line = diff_line.rstrip('\r\n')
+        if old_remaining > 0 or new_remaining > 0:
+            if diff_line.startswith('-'):
+                if lines is not None:
+                    lines.add(old_line)
+                old_line += 1
+                old_remaining -= 1
+                replacing = True
+            elif diff_line.startswith('+'):
+                # lines added in place of removed ones are already accounted for
+                if lines is not None and not replacing:
+                    lines.update((old_line - 1, old_line))
+                new_remaining -= 1
+            elif not diff_line.startswith('\\'):
+                # context; some tools strip the space from blank lines
+                old_line += 1
+                old_remaining -= 1
+                new_remaining -= 1
+                replacing = False
+        elif diff_line.startswith('--- '):
+            filename = diff_line[4:].split('\t')[0].strip()
+            if filename == '/dev/null':
+                lines = None
+            else:
+                filename = os.path.join(*(filename.split('/')[strip:] or [filename]))
+                lines = changed_lines.setdefault(filename, set())
+        elif diff_line.startswith('@@'):
+            match = _HUNK_HEADER.match(diff_line)
+            if match:
+                old_start, old_count, new_start, new_count = match.groups()
+                old_remaining = int(old_count) if old_count is not None else 1
+                new_remaining = int(new_count) if new_count is not None else 1
+                # a hunk that only adds lines starts after the line it gives
+                old_line = int(old_start) + (1 if old_remaining == 0 else 0)
+                replacing = False
+    return dict((filename, lines) for filename, lines in changed_lines.iteritems() if lines)
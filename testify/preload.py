@@ -0,0 +1,185 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the PreloadServer class, which keeps testify and a tree of tests imported
+in a long-lived process so that individual runs don't have to pay to import them again.
+
+Each run request is served by a child forked from the warm server process.  The child's stdout and
+stderr are the client's socket, so output streams straight back to the client's terminal; once the
+run is over, the child sends EXIT_STATUS_MARKER followed by its exit status.  bin/testify-client is
+the client half of this.
+"""
+__testify = 1
+
+import json
+import os
+import socket
+import sys
+import traceback
+import types
+
+from testify import test_discovery
+from testify.utils import class_logger
+
+# Must match bin/testify-client.  The NUL keeps it from being confused with ordinary test output.
+EXIT_STATUS_MARKER = '\0testify-exit-status '
+
+class PreloadServer(object):
+    log = class_logger.ClassLogger()
+
+    def __init__(self, test_path, socket_path):
+        self.test_path = test_path
+        self.socket_path = socket_path
+        self.module_mtimes = {}
+
+    def preload(self):
+        """Import every test module under our test path, and remember how fresh each loaded module is."""
+        for test_case_class in test_discovery.discover(self.test_path):
+            pass
+        # testify leaves these until they're needed; every run served will need them
+        import testify.test_program
+        import testify.test_runner
+        from testify import test_logger
+        test_logger.load_color_traceback_formatter()
+
+        for module_name, module in sys.modules.items():
+            source_file = self._source_file(module)
+            if source_file is not None:
+                self.module_mtimes[module_name] = (source_file, os.path.getmtime(source_file))
+
+    def _source_file(self, module):
+        filename = getattr(module, '__file__', None)
+        if not filename:
+            return None
+        if filename.endswith(('.pyc', '.pyo')):
+            filename = filename[:-1]
+        if not (filename.endswith('.py') and os.path.exists(filename)):
+            return None
+        return filename
+
+    def serve_forever(self):
+        self.preload()
+
+        # bound under another name and moved into place, so that once the socket's there, we're listening
+        binding_path = "%s.%d" % (self.socket_path, os.getpid())
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(binding_path)
+        listener.listen(5)
+        os.rename(binding_path, self.socket_path)
+        self.log.info("preloaded %d modules from %s, serving on %s", len(self.module_mtimes), self.test_path, self.socket_path)
+
+        try:
+            while True:
+                connection, _ = listener.accept()
+                self._reap_children()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if os.fork() == 0:
+                    listener.close()
+                    self._serve_request(connection)
+                connection.close()
+        finally:
+            listener.close()
+            os.unlink(self.socket_path)
+
+    def _reap_children(self):
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0]:
+                pass
+        except OSError:
+            # no children left
+            pass
+
+    def _serve_request(self, connection):
+        """Run in a freshly forked child: act on one request from a client, then exit."""
+        exit_status = 1
+        try:
+            try:
+                request = json.loads(connection.makefile().readline())
+
+                # the client's terminal becomes ours
+                devnull = os.open(os.devnull, os.O_RDONLY)
+                os.dup2(devnull, 0)
+                os.dup2(connection.fileno(), 1)
+                os.dup2(connection.fileno(), 2)
+                os.chdir(request['cwd'])
+
+                self._forget_stale_modules()
+
+                # imported here, since the server itself never needs to run anything
+                from testify.test_program import TestProgram
+                try:
+                    TestProgram(request['args'])
+                    exit_status = 0
+                except SystemExit, e:
+                    exit_status = int(e.code or 0)
+            except Exception:
+                traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            try:
+                connection.sendall("%s%d\n" % (EXIT_STATUS_MARKER, exit_status))
+            finally:
+                os._exit(0)
+
+    def _forget_stale_modules(self):
+        """Drop modules whose source has changed since we preloaded them, so this run imports them afresh.
+
+        Dropping a module from sys.modules doesn't change what other modules got from it when they
+        imported it: they'd go on using the old module, or the old classes and functions they
+        imported from it.  So modules that refer to a stale module, or to anything defined in one,
+        are dropped too, and so on, to be imported again along with it.
+        """
+        stale_modules = set()
+        for module_name, (source_file, mtime) in self.module_mtimes.iteritems():
+            try:
+                changed = os.path.getmtime(source_file) != mtime
+            except OSError:
+                changed = True
+            if not changed:
+                continue
+
+            if _is_testify_module(module_name):
+                # can't swap the framework out from under the tests it has already loaded
+                sys.stderr.write("testify has changed (%s); restart the preload server to pick it up\n" % source_file)
+            else:
+                stale_modules.add(module_name)
+
+        dependents = stale_modules
+        while dependents:
+            dependents = set(module_name for module_name in self.module_mtimes
+                if module_name not in stale_modules and not _is_testify_module(module_name)
+                and _refers_to(sys.modules.get(module_name), stale_modules))
+            stale_modules.update(dependents)
+
+        for module_name in stale_modules:
+            sys.modules.pop(module_name, None)
+
+def _is_testify_module(module_name):
+    return module_name == 'testify' or module_name.startswith('testify.')
+
+def _refers_to(module, module_names):
+    """Return whether any of module's globals is one of the named modules, or a class or function defined in one."""
+    if module is None:
+        return False
+    for name, value in vars(module).items():
+        if isinstance(value, types.ModuleType):
+            # a package's submodules are its attributes, and importing them afresh replaces those
+            if value.__name__ in module_names and value.__name__ != "%s.%s" % (module.__name__, name):
+                return True
+        elif getattr(value, '__module__', None) in module_names:
+            return True
+    return False
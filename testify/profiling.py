@@ -0,0 +1,188 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the RunProfiler class, which profiles a whole run with cProfile and
+writes it up as one pstats file and a table of the functions that took the most time."""
+__testify = 1
+
+import cProfile
+import os
+import pstats
+import threading
+
+# where save() writes to, unless told otherwise
+PROFILE_FILE = "testify.pstats"
+
+# what we profile separately when profiling by phase: discovery (including importing the tests),
+# fixture methods, test methods, and everything else involved in running TestCases
+SECTIONS = ['discovery', 'fixtures', 'test_methods', 'run']
+
+class _StatsData(object):
+    """Raw stats (a pstats.Stats's stats dict), in a form pstats.Stats will accept, for stats shipped from another process."""
+
+    def __init__(self, stats):
+        self._stats = stats
+
+    def create_stats(self):
+        # pstats.Stats takes our stats over, and may add to them, so hand over a copy each time
+        self.stats = dict(self._stats)
+
+class RunProfiler(object):
+    """Profiles a run with cProfile, accumulating everything profiled into one set of stats.
+
+    Without by_phase, that's just running TestCases.  With by_phase, discovery, fixture methods
+    and test methods are each profiled separately as well (see SECTIONS): we keep a profile for
+    each and switch between them as the run moves from one phase to the next, which cuts each
+    function's stats off where its phase ends.
+
+    cProfile only profiles the thread that enabled it, so phases run on other threads (class_setup
+    fixtures run concurrently, say) aren't profiled.
+    """
+
+    def __init__(self, by_phase=False):
+        self.by_phase = by_phase
+        # section -> cProfile.Profile for what we've profiled in this process
+        self.profiles = {}
+        # section -> stats dicts shipped from other processes
+        self.shipped_stats = {}
+        self._active = None
+        self._thread = None
+
+    def profile(self, section, block_fxn):
+        """Call block_fxn, profiling it under section, and then go back to profiling whatever we were before."""
+        if not self.by_phase:
+            section = 'run'
+        if self._thread is not None and self._thread is not threading.currentThread():
+            return block_fxn()
+
+        previous = self._active
+        if previous is not None:
+            previous.disable()
+        profile = self.profiles.get(section)
+        if profile is None:
+            profile = self.profiles[section] = cProfile.Profile()
+        self._active = profile
+        self._thread = threading.currentThread()
+        profile.enable()
+        try:
+            return block_fxn()
+        finally:
+            profile.disable()
+            self._active = previous
+            if previous is not None:
+                previous.enable()
+            else:
+                self._thread = None
+
+    def phase_wrapper(self, result, phase, block_fxn):
+        """A TestCase phase_wrapper, profiling each phase (see test_result.PHASES) under its section."""
+        if phase == 'test_method':
+            return self.profile('test_methods', block_fxn)
+        return self.profile('fixtures', block_fxn)
+
+    def stats_by_section(self):
+        """Return what we've profiled in this process, as {section: stats dict}, for shipping to another process."""
+        return dict((section, pstats.Stats(profile).stats) for section, profile in self.profiles.iteritems())
+
+    def add_shipped_stats(self, stats_by_section):
+        """Add in stats from another process's stats_by_section."""
+        for section, stats in stats_by_section.iteritems():
+            self.shipped_stats.setdefault(section, []).append(stats)
+
+    def stats(self, section=None, stream=None):
+        """Return a pstats.Stats for everything profiled under section, or everything at all, or None if there's nothing."""
+        sources = []
+        for profile_section, profile in sorted(self.profiles.iteritems()):
+            if section is None or profile_section == section:
+                sources.append(profile)
+        for stats_section, shipped_stats in sorted(self.shipped_stats.iteritems()):
+            if section is None or stats_section == section:
+                sources.extend(_StatsData(stats) for stats in shipped_stats)
+        if not sources:
+            return None
+
+        stats = pstats.Stats(sources[0], stream=stream)
+        for source in sources[1:]:
+            stats.add(source)
+        return stats
+
+    def save(self, filename=PROFILE_FILE):
+        """Dump everything profiled, from every process, to filename as one set of pstats stats.
+
+        When profiling by phase, each section is also dumped on its own, to filename with the
+        section inserted before the extension (testify.fixtures.pstats, say).
+        """
+        stats = self.stats()
+        if stats is None:
+            return
+        stats.dump_stats(filename)
+        if self.by_phase:
+            for section in SECTIONS:
+                section_stats = self.stats(section)
+                if section_stats is not None:
+                    section_stats.dump_stats(section_filename(filename, section))
+
+    def summary(self, top=20):
+        """Return the top functions by cumulative and by self time, and with by_phase, how long each section took.
+
+        It's in a picklable (and JSON-able) form, for a test logger to report; see format_summary.
+        None if we've profiled nothing.
+        """
+        stats = self.stats()
+        if stats is None:
+            return None
+        section_times = None
+        if self.by_phase:
+            section_times = dict((section, self.stats(section).total_tt) for section in SECTIONS if self.stats(section) is not None)
+        return {
+            'total_time': stats.total_tt,
+            'section_times': section_times,
+            'cumulative': _top_functions(stats, 'cumulative', top),
+            'time': _top_functions(stats, 'time', top),
+        }
+
+def _top_functions(stats, sort_key, top):
+    stats.sort_stats(sort_key)
+    functions = []
+    for function in stats.fcn_list[:top]:
+        primitive_calls, calls, total_time, cumulative_time, callers = stats.stats[function]
+        functions.append({
+            'function': pstats.func_std_string(function),
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime': total_time,
+            'cumtime': cumulative_time,
+        })
+    return functions
+
+def format_summary(summary):
+    """Describe a RunProfiler.summary() in a few tables, as pstats would."""
+    lines = []
+    if summary['section_times'] is not None:
+        lines.append("Profiled time by phase: %s" % ", ".join(
+            "%s %.2fs" % (section, summary['section_times'][section]) for section in SECTIONS if section in summary['section_times']))
+    for sort_key, description in (('cumulative', 'cumulative time'), ('time', 'internal time')):
+        lines.append("Top %d functions by %s, of %.3fs profiled:" % (len(summary[sort_key]), description, summary['total_time']))
+        lines.append("%12s %9s %9s  %s" % ('ncalls', 'tottime', 'cumtime', 'filename:lineno(function)'))
+        for function in summary[sort_key]:
+            calls = str(function['calls'])
+            if function['primitive_calls'] != function['calls']:
+                calls += "/%d" % function['primitive_calls']
+            lines.append("%12s %9.3f %9.3f  %s" % (calls, function['tottime'], function['cumtime'], function['function']))
+    return "\n".join(lines)
+
+def section_filename(filename, section):
+    root, extension = os.path.splitext(filename)
+    return "%s.%s%s" % (root, section, extension)
@@ -0,0 +1,228 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the SamplingProfiler class, a statistical profiler that samples the stack
+on a timer signal and writes out what it saw as collapsed stacks, for making flame graphs."""
+__testify = 1
+
+import signal
+import sys
+import thread
+import threading
+
+from testify.utils.monotonic import monotonic
+
+# where save() writes to, unless told otherwise
+SAMPLES_FILE = "testify.collapsed"
+
+# the default seconds of CPU time between samples
+DEFAULT_INTERVAL = 0.005
+
+# what samples taken on the main thread outside anything we've labelled are filed under
+UNLABELLED = ('testify',)
+
+def _waiting_codes():
+    """Return the code objects of the threading methods a thread sits in while it waits, doing nothing."""
+    codes = set()
+    for method in (threading._Condition.wait, threading.Thread.join):
+        codes.add(method.im_func.func_code)
+    return frozenset(codes)
+
+_WAITING_CODES = _waiting_codes()
+
+class SamplingProfiler(object):
+    """Samples every thread's stack every interval seconds of CPU time, using ITIMER_PROF and SIGPROF.
+
+    Each sample is filed under the labels current on its thread when it's taken, which the runner
+    sets to the TestCase, test (or fixture) method and phase running; samples from other threads
+    without labels of their own are filed under "thread:" and the thread's name, so that what they
+    do isn't charged to the main thread.  A sample just records the code objects on the stack, and
+    is counted rather than kept, so sampling costs little more than walking the stacks; the time
+    spent in the signal handler is measured, so report() can say what it was.
+
+    The timer counts CPU time, not wall time, so time spent sleeping or waiting on I/O isn't
+    sampled, and it leaves SIGALRM free for test timeouts.  But it counts the CPU time of all our
+    threads together, so each sample takes in every thread, except those waiting in threading
+    (on a lock, Queue or Event, say), which can't be what's using it.  Threads blocked elsewhere,
+    in time.sleep say, are sampled all the same.
+
+    The timer isn't inherited by forked processes, so the test methods of TestCases with
+    fork_test_methods aren't sampled.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        # (labels, code objects from the root of the stack down) -> number of samples
+        self.samples = {}
+        # collapsed stack -> number of samples, and phase -> number of samples, shipped from other processes
+        self.shipped_samples = {}
+        self.shipped_phase_counts = {}
+        # thread ident -> the labels samples taken on that thread are filed under
+        self.labels = {}
+        self.sample_count = 0
+        self.sample_time = 0.0
+        self.run_time = 0.0
+        self._start_time = None
+        self._previous_handler = None
+        # signals are handled on the main thread, which is the one we have to be created on to handle them
+        self._thread_ident = thread.get_ident()
+
+    def start(self):
+        """Start sampling, unless we already are."""
+        if self._start_time is not None:
+            return
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        # system calls interrupted by a sample carry on, rather than failing with EINTR
+        signal.siginterrupt(signal.SIGPROF, False)
+        self._start_time = monotonic()
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        if self._start_time is None:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self.run_time += monotonic() - self._start_time
+        self._start_time = None
+
+    def _sample(self, signum, frame):
+        sample_start = monotonic()
+        # the handler runs on the main thread, where frame is what it interrupted
+        frames = sys._current_frames()
+        frames[self._thread_ident] = frame
+        for thread_ident, frame in frames.iteritems():
+            if frame is None or frame.f_code in _WAITING_CODES:
+                continue
+            labels = self.labels.get(thread_ident)
+            if labels is None:
+                labels = UNLABELLED if thread_ident == self._thread_ident else self._thread_labels(thread_ident)
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            key = (labels, tuple(codes))
+            self.samples[key] = self.samples.get(key, 0) + 1
+        self.sample_count += 1
+        self.sample_time += monotonic() - sample_start
+
+    def _thread_labels(self, thread_ident):
+        # threading.enumerate() takes a lock the thread we've interrupted might hold, so just look
+        active_thread = threading._active.get(thread_ident)
+        return ("thread:%s" % (active_thread.getName() if active_thread is not None else thread_ident),)
+
+    def label(self, labels, block_fxn):
+        """Call block_fxn, filing samples taken meanwhile on this thread under labels (a tuple of strings)."""
+        thread_ident = thread.get_ident()
+        previous_labels = self.labels.get(thread_ident)
+        self.labels[thread_ident] = labels
+        try:
+            return block_fxn()
+        finally:
+            if previous_labels is None:
+                del self.labels[thread_ident]
+            else:
+                self.labels[thread_ident] = previous_labels
+
+    def phase_wrapper(self, result, phase, block_fxn):
+        """A TestCase phase_wrapper, labelling samples with the TestCase, method and phase (see test_result.PHASES) running."""
+        test_method = result.test_method
+        test_case_name = "%s.%s" % (test_method.im_class.__module__, test_method.im_class.__name__)
+        return self.label((test_case_name, result.test_method_name, phase), block_fxn)
+
+    def collapsed(self):
+        """Return our samples, and any shipped to us, as {collapsed stack: number of samples}.
+
+        A collapsed stack is its labels and then each function on the stack, from the root down,
+        separated by semicolons, as flame graph tools expect.
+        """
+        collapsed = dict(self.shipped_samples)
+        code_names = {}
+        for (labels, codes), count in self.samples.iteritems():
+            names = list(labels)
+            for code in codes:
+                if code not in code_names:
+                    code_names[code] = ("%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno)).replace(';', ':')
+                names.append(code_names[code])
+            stack = ';'.join(names)
+            collapsed[stack] = collapsed.get(stack, 0) + count
+        return collapsed
+
+    def phase_counts(self):
+        """Return how many samples, ours and any shipped to us, were taken in each phase.
+
+        The phase is the last of a sample's labels: a test_result.PHASES phase, or 'run' for the
+        rest of running a TestCase, 'discovery', "thread:" and a name for another thread's samples,
+        or 'testify' for everything else.
+        """
+        phase_counts = dict(self.shipped_phase_counts)
+        for (labels, codes), count in self.samples.iteritems():
+            phase_counts[labels[-1]] = phase_counts.get(labels[-1], 0) + count
+        return phase_counts
+
+    def add_shipped_samples(self, summary):
+        """Add in another process's samples, from its summary()."""
+        for stack, count in summary['collapsed'].iteritems():
+            self.shipped_samples[stack] = self.shipped_samples.get(stack, 0) + count
+        for phase, count in summary['phase_counts'].iteritems():
+            self.shipped_phase_counts[phase] = self.shipped_phase_counts.get(phase, 0) + count
+        self.sample_count += summary['sample_count']
+        self.sample_time += summary['sample_time']
+        self.run_time += summary['run_time']
+
+    def summary(self):
+        """Return our samples and what they cost, in a picklable form, for add_shipped_samples in another process."""
+        return {
+            'collapsed': self.collapsed(),
+            'phase_counts': self.phase_counts(),
+            'sample_count': self.sample_count,
+            'sample_time': self.sample_time,
+            'run_time': self.run_time,
+        }
+
+    def save(self, filename=SAMPLES_FILE):
+        """Write out every sample as collapsed stacks, one per line followed by its count."""
+        samples_file = open(filename, 'w')
+        try:
+            for stack, count in sorted(self.collapsed().iteritems()):
+                samples_file.write("%s %d\n" % (stack, count))
+        finally:
+            samples_file.close()
+
+    def overhead(self):
+        """Return how many samples we took and what it cost, and how many were in each phase, for a test logger to report.
+
+        See format_overhead.
+        """
+        return {
+            'sample_count': self.sample_count,
+            'interval': self.interval,
+            'sample_time': self.sample_time,
+            'run_time': self.run_time,
+            'phase_counts': self.phase_counts(),
+        }
+
+def format_overhead(overhead):
+    """Describe an overhead() summary in a couple of lines of text."""
+    percentage = 100.0 * overhead['sample_time'] / overhead['run_time'] if overhead['run_time'] else 0.0
+    lines = ["Took %d samples of every thread, every %.1fms of CPU time, costing %.3fs of %.2fs run (%.1f%%)" % (
+        overhead['sample_count'], overhead['interval'] * 1000, overhead['sample_time'], overhead['run_time'], percentage)]
+
+    phase_counts = overhead['phase_counts']
+    total = sum(phase_counts.itervalues())
+    if total:
+        lines.append("Samples by phase: %s" % ", ".join("%s %.1f%%" % (phase, 100.0 * count / total)
+            for phase, count in sorted(phase_counts.iteritems(), key=lambda (phase, count): (-count, phase))))
+    return "\n".join(lines)
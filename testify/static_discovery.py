@@ -0,0 +1,289 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Discovery of TestCases by parsing test modules rather than importing them.
+
+This finds TestCase subclasses, their test methods and any literal suites applied to them with
+@suite(...) or _suites, producing the same descriptions as test_index.describe_test_case.  It's
+only good enough for listing tests: anything it can't follow without running the module (base
+classes it doesn't know about, conditional class definitions, computed suites and so on) makes it
+give up on that module, and the caller falls back to importing it.  Test methods generated at
+runtime are never seen.
+"""
+__testify = 1
+
+import ast
+
+# where TestCase and suite may be imported from
+TESTIFY_MODULES = ('testify', 'testify.test_case')
+
+BUILTIN_BASES = ('object', 'Exception')
+
+class Unresolvable(Exception):
+    """Raised when a module does something we can't follow without running it."""
+    pass
+
+# markers for what a module-level name refers to
+_TEST_CASE = object()
+_SUITE = object()
+
+def _literal_strings(node):
+    """Return the strings in a literal list, tuple or set(...) of strings."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('set', 'frozenset', 'list', 'tuple') and len(node.args) <= 1 and not node.keywords:
+        if not node.args:
+            return []
+        node = node.args[0]
+    if isinstance(node, (ast.List, ast.Tuple, getattr(ast, 'Set', ast.List))) and all(isinstance(element, ast.Str) for element in node.elts):
+        return [element.s for element in node.elts]
+    raise Unresolvable("not a literal collection of strings")
+
+def _dotted_name(node):
+    """Turn a Name or chain of Attributes into a dotted string."""
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        return "%s.%s" % (_dotted_name(node.value), node.attr)
+    raise Unresolvable("not a dotted name")
+
+def module_suites(source_file):
+    """Return the literal _suites a module (or package __init__) applies to everything in it."""
+    tree = ast.parse(open(source_file).read(), source_file)
+    suites = []
+    for statement in tree.body:
+        if isinstance(statement, ast.Assign) and any(isinstance(target, ast.Name) and target.id == '_suites' for target in statement.targets):
+            suites = _literal_strings(statement.value)
+    return suites
+
+class _ClassInfo(object):
+    def __init__(self, name):
+        self.name = name
+        self.is_test_case = False
+        self.discoverable = True
+        self.suites = set()
+        self.test_methods = {}
+
+class _ModuleDescriber(object):
+    def __init__(self, module_name, known_test_cases, used_test_cases=None):
+        self.module_name = module_name
+        self.package_name = module_name.rsplit('.', 1)[0] if '.' in module_name else ''
+        self.known_test_cases = known_test_cases
+        self.used_test_cases = used_test_cases if used_test_cases is not None else []
+        # local name -> _TEST_CASE, _SUITE, a _ClassInfo, or the dotted name of whatever was imported
+        self.names = {}
+        self.star_imported = False
+        self.suites = []
+        self.classes = []
+
+    def describe(self, tree, inherited_suites):
+        for statement in tree.body:
+            self.visit_statement(statement)
+
+        suites = set(inherited_suites) | set(self.suites)
+        test_cases = []
+        for class_info in self.classes:
+            if class_info.is_test_case and class_info.discoverable:
+                test_cases.append({
+                    'module': self.module_name,
+                    'name': class_info.name,
+                    'test_methods': dict(
+                        (method_name, sorted(set(method_suites) | class_info.suites | suites))
+                        for method_name, method_suites in class_info.test_methods.iteritems()),
+                })
+
+        # TestCases imported from elsewhere are discovered here too
+        for local_name, value in sorted(self.names.iteritems()):
+            if isinstance(value, basestring):
+                test_case = self.known_test_case(value)
+                if test_case is not None and test_case not in test_cases:
+                    test_cases.append(test_case)
+        return test_cases
+
+    def visit_statement(self, statement):
+        if isinstance(statement, ast.Import):
+            for alias in statement.names:
+                if alias.asname:
+                    self.names[alias.asname] = alias.name
+                else:
+                    root = alias.name.split('.')[0]
+                    self.names[root] = root
+        elif isinstance(statement, ast.ImportFrom):
+            self.visit_import_from(statement)
+        elif isinstance(statement, ast.ClassDef):
+            class_info = self.describe_class(statement)
+            self.names[statement.name] = class_info
+            self.classes.append(class_info)
+        elif isinstance(statement, (ast.FunctionDef, ast.Assign)):
+            targets = [statement.name] if isinstance(statement, ast.FunctionDef) else [target.id for target in statement.targets if isinstance(target, ast.Name)]
+            for target in targets:
+                if target == '_suites':
+                    self.suites = _literal_strings(statement.value)
+                else:
+                    # rebinding a name we know about leaves us guessing
+                    self.names.pop(target, None)
+        else:
+            # Conditional imports are fine, but a class defined inside an if or try may or may not
+            # exist, depending on things we can't know.
+            for node in ast.walk(statement):
+                if isinstance(node, ast.ClassDef):
+                    raise Unresolvable("conditional class definition")
+                elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                    self.visit_statement(node)
+
+    def visit_import_from(self, statement):
+        module = statement.module or ''
+        if getattr(statement, 'level', 0):
+            package_parts = self.module_name.split('.')[:-statement.level]
+            module = '.'.join(package_parts + ([module] if module else []))
+
+        for alias in statement.names:
+            local_name = alias.asname or alias.name
+            if module in TESTIFY_MODULES:
+                if alias.name == '*':
+                    self.names['TestCase'] = _TEST_CASE
+                    self.names['suite'] = _SUITE
+                elif alias.name == 'TestCase':
+                    self.names[local_name] = _TEST_CASE
+                elif alias.name == 'suite':
+                    self.names[local_name] = _SUITE
+            elif alias.name == '*':
+                self.star_imported = True
+            else:
+                self.names[local_name] = "%s.%s" % (module, alias.name)
+
+    def resolve(self, node):
+        """Work out what a base class or decorator expression refers to."""
+        dotted_name = _dotted_name(node)
+        if dotted_name in ("%s.TestCase" % module for module in TESTIFY_MODULES):
+            return _TEST_CASE
+        elif dotted_name in ("%s.suite" % module for module in TESTIFY_MODULES):
+            return _SUITE
+
+        root, _, rest = dotted_name.partition('.')
+        if root in self.names:
+            value = self.names[root]
+            if not rest:
+                return value
+            elif isinstance(value, basestring):
+                return "%s.%s" % (value, rest)
+        elif not rest and root in BUILTIN_BASES and not self.star_imported:
+            return root
+        raise Unresolvable("can't resolve %s" % dotted_name)
+
+    def known_test_case(self, name):
+        """Find the description of a TestCase imported from elsewhere, trying implicit relative imports first."""
+        candidates = [name]
+        if self.package_name:
+            candidates.insert(0, "%s.%s" % (self.package_name, name))
+        for candidate in candidates:
+            if candidate in self.known_test_cases:
+                self.used_test_cases.append(self.known_test_cases[candidate])
+                return self.known_test_cases[candidate]
+        return None
+
+    def describe_class(self, class_def):
+        class_info = _ClassInfo(class_def.name)
+
+        # later bases' methods are overridden by earlier ones', as in the MRO
+        for base in reversed(class_def.bases):
+            resolved = self.resolve(base)
+            if resolved is _TEST_CASE:
+                class_info.is_test_case = True
+            elif isinstance(resolved, _ClassInfo):
+                class_info.is_test_case = class_info.is_test_case or resolved.is_test_case
+                # _suites is looked up through the MRO, so the first base with any supplies them
+                if resolved.suites:
+                    class_info.suites = set(resolved.suites)
+                class_info.test_methods.update(resolved.test_methods)
+            elif resolved in BUILTIN_BASES:
+                pass
+            else:
+                base_test_case = self.known_test_case(resolved)
+                if base_test_case is None:
+                    raise Unresolvable("unknown base class %s" % resolved)
+                class_info.is_test_case = True
+                class_info.test_methods.update(base_test_case['test_methods'])
+
+        for decorator in getattr(class_def, 'decorator_list', []):
+            class_info.suites.update(self.decorator_suites(decorator, {}))
+
+        class_names = {}
+        for statement in class_def.body:
+            if isinstance(statement, ast.FunctionDef):
+                method_suites = set()
+                for decorator in statement.decorator_list:
+                    method_suites.update(self.decorator_suites(decorator, class_names))
+                if statement.name.startswith('test'):
+                    class_info.test_methods[statement.name] = sorted(method_suites)
+                class_names[statement.name] = statement
+            elif isinstance(statement, ast.Assign):
+                for target in statement.targets:
+                    if not isinstance(target, ast.Name):
+                        continue
+                    if target.id == '_suites':
+                        class_info.suites = set(_literal_strings(statement.value))
+                    elif target.id == '__test__':
+                        if not (isinstance(statement.value, ast.Name) and statement.value.id in ('True', 'False')):
+                            raise Unresolvable("computed __test__")
+                        class_info.discoverable = statement.value.id == 'True'
+                    elif target.id.startswith('test') or target.id == '__metaclass__':
+                        raise Unresolvable("%s assigned in class body" % target.id)
+                    class_names[target.id] = statement
+            elif isinstance(statement, ast.ClassDef):
+                class_names[statement.name] = statement
+        return class_info
+
+    def decorator_suites(self, decorator, class_names):
+        """Return the suites a decorator applies; any decorator other than suite() is assumed to leave them alone."""
+        call = decorator if isinstance(decorator, ast.Call) else None
+        target = call.func if call else decorator
+        if isinstance(target, ast.Name) and target.id in class_names:
+            # a decorator named after something defined earlier in the class body is that thing
+            raise Unresolvable("decorator %s defined in class body" % target.id)
+
+        try:
+            resolved = self.resolve(target)
+        except Unresolvable:
+            return []
+        if resolved is not _SUITE:
+            return []
+        if call is None or getattr(call, 'starargs', None) or getattr(call, 'kwargs', None):
+            raise Unresolvable("non-literal suite()")
+
+        suites = []
+        for arg in call.args:
+            if not isinstance(arg, ast.Str):
+                raise Unresolvable("non-literal suite name")
+            suites.append(arg.s)
+        for keyword in call.keywords:
+            if keyword.arg == 'conditions':
+                if not (isinstance(keyword.value, ast.Name) and keyword.value.id in ('True', 'False', 'None')):
+                    raise Unresolvable("computed suite conditions")
+                if keyword.value.id == 'False':
+                    return []
+        return suites
+
+def describe_module(module_name, source_file, known_test_cases, inherited_suites=(), used_test_cases=None):
+    """Describe the TestCases a module defines, from its source alone.
+
+    known_test_cases maps "module.ClassName" to descriptions of TestCases elsewhere, for resolving
+    imported base classes; inherited_suites are the suites of the packages the module is in.  If
+    used_test_cases is given, the descriptions of any known TestCases the module refers to are
+    appended to it.  Returns None if the module can't be resolved statically.
+    """
+    try:
+        tree = ast.parse(open(source_file).read(), source_file)
+        return _ModuleDescriber(module_name, known_test_cases, used_test_cases).describe(tree, inherited_suites)
+    except (SyntaxError, Unresolvable):
+        return None
@@ -0,0 +1,192 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the SuiteIndex class, which maps each suite to the set of test methods in it,
+and parse_suite_expression, for selecting test methods with expressions like "db and not slow"."""
+__testify = 1
+
+from collections import defaultdict
+import re
+
+from errors import TestifyError
+
+class SuiteExpressionError(TestifyError): pass
+
+class SuiteIndex(object):
+    """Gives each test method an integer ID, and keeps the set of IDs in each suite.
+
+    Test methods are identified by whatever hashable key the caller likes, and grouped by an owner
+    (typically their TestCase) so that an owner's test methods can be replaced wholesale.  Picking
+    out the test methods a run should include is then a handful of set operations, rather than a
+    loop over every test method.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+        self.test_method_suites = {}
+        self.all = set()
+        self.suites = defaultdict(set)
+        self._owned = {}
+        self._selections = {}
+
+    def update(self, owner, test_methods):
+        """Record an owner's test methods, given as (key, suites) pairs, forgetting any it had before.
+
+        Returns the IDs of the test methods, in the order given.
+        """
+        for test_method_id, suites in self._owned.pop(owner, ()):
+            self.all.discard(test_method_id)
+            del self.test_method_suites[test_method_id]
+            for suite_name in suites:
+                self.suites[suite_name].discard(test_method_id)
+
+        owned = []
+        for key, suites in test_methods:
+            test_method_id = self.ids.get(key)
+            if test_method_id is None:
+                test_method_id = self.ids[key] = len(self.keys)
+                self.keys.append(key)
+            self.all.add(test_method_id)
+            self.test_method_suites[test_method_id] = suites
+            for suite_name in suites:
+                self.suites[suite_name].add(test_method_id)
+            owned.append((test_method_id, suites))
+        self._owned[owner] = owned
+        self._selections.clear()
+        return [test_method_id for test_method_id, suites in owned]
+
+    def members(self, suite_name):
+        return self.suites.get(suite_name, set())
+
+    def select(self, suites_include=(), suites_exclude=(), expression=None):
+        """Return the IDs of the test methods in any of suites_include (if there are any), none of
+        suites_exclude, and matching expression (if given), which may be a string or a parsed
+        SuiteExpression."""
+        if isinstance(expression, basestring):
+            expression = parse_suite_expression(expression)
+        selection_key = (frozenset(suites_include), frozenset(suites_exclude), expression and expression.text)
+        if selection_key not in self._selections:
+            if suites_include:
+                selected = set().union(*[self.members(suite_name) for suite_name in suites_include])
+            else:
+                selected = set(self.all)
+            for suite_name in suites_exclude:
+                selected -= self.members(suite_name)
+            if expression is not None:
+                selected &= expression.evaluate(self)
+            self._selections[selection_key] = selected
+        return self._selections[selection_key]
+
+    def counts(self, selected=None):
+        """Return the number of test methods (of those selected, if given) in each suite."""
+        counts = {}
+        for suite_name, members in self.suites.iteritems():
+            count = len(members & selected) if selected is not None else len(members)
+            if count:
+                counts[suite_name] = count
+        return counts
+
+def suites_selected(suites, suites_include=(), suites_exclude=(), expression=None):
+    """Whether a single test method in the given suites would be selected by SuiteIndex.select."""
+    if suites_exclude and set(suites_exclude) & suites:
+        return False
+    if suites_include and not set(suites_include) & suites:
+        return False
+    if isinstance(expression, basestring):
+        expression = parse_suite_expression(expression)
+    return expression is None or expression.matches(suites)
+
+class SuiteExpression(object):
+    """A parsed suite expression, which can be evaluated over a SuiteIndex or against one test method's suites."""
+
+    def __init__(self, text, operator, operands):
+        self.text = text
+        self.operator = operator
+        self.operands = operands
+
+    def evaluate(self, index):
+        if self.operator == 'suite':
+            return index.members(self.operands[0])
+        elif self.operator == 'not':
+            return index.all - self.operands[0].evaluate(index)
+        elif self.operator == 'and':
+            return self.operands[0].evaluate(index) & self.operands[1].evaluate(index)
+        else:
+            return self.operands[0].evaluate(index) | self.operands[1].evaluate(index)
+
+    def matches(self, suites):
+        if self.operator == 'suite':
+            return self.operands[0] in suites
+        elif self.operator == 'not':
+            return not self.operands[0].matches(suites)
+        elif self.operator == 'and':
+            return self.operands[0].matches(suites) and self.operands[1].matches(suites)
+        else:
+            return self.operands[0].matches(suites) or self.operands[1].matches(suites)
+
+_token_re = re.compile(r'\s*(?:([()])|([^\s()]+))')
+_parsed_expressions = {}
+
+def parse_suite_expression(text):
+    """Parse a boolean expression over suite names, like "db and not (slow or flaky)".
+
+    "not" binds tightest, then "and", then "or"; anything else that isn't a parenthesis is a suite name.
+    """
+    if text in _parsed_expressions:
+        return _parsed_expressions[text]
+
+    tokens = []
+    position = 0
+    while text[position:].strip():
+        match = _token_re.match(text, position)
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+
+    def parse_or(position):
+        left, position = parse_and(position)
+        while position < len(tokens) and tokens[position] == 'or':
+            right, position = parse_and(position + 1)
+            left = SuiteExpression(text, 'or', [left, right])
+        return left, position
+
+    def parse_and(position):
+        left, position = parse_not(position)
+        while position < len(tokens) and tokens[position] == 'and':
+            right, position = parse_not(position + 1)
+            left = SuiteExpression(text, 'and', [left, right])
+        return left, position
+
+    def parse_not(position):
+        if position >= len(tokens):
+            raise SuiteExpressionError("Unexpected end of suite expression: %s" % text)
+        token = tokens[position]
+        if token == 'not':
+            operand, position = parse_not(position + 1)
+            return SuiteExpression(text, 'not', [operand]), position
+        elif token == '(':
+            expression, position = parse_or(position + 1)
+            if position >= len(tokens) or tokens[position] != ')':
+                raise SuiteExpressionError("Unbalanced parentheses in suite expression: %s" % text)
+            return expression, position + 1
+        elif token in (')', 'and', 'or'):
+            raise SuiteExpressionError("Unexpected %r in suite expression: %s" % (token, text))
+        return SuiteExpression(text, 'suite', [token]), position + 1
+
+    expression, position = parse_or(0)
+    if position != len(tokens):
+        raise SuiteExpressionError("Unexpected %r in suite expression: %s" % (tokens[position], text))
+    _parsed_expressions[text] = expression
+    return expression
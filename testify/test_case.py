@@ -22,20 +22,33 @@ __testify = 1
 
 from collections import defaultdict
 import datetime
+import errno
 import inspect
+import json
 import logging
 from new import instancemethod
+import os
+import Queue
+import select
+import signal
 import sys
+import threading
+import time
 import traceback
 import types
 
+from errors import TestifyError
 from test_logger import _log
 from test_result import TestResult
+from suite_index import SuiteIndex, suites_selected
 import deprecated_assertions
 from testify.utils import class_logger
 
 # just a useful list to have
 fixture_types = ['class_setup', 'setup', 'teardown', 'class_teardown']
+# fixtures shared between TestCases; see SharedFixtures
+shared_fixture_scopes = ['session', 'module']
+shared_fixture_types = ['session_setup', 'module_setup', 'module_teardown', 'session_teardown']
 deprecated_fixture_type_map = {
     'classSetUp': 'class_setup', 
     'setUp': 'setup', 
@@ -49,13 +62,31 @@ class TwistedFailureError(Exception):
     """
     pass
 
+class TestTimeoutError(TestifyError):
+    """Raised in a test or fixture method that ran past its timeout, wherever it happened to be at the time."""
+    pass
+
+class ForkedTestMethodError(TestifyError):
+    """A test method run in a child process, for fork_test_methods, died or hung without sending back its result."""
+    pass
+
 class MetaTestCase(type):
     """This base metaclass is used to collect each TestCase's decorated fixture methods at
     runtime.  It is implemented as a metaclass so we can determine the order in which 
     fixture methods are defined.
+
+    It also works out, once per class rather than once per instance, the order each type of
+    fixture method runs in (_fixture_chains) and which test methods the class has and the suites
+    they're in (_test_methods()).  The test method table is built when it's first needed, since
+    discovery may yet add suites to the class; setting or deleting _suites or a test method on any
+    TestCase throws away every table built so far.  Building a table also records its test methods
+    in _suite_index, so that runnable_test_methods can select them with set operations.
     """
     __test__ = False
     _fixture_accumulator = defaultdict(list)
+    _test_method_table_generation = 0
+    _suite_index = SuiteIndex()
+
     def __init__(cls, name, bases, dct):
 
         for member_name, member in dct.iteritems():
@@ -65,10 +96,93 @@ class MetaTestCase(type):
 
         super(MetaTestCase, cls).__init__(name, bases, dct)
 
+        # for now, we still support the use of unittest-style fixture methods, wherever in the
+        # class hierarchy they're defined (mixins deriving from object included)
+        for member_name, fixture_type in deprecated_fixture_type_map.iteritems():
+            member = getattr(cls, member_name, None)
+            if inspect.ismethod(member):
+                member.im_func._fixture_type = fixture_type
+
         # grab the collected fixtures and then re-init the accumulator
         cls._fixture_methods = MetaTestCase._fixture_accumulator
         MetaTestCase._fixture_accumulator = defaultdict(list)
 
+        cls._fixture_chains = cls._build_fixture_chains()
+        cls._shared_fixture_keys = cls._build_shared_fixture_keys()
+
+    def _build_fixture_chains(cls):
+        """Collect the fixture methods of each type for this class, in the order they should run.
+
+        Fixture methods are added by the metaclass only to the class on which they are initially
+        defined, so we ascend the class hierarchy and collect all the fixture methods defined on
+        earlier classes.
+        """
+        fixture_chains = dict((fixture_type, []) for fixture_type in fixture_types)
+        # for setup methods, we want oldest class first.  for teardowns, we want newest class first
+        for ancestor in reversed(cls.mro()[:-1]):
+            # mixins on TestCase instances that derive from, say, object, won't be set up properly
+            for fixture_type, fixture_methods in getattr(ancestor, '_fixture_methods', {}).iteritems():
+                if fixture_type not in fixture_chains:
+                    # a shared fixture; see _build_shared_fixture_keys
+                    continue
+                if fixture_type.endswith('setup'):
+                    fixture_chains[fixture_type].extend(fixture_methods)
+                else:
+                    fixture_chains[fixture_type][:0] = fixture_methods
+        return fixture_chains
+
+    def _build_shared_fixture_keys(cls):
+        """Return the SharedFixtures keys of the shared fixtures this class uses, in the order they should be set up.
+
+        Session fixtures come before module fixtures, and within each scope, those of older classes
+        come first.  A key is (scope, the class defining the fixture, our module if it's a module fixture).
+        """
+        keys = []
+        for scope in shared_fixture_scopes:
+            for ancestor in reversed(cls.mro()[:-1]):
+                fixture_methods = ancestor.__dict__.get('_fixture_methods', {})
+                if fixture_methods.get('%s_setup' % scope) or fixture_methods.get('%s_teardown' % scope):
+                    keys.append((scope, ancestor, cls.__module__ if scope == 'module' else None))
+        return keys
+
+    def _test_methods(cls):
+        """Return a list of (name, suites) pairs for the class's test methods, sorted by name.
+
+        If the class has any suites applied to it, they're copied down into its test methods.
+        """
+        return cls._test_method_table()[1]
+
+    def _test_method_ids(cls):
+        """Return the _suite_index IDs of the class's test methods, in the same order as _test_methods()."""
+        return cls._test_method_table()[2]
+
+    def _test_method_table(cls):
+        table = cls.__dict__.get('_test_method_table_cache')
+        if table is None or table[0] != MetaTestCase._test_method_table_generation:
+            class_suites = getattr(cls, '_suites', ())
+            test_methods = []
+            for member_name in dir(cls):
+                if member_name.startswith('test'):
+                    member = getattr(cls, member_name)
+                    if inspect.ismethod(member):
+                        suite(*class_suites)(member.im_func)
+                        test_methods.append((member_name, frozenset(getattr(member, '_suites', ()))))
+            test_method_ids = MetaTestCase._suite_index.update(cls, [((cls, member_name), member_suites) for member_name, member_suites in test_methods])
+            table = (MetaTestCase._test_method_table_generation, test_methods, test_method_ids)
+            type.__setattr__(cls, '_test_method_table_cache', table)
+        return table
+
+    def __setattr__(cls, name, value):
+        super(MetaTestCase, cls).__setattr__(name, value)
+        if name == '_suites' or name.startswith('test'):
+            # subclasses may have inherited this, so nobody's table can be trusted
+            MetaTestCase._test_method_table_generation += 1
+
+    def __delattr__(cls, name):
+        super(MetaTestCase, cls).__delattr__(name)
+        if name == '_suites' or name.startswith('test'):
+            MetaTestCase._test_method_table_generation += 1
+
     @classmethod
     def _cmp_str(cls, instance):
         """Return a canonical representation of a TestCase for sorting and hashing."""
@@ -82,6 +196,86 @@ class MetaTestCase(type):
         """Bucket a TestCase using a relatively consistant hash - for dividing tests across runners."""
         return hash(MetaTestCase._cmp_str(self)) % bucket_count
 
+class _BoundFixtureMethods(object):
+    """Descriptor for a TestCase's list of fixture methods of one type, bound the first time it's used."""
+
+    def __init__(self, fixture_type):
+        self.fixture_type = fixture_type
+
+    def __get__(self, test_case, test_case_class):
+        if test_case is None:
+            return self
+        bound_fixture_methods = [instancemethod(func, test_case, test_case_class) for func in test_case_class._fixture_chains[self.fixture_type]]
+        # from now on, the instance's own attribute hides us
+        setattr(test_case, "%s_fixtures" % self.fixture_type, bound_fixture_methods)
+        return bound_fixture_methods
+
+class SharedFixtures(object):
+    """Keeps track of the session_setup and module_setup fixtures set up in this process.
+
+    A shared fixture is set up by the first TestCase to need it, and torn down by the last one
+    expected to use it: expect() counts each TestCase class that will run, and TestCase.run
+    releases its fixtures when it's done.  Fixtures whose users weren't counted up front (as in a
+    parallel worker, which doesn't know what it'll be given) stay up until the runner tears down
+    whatever's left at the end.
+
+    A shared fixture's methods are called with the class that defines them, rather than a TestCase
+    instance, as self, so whatever they set on self is seen by every TestCase inheriting from that
+    class.  For the same reason, only one module's copy of a module fixture can be up at a time;
+    if TestCases from two modules using it are interleaved, it's torn down and set up again.
+    """
+
+    def __init__(self):
+        # key -> exc_info if setting it up failed, or None
+        self.live = {}
+        # key -> the TestCase class that set it up
+        self.users = {}
+        # key -> how many more TestCases we expect to use it
+        self.remaining = defaultdict(int)
+
+    def expect(self, test_case_class):
+        for key in test_case_class._shared_fixture_keys:
+            self.remaining[key] += 1
+
+    def is_live(self, key):
+        return key in self.live
+
+    def setup_failure(self, key):
+        return self.live.get(key)
+
+    def conflicting(self, key):
+        """Return the keys of other modules' copies of a module fixture that are up."""
+        scope, owner, _ = key
+        return [live_key for live_key in self.live if live_key[:2] == (scope, owner) and live_key != key]
+
+    def set_up(self, key, test_case_class, exception_info):
+        self.live[key] = exception_info
+        self.users[key] = test_case_class
+
+    def release(self, key):
+        """Note that one of the TestCases expected to use a fixture is done with it, and return whether it should now be torn down."""
+        if key not in self.remaining:
+            return False
+        self.remaining[key] -= 1
+        if self.remaining[key] > 0:
+            return False
+        del self.remaining[key]
+        return key in self.live
+
+    def torn_down(self, key):
+        del self.live[key]
+        del self.users[key]
+
+    def leftovers(self):
+        """Return (key, the TestCase class that set it up) for each fixture still up, in the order to tear them down."""
+        return sorted(self.users.items(), key=lambda (key, test_case_class): shared_fixture_scopes.index(key[0]), reverse=True)
+
+    @staticmethod
+    def fixture_methods(key, stage):
+        """Return the functions to call to set up or tear down (stage) a shared fixture."""
+        scope, owner, _ = key
+        return owner.__dict__['_fixture_methods'].get('%s_%s' % (scope, stage), [])
+
 def discovered_test_cases():
     return [test_case_class for test_case_class in MetaTestCase._test_accumulator if test_case_class != TestCase]
 
@@ -124,24 +318,43 @@ class TestCase(object):
     
     log = class_logger.ClassLogger()
 
+    # Set this to run each test method, with its setup and teardown, in a child process forked after
+    # class_setup.  Every test then starts from exactly the state class_setup left, however the tests
+    # before it changed things.
+    fork_test_methods = False
+
+    # Set this above 1 to run class_setup fixtures on that many threads at once, for fixtures that
+    # spend their time waiting on I/O.  A fixture that needs others to have run first must say so
+    # with @depends_on.
+    class_setup_threads = 1
+
+    class_setup_fixtures = _BoundFixtureMethods('class_setup')
+    setup_fixtures = _BoundFixtureMethods('setup')
+    teardown_fixtures = _BoundFixtureMethods('teardown')
+    class_teardown_fixtures = _BoundFixtureMethods('class_teardown')
+
     def __init__(self, *args, **kwargs):
         super(TestCase, self).__init__()
 
-        # ascend the class hierarchy and discover fixture methods
-        self.__init_fixture_methods()
-
         self.__suites_include = kwargs.get('suites_include', set())
         self.__suites_exclude = kwargs.get('suites_exclude', set())
+        self.__suite_expression = kwargs.get('suite_expression', None)
         self.__name_overrides = kwargs.get('name_overrides', None)
-
-        # if the class has any suites applied to it, copy them down into its test methods
-        if hasattr(self, '_suites'):
-            for member_name in dir(self):
-                if member_name.startswith('test'):
-                    member = getattr(self, member_name)
-                    if isinstance(member, types.MethodType):
-                        suited_function = suite(*getattr(self, '_suites'))(member)
-                        setattr(self, member_name, suited_function)
+        # seconds any test or fixture method may run for, unless it has its own @timeout
+        self.__timeout = kwargs.get('timeout', None)
+        # the session and module fixtures set up so far; by default, we set up and tear down our own
+        self.__shared_fixtures = kwargs.get('shared_fixtures', None)
+        if self.__shared_fixtures is None:
+            self.__shared_fixtures = SharedFixtures()
+            self.__shared_fixtures.expect(type(self))
+        # renders an exc_info tuple to text, for results that have to cross processes
+        self.__exception_formatter = kwargs.get('exception_formatter', None) or (lambda exception_info: ''.join(traceback.format_exception(*exception_info)))
+        # called with the result, the phase and the block to run for each phase (see test_result.PHASES)
+        # rather than running the block directly, e.g. to profile phases separately
+        self.__phase_wrapper = kwargs.get('phase_wrapper', None)
+        # called before forking for fork_test_methods, e.g. to have background threads put down any locks
+        # the child would need, since it gets them as they were but not the threads to release them
+        self.__before_fork = kwargs.get('before_fork', None)
 
         # callbacks for various stages of execution, used for stuff like logging
         self.__on_run_test_method_callbacks = []
@@ -152,43 +365,6 @@ class TestCase(object):
         self.__class_level_failure = None
         self.__class_level_error = None
 
-        # for now, we still support the use of unittest-style fixture methods
-        for deprecated_fixture_type in ['classSetUp', 'setUp', 'tearDown', 'classTearDown']:
-            getattr(self, deprecated_fixture_type).im_func._fixture_type = deprecated_fixture_type_map[deprecated_fixture_type]
-
-        # for now, we still support the use of unittest-style assertions defined on the TestCase instance
-        for name in dir(deprecated_assertions):
-            if name.startswith(('assert', 'fail')):
-                setattr(self, name, instancemethod(getattr(deprecated_assertions, name), self, self.__class__))
-
-    def __init_fixture_methods(self):
-        """Initialize and populate the lists of fixture methods for this TestCase.
-        Fixture methods are added by the MetaTestCase metaclass at runtime only to
-        the class on which they are initially defined.  This means in order to figure
-        out all the fixtures this particular TestCase will need, we have to ascend
-        its class hierarchy and collect all the fixture methods defined on earlier
-        classes.
-        """
-        # init our self.(class_setup|setup|teardown|class_teardown)_fixtures lists
-        for fixture_type in fixture_types:
-            setattr(self, "%s_fixtures" % fixture_type, [])
-
-        # for setup methods, we want oldest class first.  for teardowns, we want newest class first
-        hierarchy = list(reversed(type(self).mro()))
-        for cls in hierarchy[1:]:
-            # mixins on TestCase instances that derive from, say, object, won't be set up properly
-            if hasattr(cls, '_fixture_methods'):
-                # the metaclass stored the class's fixtures in a _fixture_methods instance variable
-                for fixture_type, fixture_methods in cls._fixture_methods.iteritems():
-                    bound_fixture_methods = [instancemethod(func, self, self.__class__) for func in fixture_methods]
-                    if fixture_type.endswith('setup'):
-                        # for setup methods, we want methods defined further back in the
-                        # class hierarchy to execute first
-                        getattr(self, "%s_fixtures" % fixture_type).extend(bound_fixture_methods)
-                    else:
-                        # for teardown methods though, we want the opposite
-                        setattr(self, "%s_fixtures" % fixture_type, bound_fixture_methods + getattr(self, "%s_fixtures" % fixture_type))
-
     def _generate_test_method(self, method_name, function):
         """Allow tests to define new test methods in their __init__'s and have appropriate suites applied."""
         suited_function = suite(*getattr(self, '_suites', set()))(function)
@@ -199,31 +375,132 @@ class TestCase(object):
 
         This will pick out the test methods from this TestCase, and then exclude any in
         any of our exclude_suites.  If there are any include_suites, it will then further
-        limit itself to test methods in those suites.
+        limit itself to test methods in those suites, and if there's a suite_expression,
+        to those matching it.
         """
-        for member_name in dir(self):
-            if member_name.startswith("test"):
-                member = getattr(self, member_name)
-                if inspect.ismethod(member):
-                    member_suites = set(getattr(member, '_suites', set()))
-                    # if there are any exclude suites, exclude methods under them
-                    if (not self.__suites_exclude) or (not self.__suites_exclude & member_suites):
-                        # if there are any include suites, only run methods in them
-                        if not self.__suites_include or (self.__suites_include & member_suites):
-                            # if there are any name overrides, only run the named methods
-                            if self.__name_overrides is None or member.__name__ in self.__name_overrides:
-                                yield member
+        test_methods = self.__test_methods()
+        selected = MetaTestCase._suite_index.select(self.__suites_include, self.__suites_exclude, self.__suite_expression)
+        for member_name, member_suites, test_method_id in test_methods:
+            if test_method_id is not None:
+                if test_method_id not in selected:
+                    continue
+            elif not suites_selected(member_suites, self.__suites_include, self.__suites_exclude, self.__suite_expression):
+                continue
+
+            member = getattr(self, member_name)
+            # if there are any name overrides, only run the named methods
+            if self.__name_overrides is None or member.__name__ in self.__name_overrides:
+                yield member
+
+    def __test_methods(self):
+        """Return (name, suites, suite index ID) for our test methods: the class's, and any generated
+        by _generate_test_method, which have no ID."""
+        test_case_class = type(self)
+        test_methods = [(member_name, member_suites, test_method_id) for (member_name, member_suites), test_method_id
+            in zip(test_case_class._test_methods(), test_case_class._test_method_ids())]
+
+        instance_members = [(member_name, member) for member_name, member in self.__dict__.iteritems() if member_name.startswith('test')]
+        if not instance_members:
+            return test_methods
+
+        test_methods = dict((member_name, (member_name, member_suites, test_method_id)) for member_name, member_suites, test_method_id in test_methods)
+        for member_name, member in instance_members:
+            if inspect.ismethod(member):
+                test_methods[member_name] = (member_name, frozenset(getattr(member, '_suites', ())), None)
+            else:
+                test_methods.pop(member_name, None)
+        return [test_method for member_name, test_method in sorted(test_methods.iteritems())]
 
     def run(self):
         """Delegator method encapsulating the flow for executing a TestCase instance"""
+        self.__set_up_shared_fixtures()
         self.__run_class_setup_fixtures()
         self.__run_test_methods()
         self.__run_class_teardown_fixtures()
+        self._release_shared_fixtures()
+
+    def __set_up_shared_fixtures(self):
+        """Set up whichever of our session and module fixtures aren't up already.
+
+        If one fails, whether now or for an earlier TestCase, it counts as a class-level failure.
+        """
+        self._stage = self.STAGE_CLASS_SETUP
+
+        for key in self._shared_fixture_keys:
+            if self.__shared_fixtures.is_live(key):
+                exception_info = self.__shared_fixtures.setup_failure(key)
+            else:
+                for conflicting_key in self.__shared_fixtures.conflicting(key):
+                    self._tear_down_shared_fixture(conflicting_key)
+                exception_info = self.__run_shared_fixture_methods(key, 'setup')
+                self.__shared_fixtures.set_up(key, type(self), exception_info)
+
+            if exception_info is not None:
+                if not (self.__class_level_failure or self.__class_level_error):
+                    if issubclass(exception_info[0], AssertionError):
+                        self.__class_level_failure = exception_info
+                    else:
+                        self.__class_level_error = exception_info
+                # nothing after a failed fixture can count on it
+                break
+
+    def _release_shared_fixtures(self):
+        """Let go of our shared fixtures, tearing down those no other TestCase is expected to use."""
+        for key in reversed(self._shared_fixture_keys):
+            if self.__shared_fixtures.release(key):
+                self._tear_down_shared_fixture(key)
+
+    def _tear_down_shared_fixture(self, key):
+        self._stage = self.STAGE_CLASS_TEARDOWN
+        self.__run_shared_fixture_methods(key, 'teardown')
+        self.__shared_fixtures.torn_down(key)
+
+    def __run_shared_fixture_methods(self, key, stage):
+        """Run a shared fixture's setup or teardown methods on the class defining them, reporting on
+        each as we do for class fixtures.  Return the exc_info of the first that fails; setup stops there."""
+        scope, owner, _ = key
+        for func in SharedFixtures.fixture_methods(key, stage):
+            # reported as one of our methods, but called on the owner
+            fixture_method = instancemethod(func, self, type(self))
+            def call_fixture_method(func=func):
+                func(owner)
+            call_fixture_method.__name__ = func.__name__
+            if hasattr(func, '_timeout'):
+                call_fixture_method._timeout = func._timeout
+
+            result = TestResult(fixture_method)
+            try:
+                for callback in self.__on_run_test_method_callbacks:
+                    callback(fixture_method)
+
+                result.start()
+
+                if self.__execute_block_recording_exceptions(self.__with_timeout(call_fixture_method), result, phase=func._fixture_type):
+                    result.end_in_success()
+            except (KeyboardInterrupt, SystemExit):
+                result.end_in_incomplete(sys.exc_info())
+                for callback in self.__on_complete_test_method_callbacks:
+                    callback(result)
+                raise
+            else:
+                # before the callbacks, which may compact the result
+                exception_info = result.exception_info
+                for callback in self.__on_complete_test_method_callbacks:
+                    callback(result)
+
+            if exception_info is not None and stage == 'setup':
+                return exception_info
+        return None
 
     def __run_class_setup_fixtures(self):
         """Running the class's class_setup method chain."""
         self._stage = self.STAGE_CLASS_SETUP
 
+        if self.class_setup_threads > 1 and len(self.class_setup_fixtures) > 1:
+            self.__run_class_setup_fixtures_concurrently()
+            self.__run_deprecated_fixture_method('classSetUp')
+            return
+
         for fixture_method in self.class_setup_fixtures:
             result = TestResult(fixture_method)
 
@@ -233,7 +510,7 @@ class TestCase(object):
 
                 result.start()
 
-                if self.__execute_block_recording_exceptions(fixture_method, result, is_class_level=True):
+                if self.__execute_block_recording_exceptions(self.__with_timeout(fixture_method), result, is_class_level=True, phase=fixture_method._fixture_type):
                     result.end_in_success()
             except (KeyboardInterrupt, SystemExit):
                 result.end_in_incomplete(sys.exc_info())
@@ -246,6 +523,104 @@ class TestCase(object):
 
         self.__run_deprecated_fixture_method('classSetUp')
 
+    def __run_class_setup_fixtures_concurrently(self):
+        """Run the class_setup chain on class_setup_threads threads, each fixture waiting for those it @depends_on.
+
+        Callbacks are still made on this thread, and in the order of the chain, as is recording
+        class-level failures, so everything but the timing comes out as if they'd run one by one.
+
+        SIGALRM can't interrupt other threads, so this thread keeps an eye on the timeouts instead:
+        a fixture that runs past its timeout ends in error, and any that depend on it with it.  Its
+        thread is left to it, and another started in its place.
+        """
+        fixture_methods = self.class_setup_fixtures
+        positions = dict((fixture_method.__name__, position) for position, fixture_method in enumerate(fixture_methods))
+        results = [TestResult(fixture_method) for fixture_method in fixture_methods]
+        class_level_failures = [{} for fixture_method in fixture_methods]
+        finished = [threading.Event() for fixture_method in fixture_methods]
+        timeouts = [getattr(fixture_method, '_timeout', self.__timeout) for fixture_method in fixture_methods]
+        # when each fixture that's started and has a timeout must finish by
+        deadlines = [None for fixture_method in fixture_methods]
+        timed_out = [False for fixture_method in fixture_methods]
+        pending = Queue.Queue()
+        for position in range(len(fixture_methods)):
+            pending.put(position)
+
+        def _run_fixture_methods():
+            while True:
+                try:
+                    position = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                fixture_method, result = fixture_methods[position], results[position]
+                try:
+                    # what to raise instead of running the fixture, if its dependencies won't let it run
+                    error = None
+                    for dependency in sorted(getattr(fixture_method, '_depends_on', ())):
+                        # so the order of the chain is always a safe order to run them in
+                        if positions.get(dependency, position) >= position:
+                            error = ValueError("%s depends on %s, which isn't a class_setup fixture that comes before it" % (fixture_method.__name__, dependency))
+                            break
+                        finished[positions[dependency]].wait()
+                        if timed_out[positions[dependency]]:
+                            error = TestTimeoutError("%s depends on %s, which timed out" % (fixture_method.__name__, dependency))
+                            break
+
+                    def block(fixture_method=fixture_method, error=error):
+                        if error is not None:
+                            raise error
+                        fixture_method()
+
+                    if timeouts[position]:
+                        deadlines[position] = time.time() + timeouts[position]
+                    result.start()
+                    if self.__execute_block_recording_exceptions(block, result, is_class_level=True, phase=fixture_method._fixture_type, class_level_failures=class_level_failures[position]):
+                        result.end_in_success()
+                finally:
+                    finished[position].set()
+
+        def _start_thread():
+            thread = threading.Thread(target=_run_fixture_methods)
+            thread.setDaemon(True)
+            thread.start()
+
+        for _ in range(min(self.class_setup_threads, len(fixture_methods))):
+            _start_thread()
+
+        for position, fixture_method in enumerate(fixture_methods):
+            result = results[position]
+            try:
+                for callback in self.__on_run_test_method_callbacks:
+                    callback(fixture_method)
+
+                # waiting with a timeout keeps us interruptible, and lets us notice the fixture timing out
+                while not finished[position].is_set():
+                    deadline = deadlines[position]
+                    if deadline is not None and time.time() >= deadline:
+                        # its thread still has the original result, so it can't change what we report
+                        result = TestResult(fixture_method)
+                        result.start_time = results[position].start_time
+                        try:
+                            raise TestTimeoutError("%s timed out after %ss" % (fixture_method.__name__, timeouts[position]))
+                        except TestTimeoutError:
+                            result.end_in_error(sys.exc_info())
+                            class_level_failures[position] = {'error': sys.exc_info()}
+                        result.phase_times[fixture_method._fixture_type] = result.run_time
+                        timed_out[position] = True
+                        finished[position].set()
+                        _start_thread()
+                        break
+                    finished[position].wait(0.1 if deadline is None else min(0.1, max(deadline - time.time(), 0.001)))
+            except (KeyboardInterrupt, SystemExit):
+                result.end_in_incomplete(sys.exc_info())
+                for callback in self.__on_complete_test_method_callbacks:
+                    callback(result)
+                raise
+            else:
+                self.__apply_class_level_failures(class_level_failures[position])
+                for callback in self.__on_complete_test_method_callbacks:
+                    callback(result)
+
     def __run_class_teardown_fixtures(self):
         """End the process of running tests.  Run the class's class_teardown methods"""
         self._stage = self.STAGE_CLASS_TEARDOWN
@@ -260,7 +635,7 @@ class TestCase(object):
 
                 result.start()
 
-                if self.__execute_block_recording_exceptions(fixture_method, result, is_class_level=True):
+                if self.__execute_block_recording_exceptions(self.__with_timeout(fixture_method), result, is_class_level=True, phase=fixture_method._fixture_type):
                     result.end_in_success()
             except (KeyboardInterrupt, SystemExit):
                 result.end_in_incomplete(sys.exc_info())
@@ -311,27 +686,10 @@ class TestCase(object):
                     result.end_in_failure(self.__class_level_failure)
                 elif self.__class_level_error:
                     result.end_in_error(self.__class_level_error)
+                elif self.fork_test_methods and hasattr(os, 'fork'):
+                    self.__run_forked(test_method, result)
                 else:
-                    # first, run setup fixtures
-                    self._stage = self.STAGE_SETUP
-                    def _setup_block():
-                        for fixture_method in self.setup_fixtures:
-                            fixture_method()
-                        self.__run_deprecated_fixture_method('setUp')
-                    self.__execute_block_recording_exceptions(_setup_block, result)
-
-                    # then run the test method itself, assuming setup was successful
-                    self._stage = self.STAGE_TEST_METHOD
-                    if not result.complete:
-                        self.__execute_block_recording_exceptions(test_method, result)
-
-                    # finally, run the teardown phase
-                    self._stage = self.STAGE_TEARDOWN
-                    def _teardown_block():
-                        self.__run_deprecated_fixture_method('tearDown')
-                        for fixture_method in self.teardown_fixtures:
-                            fixture_method()
-                    self.__execute_block_recording_exceptions(_teardown_block, result)
+                    self.__run_test_method_with_fixtures(test_method, result)
 
                 # if nothing's gone wrong, it's not about to start
                 if not result.complete:
@@ -345,6 +703,156 @@ class TestCase(object):
                 for callback in self.__on_complete_test_method_callbacks:
                     callback(result)
 
+    def __run_test_method_with_fixtures(self, test_method, result):
+        """Run a test method between its setup and teardown fixtures, ending result unless it's a success."""
+        # first, run setup fixtures
+        self._stage = self.STAGE_SETUP
+        def _setup_block():
+            for fixture_method in self.setup_fixtures:
+                self.__with_timeout(fixture_method)()
+            self.__run_deprecated_fixture_method('setUp')
+        self.__execute_block_recording_exceptions(_setup_block, result, phase='setup')
+
+        # then run the test method itself, assuming setup was successful
+        self._stage = self.STAGE_TEST_METHOD
+        if not result.complete:
+            self.__execute_block_recording_exceptions(self.__with_timeout(test_method), result, phase='test_method')
+
+        # finally, run the teardown phase
+        self._stage = self.STAGE_TEARDOWN
+        def _teardown_block():
+            self.__run_deprecated_fixture_method('tearDown')
+            for fixture_method in self.teardown_fixtures:
+                self.__with_timeout(fixture_method)()
+        self.__execute_block_recording_exceptions(_teardown_block, result, phase='teardown')
+
+    # the parts of a TestResult a forked test method ships back
+    FORKED_RESULT_ATTRIBUTES = ('success', 'failure', 'error', 'incomplete', 'unexpected_success', 'expected_failure',
+        'complete', 'end_time', 'run_time', 'phase_times')
+
+    # seconds a forked test method gets to report back beyond the timeouts of what it runs
+    FORKED_GRACE_PERIOD = 1.0
+
+    def __forked_time_limit(self, test_method):
+        """Return how long a forked test method may take to report back, or None if it may run indefinitely.
+
+        That's the sum of its timeout and its setup and teardown fixtures', which the child enforces
+        itself unless it's stuck somewhere signals can't reach (waiting on a lock it inherited, say).
+        """
+        methods = list(self.setup_fixtures) + [test_method] + list(self.teardown_fixtures)
+        # TestCase's own setUp and tearDown do nothing, and can't hang
+        methods.extend(getattr(self, fixture_name) for fixture_name in ('setUp', 'tearDown')
+            if getattr(type(self), fixture_name).im_func is not getattr(TestCase, fixture_name).im_func)
+        timeouts = [getattr(method, '_timeout', self.__timeout) for method in methods]
+        if not all(timeouts):
+            return None
+        return sum(timeouts) + self.FORKED_GRACE_PERIOD
+
+    def __read_forked_result(self, pid, read_fd, time_limit):
+        """Read everything a forked test method writes to read_fd, killing it if that takes longer than time_limit seconds.
+
+        Returns what was read, and whether we killed the child.
+        """
+        deadline = time.time() + time_limit if time_limit is not None else None
+        chunks = []
+        while True:
+            if deadline is not None:
+                try:
+                    ready, _, _ = select.select([read_fd], [], [], max(deadline - time.time(), 0))
+                except select.error, e:
+                    if e.args[0] == errno.EINTR:
+                        continue
+                    raise
+                if not ready:
+                    os.kill(pid, signal.SIGKILL)
+                    return ''.join(chunks), True
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                return ''.join(chunks), False
+            chunks.append(chunk)
+
+    def __run_forked(self, test_method, result):
+        """Run a test method and its setup and teardown in a child process, for fork_test_methods.
+
+        The child gets a copy of everything class_setup did, and whatever the test changes goes
+        away with it.  It sends back its result, with any exception already formatted by our
+        exception_formatter, since tracebacks can't cross processes, and the lines it ran, if
+        coverage is being collected.
+        """
+        # the runner only imports code_coverage when it's collecting
+        code_coverage = sys.modules.get('testify.code_coverage')
+        if self.__before_fork is not None:
+            self.__before_fork()
+        # so the child doesn't write out what's buffered a second time
+        sys.stdout.flush()
+        sys.stderr.flush()
+        time_limit = self.__forked_time_limit(test_method)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            exit_status = 0
+            try:
+                try:
+                    self.__run_test_method_with_fixtures(test_method, result)
+                except (KeyboardInterrupt, SystemExit):
+                    result.end_in_incomplete(sys.exc_info())
+                if not result.complete:
+                    result.end_in_success()
+
+                forked_result = dict((attr, getattr(result, attr)) for attr in self.FORKED_RESULT_ATTRIBUTES)
+                if result.exception_info is not None:
+                    forked_result['formatted_exception_info'] = self.__exception_formatter(result.exception_info)
+                if code_coverage is not None:
+                    forked_result['coverage'] = code_coverage.current_lines()
+                result_file = os.fdopen(write_fd, 'w')
+                result_file.write(json.dumps(forked_result))
+                result_file.close()
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except:
+                traceback.print_exc()
+                exit_status = 1
+            # skip anything atexit would do, which is the parent's business
+            os._exit(exit_status)
+
+        os.close(write_fd)
+        status = None
+        try:
+            try:
+                forked_result, killed = self.__read_forked_result(pid, read_fd, time_limit)
+            finally:
+                os.close(read_fd)
+            _, status = os.waitpid(pid, 0)
+        finally:
+            if status is None:
+                # we were interrupted: don't leave the child running, or unreaped
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                os.waitpid(pid, 0)
+
+        if killed or not forked_result:
+            try:
+                if killed:
+                    raise ForkedTestMethodError("%s didn't report a result within %ss, so it was killed" % (test_method.__name__, time_limit))
+                if os.WIFSIGNALED(status):
+                    exit_description = "was killed by signal %d" % os.WTERMSIG(status)
+                else:
+                    exit_description = "exited with %d" % os.WEXITSTATUS(status)
+                raise ForkedTestMethodError("%s %s without reporting a result" % (test_method.__name__, exit_description))
+            except ForkedTestMethodError:
+                result.end_in_error(sys.exc_info())
+            return
+
+        forked_result = json.loads(forked_result)
+        covered_lines = forked_result.pop('coverage', None)
+        if covered_lines:
+            code_coverage.add_lines(covered_lines)
+        for attr, value in forked_result.iteritems():
+            setattr(result, attr, value)
+
     EVENT_ON_RUN_TEST_METHOD = 1
     EVENT_ON_COMPLETE_TEST_METHOD = 2
 
@@ -362,13 +870,31 @@ class TestCase(object):
         else:
             raise ValueError("Invalid callback event: %s" % event)
 
-    def __execute_block_recording_exceptions(self, block_fxn, result, is_class_level=False):
+    def __execute_block_recording_exceptions(self, block_fxn, result, is_class_level=False, phase=None, class_level_failures=None):
         """Excerpted code for executing a block of code that might except and cause us to update a result object.
         
+        If phase is given, the time the block takes is recorded against it in the result.
+
+        If is_class_level is set, an exception is also recorded as a class-level failure or error,
+        which the test methods will end in.  Blocks run concurrently pass a class_level_failures
+        dict to record that in instead, under 'failure' or 'error', for the caller to apply in order.
+
         Return value is a boolean describing whether the block was successfully executed without exceptions.
         """
+        if class_level_failures is None:
+            class_level_failures = {}
+            apply_class_level_failures = True
+        else:
+            apply_class_level_failures = False
+
         try:
-            block_fxn()
+            if phase is not None:
+                if self.__phase_wrapper is not None:
+                    result.time_phase(phase, lambda: self.__phase_wrapper(result, phase, block_fxn))
+                else:
+                    result.time_phase(phase, block_fxn)
+            else:
+                block_fxn()
         except (KeyboardInterrupt, SystemExit):
             raise
         except TwistedFailureError, exception:
@@ -379,19 +905,28 @@ class TestCase(object):
             exc_info = (failure.type, failure.value, failure.getTracebackObject())
             result.end_in_error(exc_info)
             if is_class_level:
-                self.__class_level_failure = exc_info
+                class_level_failures['failure'] = exc_info
         except Exception, exception:
             if isinstance(exception, AssertionError):
                 result.end_in_failure(sys.exc_info())
                 if is_class_level:
-                    self.__class_level_failure = sys.exc_info()
+                    class_level_failures['failure'] = sys.exc_info()
             else:
                 result.end_in_error(sys.exc_info())
                 if is_class_level:
-                    self.__class_level_error = sys.exc_info()
+                    class_level_failures['error'] = sys.exc_info()
             return False
         else:
             return True
+        finally:
+            if apply_class_level_failures:
+                self.__apply_class_level_failures(class_level_failures)
+
+    def __apply_class_level_failures(self, class_level_failures):
+        if 'failure' in class_level_failures:
+            self.__class_level_failure = class_level_failures['failure']
+        if 'error' in class_level_failures:
+            self.__class_level_error = class_level_failures['error']
 
     def classSetUp(self): pass
     def setUp(self): pass
@@ -417,7 +952,7 @@ class TestCase(object):
                         callback(deprecated_method)
 
                     result.start()
-                    if self.__execute_block_recording_exceptions(deprecated_method, result, is_class_level=True):
+                    if self.__execute_block_recording_exceptions(self.__with_timeout(deprecated_method), result, is_class_level=True, phase=deprecated_fixture_type_map[fixture_name]):
                         result.end_in_success()
                 except (KeyboardInterrupt, SystemExit):
                     result.end_in_incomplete(sys.exc_info())
@@ -428,7 +963,36 @@ class TestCase(object):
                     for callback in self.__on_complete_test_method_callbacks:
                         callback(result)
             else:
-                deprecated_method()
+                self.__with_timeout(deprecated_method)()
+
+    def __with_timeout(self, method):
+        """Wrap method so that it raises TestTimeoutError if it runs for longer than its timeout.
+
+        That's its own @timeout if it has one, or the one this TestCase was given.  We time methods
+        out with SIGALRM, so the exception is raised wherever the method is stuck, even in a blocking
+        system call, and its traceback shows where that was.  Signals only go to the main thread, so
+        elsewhere, or without SIGALRM, methods just run as long as they take.
+        """
+        seconds = getattr(method, '_timeout', self.__timeout)
+        if not seconds or not hasattr(signal, 'setitimer') or not isinstance(threading.current_thread(), threading._MainThread):
+            return method
+
+        def _timed_out(signum, frame):
+            raise TestTimeoutError("%s timed out after %ss" % (method.__name__, seconds))
+
+        def method_with_timeout():
+            previous_handler = signal.signal(signal.SIGALRM, _timed_out)
+            start_time = time.time()
+            previous_delay, _ = signal.setitimer(signal.ITIMER_REAL, seconds)
+            try:
+                return method()
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+                if previous_delay:
+                    # e.g. a TestCase run from within a test method: put its timer back, less the time we took
+                    signal.setitimer(signal.ITIMER_REAL, max(previous_delay - (time.time() - start_time), 0.001))
+        return method_with_timeout
 
 def suite(*args, **kwargs):
     """Decorator to conditionally assign suites to individual test methods.
@@ -454,6 +1018,27 @@ def suite(*args, **kwargs):
 
     return mark_test_with_suites
 
+def timeout(seconds):
+    """Decorator to limit how long a test or fixture method may run for, overriding the run's --timeout.
+
+    A method that runs past its timeout is interrupted, and recorded as an error.
+    """
+    def mark_with_timeout(function):
+        function._timeout = seconds
+        return function
+    return mark_with_timeout
+
+def depends_on(*fixture_names):
+    """Decorator to name the class_setup fixtures a class_setup fixture needs to have run before it.
+
+    This only matters when class_setup_threads lets them run at once.  They must be earlier in the
+    class_setup chain, so running them one by one, in order, still works.
+    """
+    def mark_with_dependencies(function):
+        function._depends_on = getattr(function, '_depends_on', set()) | set(fixture_names)
+        return function
+    return mark_with_dependencies
+
 def __fixture_decorator_factory(fixture_type):
     """Decorator generator for the fixture decorators"""
     def fixture_method(func):
@@ -462,7 +1047,16 @@ def __fixture_decorator_factory(fixture_type):
         return func
     return fixture_method
 
+# for now, we still support the use of unittest-style assertions defined on the TestCase instance
+for name in dir(deprecated_assertions):
+    if name.startswith(('assert', 'fail')):
+        setattr(TestCase, name, getattr(deprecated_assertions, name))
+
+session_setup = __fixture_decorator_factory('session_setup')
+module_setup = __fixture_decorator_factory('module_setup')
 class_setup = __fixture_decorator_factory('class_setup')
 setup = __fixture_decorator_factory('setup')
 teardown = __fixture_decorator_factory('teardown')
 class_teardown = __fixture_decorator_factory('class_teardown')
+module_teardown = __fixture_decorator_factory('module_teardown')
+session_teardown = __fixture_decorator_factory('session_teardown')
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+import imp
 import logging
 import os
 import os.path
@@ -22,6 +23,8 @@ import sys
 from test_case import MetaTestCase
 from test_logger import _log
 from errors import TestifyError
+from test_index import describe_test_case
+import static_discovery
 
 class DiscoveryError(TestifyError): pass
 
@@ -38,7 +41,208 @@ def gather_test_paths(testing_dir):
                 fs_path = os.path.join(relative_path, subfile)
                 yield fs_path[:-3].replace('/','.')
 
-def discover(what):
+def find_test_modules(what):
+    """Given a string module path, return (module name, source file) pairs for every module under it, without importing any of them.
+
+    Packages are represented by their __init__.py.  Returns None if what can't be found on the
+    filesystem as a module or package (it may name a TestCase within a module, say), in which case
+    only discover() can make sense of it.
+    """
+    path = None
+    parts = what.split('.')
+    for part_index, part in enumerate(parts):
+        try:
+            module_file, filename, (suffix, mode, module_type) = imp.find_module(part, path)
+        except ImportError:
+            return None
+        if module_file:
+            module_file.close()
+        if module_type == imp.PKG_DIRECTORY:
+            path = [filename]
+        elif module_type == imp.PY_SOURCE and part_index == len(parts) - 1:
+            return [(what, filename)]
+        else:
+            return None
+
+    test_modules = [(what, os.path.join(filename, '__init__.py'))]
+    for item in sorted(os.listdir(filename)):
+        # ignore .svn and other miscellanea
+        if item.startswith('.'):
+            continue
+        item_path = os.path.join(filename, item)
+        if os.path.isdir(item_path) and os.path.exists(os.path.join(item_path, '__init__.py')):
+            test_modules.extend(find_test_modules("%s.%s" % (what, item)) or [])
+        elif item.endswith('.py') and item != '__init__.py':
+            test_modules.append(("%s.%s" % (what, item[:-3]), item_path))
+    return test_modules
+
+def package_suites(module_name):
+    """Return the suites applied to a module by the (already imported) packages it's in."""
+    suites = []
+    package_parts = module_name.split('.')[:-1]
+    for end in range(1, len(package_parts) + 1):
+        package = sys.modules.get('.'.join(package_parts[:end]))
+        suites.extend(getattr(package, '_suites', []))
+    return suites
+
+def discover_module(module_name):
+    """Import a single module and return the TestCases defined in it.
+
+    Unlike discover(), this doesn't descend into a package's modules, but it does apply the
+    suites of the packages the module is in.
+    """
+    __import__(module_name)
+    test_module = sys.modules[module_name]
+    suites = package_suites(module_name) + list(getattr(test_module, '_suites', []))
+
+    test_case_classes = []
+    for member_name in dir(test_module):
+        obj = getattr(test_module, member_name)
+        if isinstance(obj, types.TypeType):
+            for test_case_class in discover(obj, suites):
+                if test_case_class not in test_case_classes:
+                    test_case_classes.append(test_case_class)
+    return test_case_classes
+
+def package_init_files(module_name, source_file):
+    """Return the __init__.py files of the packages a module is in, innermost first, without importing any of them."""
+    package_directory = os.path.dirname(source_file)
+    if os.path.basename(source_file) == '__init__.py':
+        package_directory = os.path.dirname(package_directory)
+
+    init_files = []
+    for _ in module_name.split('.')[:-1]:
+        init_files.append(os.path.join(package_directory, '__init__.py'))
+        package_directory = os.path.dirname(package_directory)
+    return init_files
+
+def static_package_suites(module_name, source_file):
+    """Like package_suites, but read from the packages' __init__.py files rather than imported.
+
+    Returns None if any of them sets its suites in a way static_discovery can't follow.
+    """
+    suites = []
+    for init_file in package_init_files(module_name, source_file):
+        try:
+            suites[:0] = static_discovery.module_suites(init_file)
+        except (IOError, SyntaxError, static_discovery.Unresolvable):
+            return None
+    return suites
+
+def module_source_file(module_name):
+    """Return the source file of an imported module, or None if it doesn't have one."""
+    source_file = getattr(sys.modules.get(module_name), '__file__', None)
+    if source_file is not None and source_file.endswith(('.pyc', '.pyo')):
+        source_file = source_file[:-1]
+    return source_file
+
+def test_case_source_files(test_case_classes):
+    """Return the source files of the (imported) modules defining some TestCase classes and everything they inherit from."""
+    source_files = set()
+    for test_case_class in test_case_classes:
+        for ancestor in test_case_class.__mro__:
+            source_file = module_source_file(ancestor.__module__)
+            if source_file is not None:
+                source_files.add(source_file)
+    return source_files
+
+def index_module(module_name, source_file, index):
+    """Import a module, describe its TestCases in index, and return the descriptions."""
+    test_case_classes = discover_module(module_name)
+    test_cases = [describe_test_case(test_case_class) for test_case_class in test_case_classes]
+    dependencies = package_init_files(module_name, source_file) + list(test_case_source_files(test_case_classes))
+    index.update(module_name, source_file, test_cases, dependencies=dependencies)
+    return test_cases
+
+def _describe_statically(test_modules, module_test_cases, index):
+    """Fill in module_test_cases for whichever unindexed modules static_discovery can make sense of."""
+    known_test_cases = {}
+    for module_name, test_cases in module_test_cases.iteritems():
+        for test_case in test_cases or []:
+            if test_case['module'] == module_name:
+                known_test_cases["%s.%s" % (test_case['module'], test_case['name'])] = test_case
+
+    source_files = dict(test_modules)
+
+    # a module may subclass TestCases from one we haven't described yet, so keep going round until we get nowhere
+    unresolved = [(module_name, source_file) for module_name, source_file in test_modules if module_test_cases[module_name] is None]
+    while unresolved:
+        still_unresolved = []
+        for module_name, source_file in unresolved:
+            test_cases = None
+            used_test_cases = []
+            package_suites = static_package_suites(module_name, source_file)
+            if package_suites is not None:
+                test_cases = static_discovery.describe_module(module_name, source_file, known_test_cases, package_suites, used_test_cases)
+            if test_cases is None:
+                still_unresolved.append((module_name, source_file))
+                continue
+
+            # the modules defining the TestCases we subclassed or imported, and whatever they depend on
+            dependencies = package_init_files(module_name, source_file)
+            for used_test_case in used_test_cases:
+                dependencies.append(source_files[used_test_case['module']])
+                dependencies.extend(index.dependencies(used_test_case['module']))
+
+            module_test_cases[module_name] = test_cases
+            index.update(module_name, source_file, test_cases, static=True, dependencies=dependencies)
+            for test_case in test_cases:
+                if test_case['module'] == module_name:
+                    known_test_cases["%s.%s" % (test_case['module'], test_case['name'])] = test_case
+
+        if len(still_unresolved) == len(unresolved):
+            break
+        unresolved = still_unresolved
+
+def discover_indexed(what, index, static=False, select_modules=None):
+    """Like discover(), but return descriptions of TestCases (see test_index.describe_test_case) rather than the classes themselves.
+
+    Only modules the index has no up-to-date entry for are imported, and their entries are updated.
+    With static set, those modules are parsed rather than imported wherever static_discovery can
+    manage it; that's fine for listing tests, but not for running them.  Returns None if what
+    can't be found without importing it, as for find_test_modules.
+
+    select_modules, if given, is called with a dict mapping each module name to its indexed
+    descriptions (or None where there are none) and returns the names of the unindexed modules to
+    import; the rest are skipped, and nothing in them is returned.
+    """
+    test_modules = find_test_modules(what)
+    if test_modules is None:
+        return None
+
+    time_start = time.time()
+    module_test_cases = {}
+    for module_name, source_file in test_modules:
+        module_test_cases[module_name] = index.lookup(module_name, source_file, allow_static=static)
+    if static:
+        _describe_statically(test_modules, module_test_cases, index)
+    if select_modules is not None:
+        selected_modules = set(select_modules(module_test_cases))
+    else:
+        selected_modules = set(module_test_cases)
+
+    test_cases = []
+    test_case_positions = {}
+    for module_name, source_file in test_modules:
+        if module_test_cases[module_name] is None:
+            if module_name not in selected_modules:
+                continue
+            module_test_cases[module_name] = index_module(module_name, source_file, index)
+
+        for test_case in module_test_cases[module_name]:
+            test_case_name = "%s.%s" % (test_case['module'], test_case['name'])
+            if test_case_name not in test_case_positions:
+                test_case_positions[test_case_name] = len(test_cases)
+                test_cases.append(test_case)
+            elif test_case['module'] == module_name:
+                # a TestCase imported into other modules is described by each of them, but only
+                # the module that defines it will notice when it changes
+                test_cases[test_case_positions[test_case_name]] = test_case
+
+    _log.debug("discover: found %d indexed test cases in %s" % (len(test_cases), time.time() - time_start))
+    return test_cases
+
+def discover(what, suites=None):
     """Given a string module path, drill into it for its TestCases.
 
     This will descend recursively into packages and lists, so the following are valid:
@@ -46,6 +250,8 @@ def discover(what):
         - add_test_module('tests.biz_cmds.biz_ad_test.tests')
         - add_test_module('tests.biz_cmds')
         - add_test_module('tests')
+
+    Any suites given are applied to every TestCase found, as a package's suites are to the modules in it.
     """
 
     def discover_inner(locator, suites=None):
@@ -121,7 +327,7 @@ def discover(what):
 
     discover_set = set()
     time_start = time.time()
-    for discovery in discover_inner(what):
+    for discovery in discover_inner(what, suites):
         yield discovery
     time_end = time.time()
     _log.debug("discover: discovered %d test cases in %s" % (len(discover_set), time_end - time_start))
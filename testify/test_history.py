@@ -0,0 +1,164 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the TestHistory class, which remembers how TestCases behaved on previous runs,
+and helpers that use it to divide TestCases between buckets and to decide what order to run them in."""
+__testify = 1
+
+import random
+
+from testify.utils.json_file import load_json_file, update_json_file
+
+class TestHistory(object):
+    """Per-TestCase information from previous runs, persisted in a JSON file.
+
+    TestCases are keyed by their "module.ClassName".  Several bucketed runs may share one history
+    file, so save() merges in what it recorded rather than overwriting the whole thing.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.test_cases = load_json_file(filename, {})
+        self._recorded = {}
+        self._module_run_times_cache = None
+
+    def run_time(self, test_case_name):
+        """Return how many seconds the named TestCase took when it was last run, or None if we've never seen it.
+
+        Given the name of a module instead, return the total for all the TestCases we've seen in it.
+        """
+        if test_case_name not in self.test_cases:
+            return self._module_run_times().get(test_case_name)
+        return self.test_cases[test_case_name].get('run_time')
+
+    def _module_run_times(self):
+        if self._module_run_times_cache is None:
+            self._module_run_times_cache = {}
+            for test_case_name, fields in self.test_cases.iteritems():
+                if fields.get('run_time') is not None:
+                    module_name = test_case_name.rsplit('.', 1)[0]
+                    self._module_run_times_cache[module_name] = self._module_run_times_cache.get(module_name, 0.0) + fields['run_time']
+        return self._module_run_times_cache
+
+    def failed(self, test_case_name):
+        """Return whether the named TestCase had an unexpected failure when it was last run."""
+        return self.test_cases.get(test_case_name, {}).get('failed', False)
+
+    def record_run_time(self, test_case_name, run_time):
+        self._record(test_case_name, run_time=run_time)
+
+    def record_failed(self, test_case_name, failed):
+        self._record(test_case_name, failed=failed)
+
+    def _record(self, test_case_name, **fields):
+        self._module_run_times_cache = None
+        self.test_cases.setdefault(test_case_name, {}).update(fields)
+        self._recorded.setdefault(test_case_name, {}).update(fields)
+
+    def save(self):
+        """Merge what we recorded during this run into the history file."""
+        if not self._recorded:
+            return
+
+        def merge_recorded(test_cases):
+            for test_case_name, fields in self._recorded.iteritems():
+                test_cases.setdefault(test_case_name, {}).update(fields)
+
+        # pick up anything other runs have saved since we loaded
+        self.test_cases = update_json_file(self.filename, merge_recorded, {})
+        self._recorded = {}
+        self._module_run_times_cache = None
+
+def hash_bucket(test_case_name, bucket_count):
+    """Bucket a TestCase by name alone, the same way MetaTestCase.bucket does."""
+    return hash(test_case_name) % bucket_count
+
+def assign_buckets(test_case_names, bucket_count, history=None, bucket_overrides={}):
+    """Divide the named TestCases between bucket_count buckets of roughly equal expected run time.
+
+    Overridden TestCases go where they're told, and TestCases the history has never seen are
+    hashed into a bucket, as they always have been.  The rest are handed out longest first, each to
+    whichever bucket currently expects to finish earliest.  Every bucketed run must get the same
+    answer from this, so ties are broken by name and then by bucket number.
+
+    Returns a dict mapping each TestCase name to its bucket.
+    """
+    buckets = {}
+    loads = [0.0] * bucket_count
+
+    run_times = {}
+    if history is not None:
+        for test_case_name in test_case_names:
+            run_time = history.run_time(test_case_name)
+            if run_time is not None:
+                run_times[test_case_name] = run_time
+
+    # guess that TestCases we know nothing about take an average amount of time
+    default_run_time = (sum(run_times.itervalues()) / len(run_times)) if run_times else 0.0
+
+    unplaced = []
+    for test_case_name in sorted(test_case_names):
+        if test_case_name in bucket_overrides:
+            bucket = bucket_overrides[test_case_name]
+        elif test_case_name not in run_times:
+            bucket = hash_bucket(test_case_name, bucket_count)
+        else:
+            unplaced.append(test_case_name)
+            continue
+        buckets[test_case_name] = bucket
+        if 0 <= bucket < bucket_count:
+            loads[bucket] += run_times.get(test_case_name, default_run_time)
+
+    unplaced.sort(key=lambda test_case_name: (-run_times[test_case_name], test_case_name))
+    for test_case_name in unplaced:
+        bucket = min(range(bucket_count), key=lambda bucket: (loads[bucket], bucket))
+        buckets[test_case_name] = bucket
+        loads[bucket] += run_times[test_case_name]
+
+    return buckets
+
+ORDER_DISCOVERY = 'discovery'
+ORDER_SLOWEST_FIRST = 'slowest-first'
+ORDER_FAILED_FIRST = 'failed-first'
+ORDER_RANDOM = 'random'
+ORDERS = [ORDER_DISCOVERY, ORDER_SLOWEST_FIRST, ORDER_FAILED_FIRST, ORDER_RANDOM]
+
+def order_test_cases(test_case_names, order, history=None, seed=None):
+    """Return the named TestCases in the order they should be run.
+
+    ORDER_SLOWEST_FIRST starts the longest TestCases first, so that none of them is left to stretch
+    out the end of a parallel or bucketed run; TestCases we have no timings for might be slow, so
+    they go first of all.  ORDER_FAILED_FIRST runs whatever failed last time first, for quick
+    feedback.  ORDER_RANDOM shuffles them, repeatably for a given seed.  Both of the history-based
+    orders fall back to discovery order where the history can't tell TestCases apart.
+    """
+    test_case_names = list(test_case_names)
+    if order == ORDER_DISCOVERY:
+        return test_case_names
+    elif order == ORDER_RANDOM:
+        random.Random(seed).shuffle(test_case_names)
+        return test_case_names
+    elif order not in ORDERS:
+        raise ValueError("Invalid test case order: %s" % order)
+
+    if history is None:
+        return test_case_names
+    elif order == ORDER_SLOWEST_FIRST:
+        def slowest_first(test_case_name):
+            run_time = history.run_time(test_case_name)
+            return (run_time is not None, -(run_time or 0.0))
+        return sorted(test_case_names, key=slowest_first)
+    else:
+        return sorted(test_case_names, key=lambda test_case_name: not history.failed(test_case_name))
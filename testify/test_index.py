@@ -0,0 +1,109 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the TestIndex class, an on-disk record of the TestCases discovery found in each test module."""
+__testify = 1
+
+import os
+
+from testify.utils.json_file import load_json_file, update_json_file
+
+def describe_test_case(test_case_class):
+    """Return a description of a TestCase class that can be stored in a TestIndex.
+
+    This is a dict of the class's module and name, and a map of its test method names to the
+    suites each is in (including any applied to the whole class).
+    """
+    return {
+        'module': test_case_class.__module__,
+        'name': test_case_class.__name__,
+        'test_methods': dict((member_name, sorted(member_suites)) for member_name, member_suites in test_case_class._test_methods()),
+    }
+
+class TestIndex(object):
+    """Descriptions of the TestCases in each test module, persisted in a JSON file.
+
+    Modules are keyed by name, and an entry is only trusted while its source file, and every file
+    it depends on (the modules defining its TestCases' base classes, or TestCases it imports, and
+    the __init__.py of each package it's in), have the same modification time and size as when it
+    was indexed.  Like TestHistory, several runs may share an index file, so save() merges in what
+    it updated.  Without a filename, the index only lasts as long as this run.
+
+    Entries worked out by static_discovery rather than by importing the module are marked as such,
+    and only used when asked for, since they may miss TestCases that only exist at runtime.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.modules = load_json_file(filename, {}) if filename else {}
+        self._updated = {}
+
+    def _stat(self, source_file):
+        stat = os.stat(source_file)
+        return stat.st_mtime, stat.st_size
+
+    def lookup(self, module_name, source_file, allow_static=False):
+        """Return descriptions of the TestCases in a module, or None if it hasn't been indexed since it last changed."""
+        entry = self.modules.get(module_name)
+        if entry is None or entry['source_file'] != os.path.abspath(source_file):
+            return None
+        if entry.get('static') and not allow_static:
+            return None
+        try:
+            mtime, size = self._stat(source_file)
+        except OSError:
+            return None
+        if entry['mtime'] != mtime or entry['size'] != size:
+            return None
+        for dependency, dependency_mtime, dependency_size in entry.get('dependencies', []):
+            try:
+                if self._stat(dependency) != (dependency_mtime, dependency_size):
+                    return None
+            except OSError:
+                return None
+        return entry['test_cases']
+
+    def dependencies(self, module_name):
+        """Return the files an indexed module's entry depends on, other than its own source file."""
+        entry = self.modules.get(module_name)
+        if entry is None:
+            return []
+        return [dependency for dependency, _, _ in entry.get('dependencies', [])]
+
+    def update(self, module_name, source_file, test_cases, static=False, dependencies=()):
+        """Record descriptions of the TestCases currently in a module, and the other files they depend on."""
+        mtime, size = self._stat(source_file)
+        source_file = os.path.abspath(source_file)
+        entry = {
+            'source_file': source_file,
+            'mtime': mtime,
+            'size': size,
+            'test_cases': test_cases,
+            'dependencies': [],
+        }
+        for dependency in sorted(set(os.path.abspath(dependency) for dependency in dependencies)):
+            if dependency != source_file and os.path.exists(dependency):
+                entry['dependencies'].append([dependency] + list(self._stat(dependency)))
+        if static:
+            entry['static'] = True
+        self.modules[module_name] = entry
+        self._updated[module_name] = entry
+
+    def save(self):
+        """Merge the entries we updated during this run into the index file."""
+        if not (self.filename and self._updated):
+            return
+        self.modules = update_json_file(self.filename, lambda modules: modules.update(self._updated), {})
+        self._updated = {}
@@ -16,12 +16,16 @@
 """This module contains classes and constants related to outputting test results."""
 __testify = 1
 
-import datetime
-import operator
+import copy
+import json
+import Queue
 import sys
+import threading
+import time
 import traceback
 import logging
-from IPython import ultraTB
+
+from test_result import PHASES, RemoteTestMethod
 
 # from test_case import TestCase
 
@@ -29,10 +33,49 @@ from IPython import ultraTB
 # also want to make basic test running /result info available via standard python logger
 _log = logging.getLogger('testify')
 
+def _is_logged(level, logger=_log):
+    """Whether a record at level from logger would be emitted by any handler it reaches.
+
+    The logger's own level doesn't tell us: TestProgram sets the root logger to DEBUG, and leaves it
+    to its handlers to drop everything below WARNING unless there's a log file.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    while logger is not None:
+        for handler in logger.handlers:
+            if level >= handler.level:
+                return True
+        if not logger.propagate:
+            break
+        logger = logger.parent
+    return False
+
 VERBOSITY_SILENT    = 0  # Don't say anything, just exit with a status code
 VERBOSITY_NORMAL    = 1  # Output dots for each test method run
 VERBOSITY_VERBOSE   = 2  # Output method names and timing information
 
+# IPython's ColorTB, once we've needed it.  IPython takes a while to import, so we don't unless a
+# traceback actually needs coloring.
+_color_tb = None
+
+def load_color_traceback_formatter():
+    """Import IPython, if it's installed, to color tracebacks with."""
+    global _color_tb
+    if _color_tb is None:
+        try:
+            from IPython import ultraTB
+        except ImportError:
+            _color_tb = False
+        else:
+            _color_tb = ultraTB.ColorTB()
+
+def _format_color_traceback(*args):
+    """Format a traceback in color if IPython is installed, or just as the traceback module would if not."""
+    load_color_traceback_formatter()
+    if not _color_tb:
+        return traceback.format_exception(*args)
+    return _color_tb.text(*args)
+
 class TestLoggerBase(object):
     traceback_formater = staticmethod(traceback.format_exception)
 
@@ -40,26 +83,31 @@ class TestLoggerBase(object):
         self.verbosity = verbosity
         self.stream = stream
 
-    # These methods should be implemented by a TestLoggerBase subclass
-    def report_test_name(self, test_name): raise NotImplementedError
+    # These methods should be implemented by a TestLoggerBase subclass.  report_test_name is passed
+    # the time the test started if it's being reported some time later (see ThreadedTestLogger).
+    def report_test_name(self, test_name, start_time=None): raise NotImplementedError
     def report_test_result(self, result): raise NotImplementedError
     def report_failures(self, failed_results):
-        results = {
-            'FAILURES': [],
-            'EXPECTED_FAILURES': []
-            }
-        
-        [results['EXPECTED_FAILURES'].append(result) if result.expected_failure else results['FAILURES'].append(result) for result in failed_results]
-
-        if results['EXPECTED_FAILURES']:
-            self.heading('EXPECTED FAILURES', 'The following tests have been marked expected-failure.')
-            for result in results['EXPECTED_FAILURES']:
-                self.failure(result)
-
-        if results['FAILURES']:
+        """Report each failed result, expected failures first.
+
+        failed_results may be a TestResultLog's, read back from disk, so we go through it once per
+        heading rather than holding on to the lot.
+        """
+        have_expected_failures = have_failures = False
+        for result in failed_results:
+            if not result.expected_failure:
+                have_failures = True
+                continue
+            if not have_expected_failures:
+                self.heading('EXPECTED FAILURES', 'The following tests have been marked expected-failure.')
+                have_expected_failures = True
+            self.failure(result)
+
+        if have_failures:
             self.heading('FAILURES', 'The following tests are expected to pass.')
-            for result in results['FAILURES']:
-                self.failure(result)
+            for result in failed_results:
+                if not result.expected_failure:
+                    self.failure(result)
         else:
             # throwing this in so that someone looking at the bottom of the
             # output won't have to scroll up to figure out whether failures
@@ -67,7 +115,30 @@ class TestLoggerBase(object):
             self.heading('FAILURES', 'None!')
         
     def report_failure(self, result): raise NotImplementedError
-    def report_stats(self, test_case_count, all_results, failed_results, unknown_results): raise NotImplementedError
+    def report_stats(self, test_case_count, result_counts): raise NotImplementedError
+
+    def report_phase_times(self, phase_times):
+        """Report the total time spent in each phase of running TestCases (see test_result.PHASES).  Optional."""
+        pass
+
+    def report_coverage_overhead(self, overhead):
+        """Report what tracing coverage cost the run, as estimated by code_coverage.ContextCollector.estimated_overhead().  Optional."""
+        pass
+
+    def report_profile(self, summary):
+        """Report the functions that took the most time, as summarized by profiling.RunProfiler.summary().  Optional."""
+        pass
+
+    def report_sampling(self, overhead):
+        """Report what sampling the run cost and where, as summarized by sampling_profiler.SamplingProfiler.overhead().  Optional."""
+        pass
+
+    def flush(self):
+        """Make sure everything reported so far has been written out.  Called at the end of a run."""
+        pass
+
+    def _format_phase_times(self, phase_times, phases=PHASES):
+        return ', '.join("%s %.2fs" % (phase, phase_times[phase]) for phase in phases if phase in phase_times)
 
     def _format_test_method_name(self, test_method):
         """Take a test method as input and return a string for output"""
@@ -94,6 +165,28 @@ class TestLoggerBase(object):
 
         return self.traceback_formater(exctype, value, tb)
 
+    def format_exception_info(self, exception_info_tuple):
+        """Render an exc_info tuple to text, the way this logger shows exceptions."""
+        return ''.join(self._format_exception_info(exception_info_tuple))
+
+    def _format_result_exception_info(self, result):
+        """Return the formatted exception info for a result; compacted results, and those run in another process, arrive pre-formatted."""
+        if result.exception_info is None and result.formatted_exception_info is not None:
+            return result.formatted_exception_info
+        return self.format_exception_info(result.exception_info)
+
+    def _log_result(self, status, result):
+        """Log a result at info level, without the cost of formatting its name if nobody's listening."""
+        if _is_logged(logging.INFO):
+            _log.info("%s: %s", status, self._format_test_method_name(result.test_method))
+
+    def _log_result_exception_info(self, status, result):
+        """Log a failed result at error level, along with its exception."""
+        if result.exception_info is None and result.formatted_exception_info is not None:
+            _log.error("%s: %s\n%s", status, self._format_test_method_name(result.test_method), result.formatted_exception_info.rstrip())
+        else:
+            _log.error("%s: %s", status, self._format_test_method_name(result.test_method), exc_info=result.exception_info)
+
     def __is_relevant_tb_level(self, tb):
         return tb.tb_frame.f_globals.has_key('__testify')
 
@@ -105,16 +198,24 @@ class TestLoggerBase(object):
         return length
         
 class TextTestLogger(TestLoggerBase):
-    traceback_formater = staticmethod(ultraTB.ColorTB().text)
+    traceback_formater = staticmethod(_format_color_traceback)
+
+    # whether to flush the stream after every write; ThreadedTestLogger flushes in batches instead
+    autoflush = True
 
     def write(self, message):
         """Write a message to the output stream, no trailing newline"""
         self.stream.write(message)
-        self.stream.flush()
+        if self.autoflush:
+            self.stream.flush()
 
     def writeln(self, message):
         """Write a message and append a newline"""
         self.stream.write("%s\n" % message)
+        if self.autoflush:
+            self.stream.flush()
+
+    def flush(self):
         self.stream.flush()
 
     BLACK, RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN, WHITE = range(30, 38)
@@ -127,70 +228,105 @@ class TextTestLogger(TestLoggerBase):
             end_color = chr(0033) + '[m'
             return start_color + message + end_color
 
-    def report_test_name(self, test_method):
-        _log.info("running: %s", self._format_test_method_name(test_method))
+    def report_test_name(self, test_method, start_time=None):
+        logged = _is_logged(logging.INFO)
+        if not logged and self.verbosity < VERBOSITY_VERBOSE:
+            return
+        test_method_name = self._format_test_method_name(test_method)
+        if logged:
+            _log.info("running: %s", test_method_name)
         if self.verbosity >= VERBOSITY_VERBOSE:
-            self.write("%s ... " % self._format_test_method_name(test_method))
+            self.write("%s ... " % test_method_name)
 
     def report_test_result(self, result):
         if self.verbosity > VERBOSITY_SILENT:
 
             if result.success:
                 if not result.unexpected_success:
-                    _log.info("success: %s", self._format_test_method_name(result.test_method))
+                    self._log_result("success", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('.', self.GREEN))
                     else:
-                        self.writeln("%s in %s" % (self._colorize('ok', self.GREEN), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize('ok', self.GREEN), result.normalized_run_time(), self._format_fixture_times(result)))
                 else:
-                    _log.info("unexpected success: %s", self._format_test_method_name(result.test_method))
+                    self._log_result("unexpected success", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('.', self.RED))
                     else:
-                        self.writeln("%s in %s" % (self._colorize('UNEXPECTED SUCCESS', self.RED), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize('UNEXPECTED SUCCESS', self.RED), result.normalized_run_time(), self._format_fixture_times(result)))
 
             elif result.failure:
                 if result.test_method.im_class.in_suite(result.test_method, 'expected-failure'):
-                    _log.error("fail (expected): %s", self._format_test_method_name(result.test_method), exc_info=result.exception_info)
+                    self._log_result_exception_info("fail (expected)", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('f', self.RED))
                     else:
-                        self.writeln("%s in %s" % (self._colorize("FAIL (EXPECTED)", self.RED), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize("FAIL (EXPECTED)", self.RED), result.normalized_run_time(), self._format_fixture_times(result)))
                 else:
-                    _log.error("fail: %s", self._format_test_method_name(result.test_method), exc_info=result.exception_info)
+                    self._log_result_exception_info("fail", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('F', self.RED))
                     else:
-                        self.writeln("%s in %s" % (self._colorize("FAIL", self.RED), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize("FAIL", self.RED), result.normalized_run_time(), self._format_fixture_times(result)))
 
             elif result.error:
                 if result.test_method.im_class.in_suite(result.test_method, 'expected-failure'):
-                    _log.error("error (expected): %s", self._format_test_method_name(result.test_method), exc_info=result.exception_info)
+                    self._log_result_exception_info("error (expected)", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('e', self.RED))
                     else:
-                        self.writeln("%s in %s" % (self._colorize("ERROR (EXPECTED)", self.RED), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize("ERROR (EXPECTED)", self.RED), result.normalized_run_time(), self._format_fixture_times(result)))
                 else:
-                    _log.error("error: %s", self._format_test_method_name(result.test_method), exc_info=result.exception_info)
+                    self._log_result_exception_info("error", result)
                     if self.verbosity == VERBOSITY_NORMAL:
                         self.write(self._colorize('E', self.RED))
                     else:
-                        self.writeln("%s in %s" % (self._colorize("ERROR", self.RED), result.normalized_run_time()))
+                        self.writeln("%s in %s%s" % (self._colorize("ERROR", self.RED), result.normalized_run_time(), self._format_fixture_times(result)))
 
             elif result.incomplete:
-                _log.info("incomplete: %s", self._format_test_method_name(result.test_method))
+                self._log_result("incomplete", result)
                 if self.verbosity == VERBOSITY_NORMAL:
                     self.write(self._colorize('-', self.YELLOW))
                 else:
                     self.writeln(self._colorize('INCOMPLETE', self.YELLOW))
 
             else:
-                _log.info("unknown: %s", self._format_test_method_name(result.test_method))
+                self._log_result("unknown", result)
                 if self.verbosity == VERBOSITY_NORMAL:
                     self.write('?')
                 else:
                     self.writeln('UNKNOWN')
 
+    def _format_fixture_times(self, result):
+        """Break a test's run time down by phase, if its setup and teardown took long enough to matter."""
+        fixture_time = result.phase_times.get('setup', 0.0) + result.phase_times.get('teardown', 0.0)
+        if fixture_time < 0.005:
+            return ''
+        return " (%s)" % self._format_phase_times(result.phase_times)
+
+    def report_phase_times(self, phase_times):
+        if self.verbosity >= VERBOSITY_VERBOSE and phase_times:
+            self.writeln('')
+            self.write("Time by phase: %s" % self._format_phase_times(phase_times))
+
+    def report_coverage_overhead(self, overhead):
+        if self.verbosity > VERBOSITY_SILENT:
+            import code_coverage
+            self.writeln('')
+            self.write(code_coverage.format_overhead(overhead))
+
+    def report_profile(self, summary):
+        if self.verbosity > VERBOSITY_SILENT:
+            import profiling
+            self.writeln('')
+            self.write(profiling.format_summary(summary))
+
+    def report_sampling(self, overhead):
+        if self.verbosity > VERBOSITY_SILENT:
+            import sampling_profiler
+            self.writeln('')
+            self.write(sampling_profiler.format_overhead(overhead))
+
     def heading(self, *messages):
         self.writeln("")
         self.writeln("=" * 72)
@@ -202,41 +338,33 @@ class TextTestLogger(TestLoggerBase):
         self.writeln("=" * 72)
         # self.write("%s: " % self._colorize(('FAIL' if result.failure else 'ERROR'), self.RED))
         self.writeln(self._format_test_method_name(result.test_method))
-        self.writeln(''.join(self._format_exception_info(result.exception_info)))
+        self.writeln(self._format_result_exception_info(result))
         self.writeln('=' * 72)
         self.writeln("")
 
-    def report_stats(self, test_case_count, **results):
-        successful = results.get('successful', [])
-        unexpected_success = results.get('unexpected_success', [])
-        failed = results.get('failed', [])
-        incomplete = results.get('incomplete', [])
-        unknown = results.get('unknown', [])
-
-        test_method_count = sum(len(bucket) for bucket in results.values())
+    def report_stats(self, test_case_count, result_counts):
+        """Summarize the run from result_counts, a TestResultCounts."""
+        test_method_count = result_counts.total()
         test_word = "test" if test_method_count == 1 else "tests"
         case_word = "case" if test_case_count == 1 else "cases"
-        unexpected_failed = [result for result in failed if not result.test_method.im_class.in_suite(result.test_method, 'expected-failure')]
-        overall_success = not unexpected_failed and not unknown and not incomplete
+        passed = result_counts.successful + result_counts.unexpected_success
+        unexpected_failed = result_counts.failed - result_counts.expected_failure
+        overall_success = not unexpected_failed and not result_counts.unknown and not result_counts.incomplete
 
         self.writeln('')
         status_string = self._colorize("PASSED", self.GREEN) if overall_success else self._colorize("FAILED", self.RED)
         self.write("%s.  " % status_string)
         self.write("%d %s / %d %s: " % (test_method_count, test_word, test_case_count, case_word))
 
-        passed_string = self._colorize("%d passed" % len(successful+unexpected_success), (self.GREEN if len(successful+unexpected_success) else None))
-        passed_string += self._colorize(" (%d unexpected)" % len(unexpected_success), (self.RED if len(unexpected_success) else None))
+        passed_string = self._colorize("%d passed" % passed, (self.GREEN if passed else None))
+        passed_string += self._colorize(" (%d unexpected)" % result_counts.unexpected_success, (self.RED if result_counts.unexpected_success else None))
 
-        failed_string = self._colorize("%d failed" % len(failed), (self.RED if len(failed) else None))
-        failed_string += self._colorize(" (%d expected)" % (len(failed) - len(unexpected_failed)), (self.RED if len(unexpected_failed) else None))
+        failed_string = self._colorize("%d failed" % result_counts.failed, (self.RED if result_counts.failed else None))
+        failed_string += self._colorize(" (%d expected)" % result_counts.expected_failure, (self.RED if unexpected_failed else None))
 
         self.write("%s, %s.  " % (passed_string, failed_string))
 
-        total_test_time = reduce(
-            operator.add, 
-            (result.run_time for result in (successful+unexpected_success+failed+incomplete)), 
-            datetime.timedelta())
-        self.writeln("(Total test time %.2fs)" % (total_test_time.seconds + total_test_time.microseconds / 1000000.0))
+        self.writeln("(Total test time %.2fs)" % result_counts.run_time)
 
 class HTMLTestLogger(TextTestLogger):
     traceback_formater = staticmethod(traceback.format_exception)
@@ -244,7 +372,8 @@ class HTMLTestLogger(TextTestLogger):
     def writeln(self, message):
         """Write a message and append a newline"""
         self.stream.write("%s<br />" % message)
-        self.stream.flush()
+        if self.autoflush:
+            self.stream.flush()
 
     BLACK   = "#000"
     BLUE    = "#00F"
@@ -268,3 +397,230 @@ class ColorlessTextTestLogger(TextTestLogger):
 
     def _colorize(self, message, color=None):
         return message
+
+class JSONTestLogger(TestLoggerBase):
+    """Writes a line of JSON for each test started and each result, for other programs to read.
+
+    Result records carry the test's id, its status, its time in each phase and its formatted
+    exception, if any.  A final record has the counts for the run.  Records are written out in
+    batches, at least every FLUSH_INTERVAL seconds while results are coming in, so the output can
+    be followed as the run goes.
+
+    Nothing comes in while a test runs, though, so unless a ThreadedTestLogger is flushing us in
+    the background, everything buffered is written out as each test starts: a long or hung test
+    then shows up in the output as the last test started.
+    """
+    traceback_formater = staticmethod(traceback.format_exception)
+
+    # write out buffered records once we have this many of them...
+    BATCH_SIZE = 100
+    # ...or when the oldest has been waiting this many seconds
+    FLUSH_INTERVAL = 1.0
+
+    # whether to write out everything buffered when a test starts; ThreadedTestLogger flushes on a timer instead
+    autoflush = True
+
+    def __init__(self, verbosity, stream=sys.stdout):
+        super(JSONTestLogger, self).__init__(verbosity, stream)
+        self._records = []
+        self._first_record_time = None
+        self.phase_times = {}
+        self.coverage_overhead = None
+
+    def report_test_name(self, test_method, start_time=None):
+        self._record({
+            'event': 'test_start',
+            'test_id': self._test_id(test_method),
+            'time': start_time if start_time is not None else time.time(),
+        })
+        if self.autoflush:
+            self.flush()
+
+    def report_test_result(self, result):
+        description = RemoteTestMethod.describe(result.test_method)
+        exception = None
+        if result.exception_info is not None or result.formatted_exception_info is not None:
+            exception = self._format_result_exception_info(result)
+        self._record({
+            'event': 'test_result',
+            'test_id': self._test_id(result.test_method),
+            'test_case': description['test_case'],
+            'method': description['name'],
+            'suites': sorted(description['suites']),
+            'fixture_type': description['fixture_type'],
+            'status': self._status(result),
+            'expected_failure': bool(result.expected_failure),
+            'start_time': result.start_time,
+            'end_time': result.end_time,
+            'run_time': result.run_time,
+            'phase_times': result.phase_times,
+            'exception': exception,
+        })
+
+    def _test_id(self, test_method):
+        return "%s.%s.%s" % (test_method.im_class.__module__, test_method.im_class.__name__, test_method.__name__)
+
+    def _status(self, result):
+        if result.success:
+            return 'unexpected_success' if result.unexpected_success else 'success'
+        elif result.failure:
+            return 'failure'
+        elif result.error:
+            return 'error'
+        elif result.incomplete:
+            return 'incomplete'
+        return 'unknown'
+
+    # failures are in the result records already
+    def failure(self, result):
+        pass
+
+    def report_failures(self, failed_results):
+        pass
+
+    def report_phase_times(self, phase_times):
+        self.phase_times = dict(phase_times)
+
+    def report_coverage_overhead(self, overhead):
+        self.coverage_overhead = overhead
+
+    def report_profile(self, summary):
+        record = {'event': 'profile'}
+        record.update(summary)
+        self._record(record)
+
+    def report_sampling(self, overhead):
+        record = {'event': 'sampling'}
+        record.update(overhead)
+        self._record(record)
+
+    def report_stats(self, test_case_count, result_counts):
+        self._record({
+            'event': 'run_complete',
+            'test_case_count': test_case_count,
+            'test_count': result_counts.total(),
+            'successful': result_counts.successful,
+            'unexpected_success': result_counts.unexpected_success,
+            'failed': result_counts.failed,
+            'expected_failure': result_counts.expected_failure,
+            'incomplete': result_counts.incomplete,
+            'unknown': result_counts.unknown,
+            'run_time': result_counts.run_time,
+            'phase_times': self.phase_times,
+            'coverage_overhead': self.coverage_overhead,
+            'success': result_counts.succeeded(),
+        })
+        self.flush()
+
+    def _record(self, record):
+        if not self._records:
+            self._first_record_time = time.time()
+        self._records.append(json.dumps(record))
+        if len(self._records) >= self.BATCH_SIZE or time.time() - self._first_record_time >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Write out any buffered records."""
+        if self._records:
+            self.stream.write('\n'.join(self._records) + '\n')
+            self._records = []
+        self.stream.flush()
+
+class ThreadedTestLogger(object):
+    """Wraps a TestLogger so that its reporting is done on a background thread.
+
+    The thread calling the report methods just queues them up, along with a copy of any result (so
+    compacting the original doesn't pull its exception out from under us).  The background thread
+    calls the wrapped logger in the same order, so the output is just as it would have been, but it
+    only flushes the wrapped logger every FLUSH_INTERVAL seconds, and when flush() is called at the
+    end of the run.  A slow output stream then holds up nothing but the background thread.  Output
+    that doesn't go through us (errors logged to stderr, or a test's prints) can then land out of
+    order with ours, which is why runners only use this when asked to.
+
+    Anything other than the report methods, like format_exception_info, goes straight to the
+    wrapped logger.
+    """
+
+    FLUSH_INTERVAL = 0.25
+
+    REPORT_METHODS = ('report_test_name', 'report_test_result', 'failure', 'report_failures', 'report_phase_times', 'report_coverage_overhead', 'report_profile', 'report_sampling', 'report_stats')
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.logger.autoflush = False
+        self.events = Queue.Queue()
+        # started on the first event, so that a runner that forks first doesn't fork a running thread
+        self.thread = None
+
+    def __getattr__(self, name):
+        if name in self.REPORT_METHODS:
+            return lambda *args: self._enqueue(name, args)
+        return getattr(self.logger, name)
+
+    def _enqueue(self, method_name, args):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._report_events, name='testify-reporter')
+            self.thread.setDaemon(True)
+            self.thread.start()
+        if method_name == 'report_test_name' and len(args) == 1:
+            # the test is starting now, not whenever the background thread gets to it
+            args = [args[0], time.time()]
+        elif method_name in ('report_test_result', 'failure'):
+            args = [copy.copy(args[0])]
+        elif method_name == 'report_phase_times':
+            args = [dict(args[0])]
+        self.events.put((method_name, args))
+
+    def flush(self):
+        """Wait until everything queued so far has been reported and written out.
+
+        That leaves the background thread waiting for more, holding no locks, so it's safe to fork
+        (for TestCase.fork_test_methods, say) until something else is queued.
+        """
+        if self.thread is None:
+            self.logger.flush()
+            return
+        done = threading.Event()
+        self.events.put(('flush', done))
+        # waiting with a timeout keeps us interruptible
+        while not done.is_set():
+            done.wait(self.FLUSH_INTERVAL)
+
+    def _report_events(self):
+        # whether we've reported anything since we last flushed, and when that was
+        dirty = False
+        last_flush = time.time()
+        while True:
+            if dirty:
+                try:
+                    method_name, args = self.events.get(timeout=max(0, last_flush + self.FLUSH_INTERVAL - time.time()))
+                except Queue.Empty:
+                    method_name, args = None, None
+            else:
+                # Nothing to flush, so there's no need to wake up until there's something to do.
+                # (This is also where we sit out interpreter shutdown, as a daemon thread.)
+                method_name, args = self.events.get()
+
+            if method_name == 'flush':
+                self._flush()
+                dirty = False
+                last_flush = time.time()
+                args.set()
+                continue
+            elif method_name is not None:
+                try:
+                    getattr(self.logger, method_name)(*args)
+                except Exception:
+                    _log.exception("error reporting %s", method_name)
+                dirty = True
+
+            if dirty and time.time() - last_flush >= self.FLUSH_INTERVAL:
+                self._flush()
+                dirty = False
+                last_flush = time.time()
+
+    def _flush(self):
+        try:
+            self.logger.flush()
+        except Exception:
+            _log.exception("error flushing test output")
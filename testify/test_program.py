@@ -17,18 +17,23 @@ from collections import defaultdict
 from optparse import OptionParser
 import os
 import pwd
+import random
 import sys
 import logging
 
 import testify
-from testify.test_logger import TextTestLogger, ColorlessTextTestLogger, VERBOSITY_NORMAL, VERBOSITY_SILENT, VERBOSITY_VERBOSE
+from testify.test_logger import TextTestLogger, ColorlessTextTestLogger, JSONTestLogger, VERBOSITY_NORMAL, VERBOSITY_SILENT, VERBOSITY_VERBOSE
 from testify.test_runner import TestRunner
 from testify import test_discovery
+from testify.suite_index import SuiteExpressionError, parse_suite_expression
+from testify.test_history import ORDERS, ORDER_DISCOVERY, ORDER_FAILED_FIRST, ORDER_RANDOM, ORDER_SLOWEST_FIRST, assign_buckets
 from testify.utils import class_logger
 
 ACTION_RUN_TESTS = 0
 ACTION_LIST_SUITES = 1
 ACTION_LIST_TESTS = 2
+ACTION_WRITE_BUCKET_OVERRIDES = 3
+ACTION_REPORT_RESULTS_LOG = 4
 
 def get_bucket_overrides(filename):
     """Returns a map from test class name to test bucket.
@@ -48,6 +53,14 @@ def get_bucket_overrides(filename):
     ofile.close()
     return overrides
 
+def write_bucket_overrides(filename, buckets):
+    """Write a map from test class name to test bucket out in the format get_bucket_overrides reads."""
+    ofile = open(filename, 'w')
+    ofile.write("# test module and class,bucket\n")
+    for test_module_and_class, bucket in sorted(buckets.iteritems()):
+        ofile.write("%s,%d\n" % (test_module_and_class, bucket))
+    ofile.close()
+
 def parse_test_runner_command_line_args(args):
     """Parse command line args for the TestRunner to determine verbosity and other stuff"""
     parser = OptionParser(usage="%prog <test path> [options]", version="%%prog %s" % testify.__version__)
@@ -57,49 +70,167 @@ def parse_test_runner_command_line_args(args):
     parser.add_option("-v", "--verbose", action="store_const", const=VERBOSITY_VERBOSE, dest="verbosity")
 
     parser.add_option("-c", "--coverage", action="store_true", dest="coverage")
-    parser.add_option("-p", "--profile", action="store_true", dest="profile")
+    parser.add_option("--coverage-file", action="store", dest="coverage_file", type="string", default=None,
+        help="Save coverage data for the run, by TestCase, to this file (default coverage_file.json)")
+    parser.add_option("--coverage-source", action="append", dest="coverage_source_roots", type="string", default=[],
+        help="Only collect coverage for files under this directory (may be given more than once); the default is every file")
+    parser.add_option("--coverage-index", action="store", dest="coverage_index_file", type="string", default=None,
+        help="Keep track of which tests run each line of code in this file, updating it whenever we run with --coverage")
+    parser.add_option("--affected-by", action="store", dest="affected_by", type="string", default=None,
+        help="Only run the TestCases that --coverage-index says ran lines this unified diff changes (- to read it from stdin), and any it doesn't know")
+    parser.add_option("-p", "--profile", action="store_true", dest="profile",
+        help="Profile the run with cProfile, saving the stats to one file and reporting the functions that took the most time")
+    parser.add_option("--profile-file", action="store", dest="profile_file", type="string", default=None,
+        help="Save --profile stats to this file (default testify.pstats)")
+    parser.add_option("--profile-top", action="store", dest="profile_top", type="int", default=20,
+        help="How many functions --profile reports, by cumulative and by self time")
+    parser.add_option("--profile-sampling", action="store_true", dest="profile_sampling", default=False,
+        help="Profile the run by sampling every thread's stack on a timer, writing the samples out as collapsed stacks for flame graphs.  Test methods forked for fork_test_methods aren't sampled")
+    parser.add_option("--profile-sampling-interval", action="store", dest="sampling_interval", type="float", default=None,
+        help="Seconds of CPU time between --profile-sampling samples (default 0.005)")
+    parser.add_option("--profile-sampling-file", action="store", dest="sampling_file", type="string", default=None,
+        help="Write --profile-sampling samples to this file (default testify.collapsed)")
+    parser.add_option("--profile-phases", action="store_true", dest="profile_phases", default=False,
+        help="Also profile discovery, fixtures and test methods separately, saving each to its own file as well")
 
     parser.add_option("-i", "--include-suite", action="append", dest="suites_include", type="string", default=[])
     parser.add_option("-x", "--exclude-suite", action="append", dest="suites_exclude", type="string", default=[])
+    parser.add_option("--suite-expression", action="store", dest="suite_expression", type="string", default=None,
+        help="Only run test methods whose suites match this expression, e.g. \"db and not (slow or flaky)\"")
+
+    parser.add_option("--timeout", action="store", dest="timeout", type="float", default=None,
+        help="Interrupt any test or fixture method that takes longer than this many seconds, recording it as an error.  @timeout overrides this for a method")
 
     parser.add_option("--list-suites", action="store_true", dest="list_suites")
     parser.add_option("--list-tests", action="store_true", dest="list_tests")
+    parser.add_option("--static-discovery", action="store_true", dest="static_discovery", default=False,
+        help="When listing tests or suites, parse test modules instead of importing them wherever possible")
 
     parser.add_option("--bucket", action="store", dest="bucket", type="int")
     parser.add_option("--bucket-count", action="store", dest="bucket_count", type="int")
     parser.add_option("--bucket-overrides-file", action="store", dest="bucket_overrides_file", default=None)
+    parser.add_option("--bucket-by-module", action="store_true", dest="bucket_by_module", default=False,
+        help="Bucket whole modules, except where --index-file knows their TestCases, so each bucket only imports its own.  The index file isn't updated")
+    parser.add_option("--write-bucket-overrides", action="store", dest="write_bucket_overrides", type="string", default=None,
+        help="Write a bucket overrides file dividing all the discovered tests between --bucket-count buckets, then exit")
+
+    parser.add_option("--history-file", action="store", dest="history_file", type="string", default=None,
+        help="Record how long each TestCase takes in this file, and use it to balance buckets.  Buckets balanced from it don't update it; "
+            "to keep it current, write overrides from it with --write-bucket-overrides and run the buckets with --bucket-overrides-file, which do")
+
+    parser.add_option("--index-file", action="store", dest="index_file", type="string", default=None,
+        help="Cache what discovery finds in each test module in this file, so unchanged modules needn't be imported")
+
+    parser.add_option("--order", action="store", dest="test_case_order", type="choice", choices=ORDERS, default=ORDER_DISCOVERY,
+        help="Order to run TestCases in: %s.  The slowest-first and failed-first orders need --history-file" % ', '.join(ORDERS))
+    parser.add_option("--seed", action="store", dest="seed", type="int", default=None,
+        help="Seed for --order=random, to repeat a previous run's order")
+
+    parser.add_option("--parallel", action="store", dest="parallel", type="int", default=None,
+        help="Run TestCases in this many worker processes")
+    parser.add_option("--serve", action="store", dest="serve", type="string", default=None,
+        help="Hand out TestCases to clients connecting on this address (unix socket path, or port or host:port) and report on their results.  "
+            "TCP addresses need $TESTIFY_AUTHKEY set here and for the clients; without it, the server makes one up and logs it")
+    parser.add_option("--connect", action="store", dest="connect", type="string", default=None,
+        help="Run TestCases handed out by the server at this address")
+
+    parser.add_option("--preload-server", action="store", dest="preload_server", type="string", default=None,
+        help="Import testify and the tests once, then serve runs from bin/testify-client on this unix socket")
 
     parser.add_option("--summary", action="store_true", dest="summary_mode")
+    parser.add_option("--results-log", action="store", dest="results_log_file", type="string", default=None,
+        help="Write each result to this file as it comes in, as a line of JSON")
+    parser.add_option("--report-results-log", action="store", dest="report_results_log", type="string", default=None,
+        help="Report on the results in a file written by --results-log, e.g. by a run that didn't finish, then exit")
     parser.add_option("--no-color", action="store_true", dest="disable_color")
+    parser.add_option("--background-output", action="store_true", dest="background_output", default=False,
+        help="Write output from a background thread, flushing it in batches, rather than from the thread running the tests.  "
+            "Anything else written to stdout or stderr, like errors logged, may then appear out of order with it")
+    parser.add_option("--json", action="store_true", dest="json_output", default=False,
+        help="Write a line of JSON for each test started and each result, and one summing up the run, instead of the usual output")
     
     parser.add_option("--log-file", action="store", dest="log_file", type="string", default=None)
     parser.add_option("--log-level", action="store", dest="log_level", type="string", default="INFO")
 
     (options, args) = parser.parse_args(args)
-    if len(args) < 1:
+    if options.report_results_log:
+        # no tests to find, just a log to read
+        test_path, module_method_overrides = None, {}
+    elif len(args) < 1:
         parser.error("Test path required")
-
-    test_path, module_method_overrides = _parse_test_runner_command_line_module_method_overrides(args)
+    else:
+        test_path, module_method_overrides = _parse_test_runner_command_line_module_method_overrides(args)
 
     if pwd.getpwuid(os.getuid()).pw_name == 'buildbot':
         options.disable_color = True
 
-    if options.list_suites:
+    if options.suite_expression is not None:
+        try:
+            parse_suite_expression(options.suite_expression)
+        except SuiteExpressionError, e:
+            parser.error(str(e))
+
+    if options.profile_phases:
+        options.profile = True
+
+    if options.affected_by and not options.coverage_index_file:
+        parser.error("--affected-by requires --coverage-index")
+
+    if options.write_bucket_overrides and not options.bucket_count:
+        parser.error("--write-bucket-overrides requires --bucket-count")
+
+    if options.test_case_order in (ORDER_SLOWEST_FIRST, ORDER_FAILED_FIRST) and not options.history_file:
+        parser.error("--order=%s requires --history-file" % options.test_case_order)
+
+    if options.test_case_order == ORDER_RANDOM and options.seed is None:
+        options.seed = random.randint(0, sys.maxint)
+        sys.stderr.write("Running TestCases in random order with --seed=%d\n" % options.seed)
+
+    if options.report_results_log:
+        runner_action = ACTION_REPORT_RESULTS_LOG
+    elif options.list_suites:
         runner_action = ACTION_LIST_SUITES
     elif options.list_tests:
         runner_action = ACTION_LIST_TESTS
+    elif options.write_bucket_overrides:
+        runner_action = ACTION_WRITE_BUCKET_OVERRIDES
     else:
         runner_action = ACTION_RUN_TESTS
     
+    if options.json_output:
+        test_logger_class = JSONTestLogger
+    elif options.disable_color:
+        test_logger_class = ColorlessTextTestLogger
+    else:
+        test_logger_class = TextTestLogger
+
     test_runner_args = {
         'verbosity': options.verbosity,
         'suites_include': options.suites_include,
         'suites_exclude': options.suites_exclude,
+        'suite_expression': options.suite_expression,
         'coverage': options.coverage,
+        'coverage_file': options.coverage_file,
+        'coverage_index_file': options.coverage_index_file,
+        'coverage_source_roots': options.coverage_source_roots,
+        'affected_by': options.affected_by,
         'profile': options.profile,
+        'profile_file': options.profile_file,
+        'profile_top': options.profile_top,
+        'profile_phases': options.profile_phases,
+        'profile_sampling': options.profile_sampling,
+        'sampling_interval': options.sampling_interval,
+        'sampling_file': options.sampling_file,
         'module_method_overrides': module_method_overrides,
         'summary_mode': options.summary_mode,
-        'test_logger_class': (TextTestLogger if not options.disable_color else ColorlessTextTestLogger)
+        'history_file': options.history_file,
+        'test_case_order': options.test_case_order,
+        'seed': options.seed,
+        'index_file': options.index_file,
+        'results_log_file': options.results_log_file,
+        'background_output': options.background_output,
+        'timeout': options.timeout,
+        'test_logger_class': test_logger_class,
         }
 
     return runner_action, test_path, test_runner_args, options
@@ -133,17 +264,44 @@ class TestProgram(object):
         command_line_args = command_line_args or sys.argv[1:]
 
         runner_action, test_path, test_runner_args, other_opts = parse_test_runner_command_line_args(command_line_args)
+
+        if other_opts.preload_server:
+            from testify.preload import PreloadServer
+            # each run served sets up its own logging
+            PreloadServer(test_path, other_opts.preload_server).serve_forever()
+            sys.exit(0)
         
         self.setup_logging(other_opts)
+
+        if runner_action == ACTION_REPORT_RESULTS_LOG:
+            result = TestRunner(**test_runner_args).report_results_log(other_opts.report_results_log)
+            sys.exit(not result)
         
-        runner = TestRunner(**test_runner_args)
+        # the other runners need multiprocessing, which we'd rather not import for nothing
+        if other_opts.serve:
+            from testify.test_runner_server import TestRunnerServer, get_authkey
+            runner = TestRunnerServer(address=other_opts.serve, authkey=get_authkey(), **test_runner_args)
+        elif other_opts.connect:
+            from testify.test_runner_server import TestRunnerClient, get_authkey
+            runner = TestRunnerClient(address=other_opts.connect, authkey=get_authkey(), **test_runner_args)
+        elif other_opts.parallel:
+            from testify.test_runner_parallel import ParallelTestRunner
+            runner = ParallelTestRunner(processes=other_opts.parallel, **test_runner_args)
+        else:
+            runner = TestRunner(**test_runner_args)
 
         bucket_overrides = {}
         if other_opts.bucket_overrides_file:
             bucket_overrides = get_bucket_overrides(other_opts.bucket_overrides_file)
 
+        # the overrides file covers every test, whichever bucket we were asked for
+        bucket = other_opts.bucket if runner_action != ACTION_WRITE_BUCKET_OVERRIDES else None
+
         try:
-            runner.discover(test_path, bucket=other_opts.bucket, bucket_count=other_opts.bucket_count, bucket_overrides=bucket_overrides)
+            runner.discover(test_path, bucket=bucket, bucket_count=other_opts.bucket_count, bucket_overrides=bucket_overrides,
+                import_test_cases=(runner_action == ACTION_RUN_TESTS),
+                static=(other_opts.static_discovery and runner_action in (ACTION_LIST_SUITES, ACTION_LIST_TESTS)),
+                bucket_by_module=other_opts.bucket_by_module)
         except test_discovery.DiscoveryError, e:
             self.log.error("Failure loading tests: %s", e)
             sys.exit(1)
@@ -154,6 +312,14 @@ class TestProgram(object):
         elif runner_action == ACTION_LIST_TESTS:
             runner.list_tests()
             sys.exit(0)
+        elif runner_action == ACTION_WRITE_BUCKET_OVERRIDES:
+            buckets = assign_buckets(
+                runner.test_case_names(),
+                other_opts.bucket_count,
+                history=runner.history,
+                bucket_overrides=bucket_overrides)
+            write_bucket_overrides(other_opts.write_bucket_overrides, buckets)
+            sys.exit(0)
         elif runner_action == ACTION_RUN_TESTS:
             result = runner.run()
             sys.exit(not result)
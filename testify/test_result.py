@@ -15,22 +15,56 @@
 
 """This module contains the TestResult class, each instance of which holds status information for a single test method."""
 __testify = 1
-import datetime
+import time
+
+from testify.utils.monotonic import monotonic
+
+# the parts of running a TestCase that results time separately, in the order they happen
+PHASES = ['session_setup', 'module_setup', 'class_setup', 'setup', 'test_method', 'teardown', 'class_teardown', 'module_teardown', 'session_teardown']
 
 class TestResult(object):
+    """The outcome of running a test (or fixture) method.
+
+    A run may produce a great many of these, so they're kept small: times are plain floats, and
+    once a result has been reported, compact() renders its exception to text and lets go of the
+    traceback and the TestCase instance, which would otherwise keep every local of the test alive.
+    """
+    __slots__ = (
+        'test_method', 'test_method_name',
+        'success', 'failure', 'error', 'incomplete', 'unexpected_success', 'expected_failure', 'complete',
+        'start_time', 'end_time', 'run_time', 'phase_times',
+        'exception_info', 'formatted_exception_info',
+    )
+
     def __init__(self, test_method):
-        super(TestResult, self).__init__(self)
+        super(TestResult, self).__init__()
         self.test_method = test_method
         self.test_method_name = test_method.__name__
         self.success = self.failure = self.error = self.incomplete = self.unexpected_success = self.expected_failure = None
         self.complete = False
+        self.exception_info = None
+        self.formatted_exception_info = None
+        # seconds since the epoch, and seconds taken
+        self.start_time = self.end_time = self.run_time = None
+        # seconds spent in each of PHASES, by the monotonic clock
+        self.phase_times = {}
 
     def start(self):
-        self.start_time = datetime.datetime.now()
+        self.start_time = time.time()
+
+    def time_phase(self, phase, block_fxn):
+        """Call block_fxn, adding the time it takes to the time spent in phase, whether or not it raises."""
+        phase_start = monotonic()
+        try:
+            return block_fxn()
+        finally:
+            self.phase_times[phase] = self.phase_times.get(phase, 0.0) + (monotonic() - phase_start)
 
     def _complete(self):
         self.complete = True
-        self.end_time = datetime.datetime.now()
+        self.end_time = time.time()
+        if self.start_time is None:
+            self.start_time = self.end_time
         self.run_time = self.end_time - self.start_time
 
     def end_in_failure(self, exception_info):
@@ -62,5 +96,85 @@ class TestResult(object):
             self.incomplete = True
             self.exception_info = exception_info
 
+    def compact(self, exception_formatter):
+        """Render our exception to text with exception_formatter (which takes an exc_info tuple),
+        and swap our test method for a RemoteTestMethod, dropping the references that keep the
+        traceback's frames and the TestCase instance alive."""
+        if self.exception_info is not None:
+            self.formatted_exception_info = exception_formatter(self.exception_info)
+            self.exception_info = None
+        if not isinstance(self.test_method, RemoteTestMethod):
+            self.test_method = RemoteTestMethod(
+                self.test_method.im_class,
+                self.test_method.__name__,
+                getattr(self.test_method, '_suites', ()),
+                getattr(self.test_method, '_fixture_type', None))
+
+    def to_dict(self, formatted_exception_info=None):
+        """Return a picklable summary of this result, for shipping it to another process.
+
+        Tracebacks can't be pickled, so the caller passes in the exception info already formatted.
+        """
+        return {
+            'test_method': RemoteTestMethod.describe(self.test_method),
+            'success': self.success,
+            'failure': self.failure,
+            'error': self.error,
+            'incomplete': self.incomplete,
+            'unexpected_success': self.unexpected_success,
+            'expected_failure': self.expected_failure,
+            'complete': self.complete,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'run_time': self.run_time,
+            'phase_times': self.phase_times,
+            'formatted_exception_info': formatted_exception_info,
+        }
+
+    @classmethod
+    def from_dict(cls, result_dict, test_case_classes):
+        """Rebuild a result shipped from another process by to_dict.
+
+        test_case_classes maps "module.ClassName" to the TestCase classes known to this process.
+        """
+        result_dict = dict(result_dict)
+        result = cls(RemoteTestMethod.from_description(result_dict.pop('test_method'), test_case_classes))
+        for attr, value in result_dict.iteritems():
+            setattr(result, attr, value)
+        return result
+
     def normalized_run_time(self):
-        return "%.2fs" % (self.run_time.seconds + (self.run_time.microseconds / 1000000.0))
+        return "%.2fs" % self.run_time
+
+class RemoteTestMethod(object):
+    """Stand-in for a test method that was run in another process, or whose result has been compacted.
+
+    Loggers only need a test method's name, class and suites to report on it, so that's all this carries.
+    """
+    def __init__(self, test_case_class, name, suites, fixture_type=None):
+        self.im_class = test_case_class
+        self.__name__ = name
+        self.__module__ = test_case_class.__module__
+        self._suites = set(suites)
+        if fixture_type is not None:
+            self._fixture_type = fixture_type
+
+    @staticmethod
+    def describe(test_method):
+        """Return a picklable description of test_method, from which another process can build a RemoteTestMethod."""
+        return {
+            'test_case': "%s.%s" % (test_method.im_class.__module__, test_method.im_class.__name__),
+            'name': test_method.__name__,
+            'suites': list(getattr(test_method, '_suites', ())),
+            'fixture_type': getattr(test_method, '_fixture_type', None),
+        }
+
+    @classmethod
+    def from_description(cls, description, test_case_classes):
+        test_case_name = description['test_case']
+        test_case_class = test_case_classes.get(test_case_name)
+        if test_case_class is None:
+            # e.g. reporting on a results log without the tests imported; all we need is the names
+            module, _, class_name = test_case_name.rpartition('.')
+            test_case_class = type(str(class_name), (object,), {'__module__': str(module)})
+        return cls(test_case_class, description['name'], description['suites'], description['fixture_type'])
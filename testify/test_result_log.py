@@ -0,0 +1,143 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the TestResultLog class, which tallies a run's results as they arrive and
+writes them out to disk rather than keeping them in memory."""
+__testify = 1
+
+import json
+import os
+import tempfile
+
+from test_result import TestResult
+
+class TestResultCounts(object):
+    """How many results of each status a run has had, and how long they took."""
+
+    def __init__(self):
+        self.successful = 0
+        self.unexpected_success = 0
+        self.failed = 0
+        # those of the failed that were marked expected-failure
+        self.expected_failure = 0
+        self.incomplete = 0
+        self.unknown = 0
+        self.run_time = 0.0
+        self.test_cases = set()
+
+    def add(self, result):
+        """Count a result, which may be a TestResult or a record from a TestResultLog."""
+        if isinstance(result, TestResult):
+            result = result.to_dict()
+        self.test_cases.add(result['test_method']['test_case'])
+
+        if result['success']:
+            if result['unexpected_success']:
+                self.unexpected_success += 1
+            else:
+                self.successful += 1
+        elif result['failure'] or result['error']:
+            self.failed += 1
+            if result['expected_failure']:
+                self.expected_failure += 1
+        elif result['incomplete']:
+            self.incomplete += 1
+        else:
+            self.unknown += 1
+            return
+        self.run_time += result['run_time'] or 0.0
+
+    def total(self):
+        return self.successful + self.unexpected_success + self.failed + self.incomplete + self.unknown
+
+    def succeeded(self):
+        """Whether the run succeeded, in the sense TestRunner.run returns: nothing failed, expectedly or not, and nothing went unaccounted for."""
+        return self.failed + self.unknown == 0
+
+class TestResultLog(object):
+    """Tallies results into TestResultCounts as they arrive, and appends each to a file as a line of JSON.
+
+    The file is written as we go, so a run that dies part way through still leaves a record of
+    everything up to that point, which load() can report on later.  Without a filename, we use a
+    temporary file, removed by close().  Only failures are ever read back, for the summary, so a run
+    holds on to nothing per result.
+    """
+
+    def __init__(self, filename=None):
+        self.counts = TestResultCounts()
+        self._temporary = filename is None
+        if self._temporary:
+            fd, self.filename = tempfile.mkstemp(prefix='testify-results-', suffix='.json')
+            self.log_file = os.fdopen(fd, 'w')
+        else:
+            self.filename = filename
+            self.log_file = open(filename, 'w')
+
+    def append(self, result):
+        """Record a completed, compacted result."""
+        record = result.to_dict(result.formatted_exception_info)
+        self.counts.add(record)
+        self.log_file.write(json.dumps(record) + '\n')
+        self.log_file.flush()
+
+    def failed_results(self, test_case_classes={}):
+        """Return the failed results so far, read back from the log."""
+        return self.failed_results_in(self.filename, test_case_classes)
+
+    def close(self):
+        if not self.log_file.closed:
+            self.log_file.close()
+        if self._temporary and os.path.exists(self.filename):
+            os.unlink(self.filename)
+
+    @staticmethod
+    def failed_results_in(filename, test_case_classes={}):
+        """Return the failed results logged to filename.
+
+        This can be iterated over more than once.  test_case_classes maps "module.ClassName" to
+        TestCase classes, as for TestResult.from_dict; results for any others get a stand-in class.
+        """
+        return _LoggedFailures(filename, test_case_classes)
+
+    @staticmethod
+    def load(filename):
+        """Return TestResultCounts for a log written by an earlier (possibly unfinished) run."""
+        counts = TestResultCounts()
+        for record in _read_records(filename):
+            counts.add(record)
+        return counts
+
+def _read_records(filename):
+    log_file = open(filename)
+    try:
+        for line in log_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line of a log from a run that died mid-write may be incomplete
+                continue
+            yield record
+    finally:
+        log_file.close()
+
+class _LoggedFailures(object):
+    def __init__(self, filename, test_case_classes):
+        self.filename = filename
+        self.test_case_classes = test_case_classes
+
+    def __iter__(self):
+        for record in _read_records(self.filename):
+            if record['failure'] or record['error']:
+                yield TestResult.from_dict(record, self.test_case_classes)
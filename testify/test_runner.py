@@ -24,14 +24,21 @@ from optparse import OptionParser
 import os
 import pprint
 import sys
+import time
 import traceback
 import types
 
-import code_coverage
-import cProfile
-from test_case import MetaTestCase, TestCase
+from test_case import MetaTestCase, SharedFixtures, TestCase
 import test_discovery
-from test_logger import _log, TextTestLogger, VERBOSITY_SILENT, VERBOSITY_NORMAL, VERBOSITY_VERBOSE
+from coverage_index import CoverageIndex, diff_changed_lines
+from test_history import ORDER_DISCOVERY, TestHistory, assign_buckets, order_test_cases
+from test_index import TestIndex
+from suite_index import SuiteIndex
+from test_result_log import TestResultLog
+from test_logger import _log, TextTestLogger, ThreadedTestLogger, VERBOSITY_SILENT, VERBOSITY_NORMAL, VERBOSITY_VERBOSE
+
+# fixtures whose failures are reported as results in their own right, since no test method would show them
+TEARDOWN_FIXTURE_TYPES = ('class_teardown', 'module_teardown', 'session_teardown')
 
 class TestRunner(object):
     """TestRunner is the controller class of the testify suite.  
@@ -48,37 +55,269 @@ class TestRunner(object):
         profile=False,
         summary_mode=False,
         test_logger_class=TextTestLogger,
-        module_method_overrides={}):
+        module_method_overrides={},
+        history_file=None,
+        test_case_order=ORDER_DISCOVERY,
+        seed=None,
+        index_file=None,
+        suite_expression=None,
+        results_log_file=None,
+        background_output=False,
+        timeout=None,
+        coverage_file=None,
+        coverage_index_file=None,
+        affected_by=None,
+        coverage_source_roots=None,
+        profile_file=None,
+        profile_top=20,
+        profile_phases=False,
+        profile_sampling=False,
+        sampling_interval=None,
+        sampling_file=None):
         """After instantiating a TestRunner, call add_test_case() to add some tests, and run() to run them."""
         self.verbosity = verbosity
 
         self.suites_include = set(suites_include)
         self.suites_exclude = set(suites_exclude)
+        self.suite_expression = suite_expression
+        # default for how long, in seconds, each test and fixture method may take
+        self.timeout = timeout
 
         self.coverage = coverage
+        # where to save coverage data at the end of the run; code_coverage.DATA_FILE if not given
+        self.coverage_file = coverage_file
+        # only trace files under these directories; everything if there are none
+        self.coverage_source_roots = coverage_source_roots
+        # which tests ran each line, updated by coverage runs
+        self.coverage_index = CoverageIndex(coverage_index_file) if coverage_index_file else None
+        # with a diff to go by, we only select the TestCases the index says it affects
+        self.affected_test_case_names = None
+        if affected_by is not None:
+            self.affected_test_case_names = self.find_affected_test_cases(affected_by)
         self.profile = profile
+        # where to save the run's profile, and how many of the top functions to report
+        self.profile_file = profile_file
+        self.profile_top = profile_top
+        self.profile_phases = profile_phases
+        self.profiler = self.create_profiler() if profile else None
+        # how often to sample the stack when profiling statistically, and where to write the samples
+        self.sampling_interval = sampling_interval
+        self.sampling_file = sampling_file
+        self.sampler = self.create_sampler() if profile_sampling else None
         self.logger = test_logger_class(self.verbosity)
+        if background_output:
+            self.logger = ThreadedTestLogger(self.logger)
         self.summary_mode = summary_mode
+        # where to log each result as it comes in; a temporary file if not given
+        self.results_log_file = results_log_file
 
         self.module_method_overrides = module_method_overrides
         self.test_case_classes = []
 
+        # the session and module fixtures our TestCases have set up
+        self.shared_fixtures = SharedFixtures()
+
+        # total seconds spent in each phase of running TestCases, class fixtures included
+        self.phase_times = defaultdict(float)
+
+        # how each TestCase behaved on previous runs, if we're keeping track
+        self.history = TestHistory(history_file) if history_file else None
+        # set once we've balanced buckets from the history, which then mustn't change; see bucket_history
+        self.history_frozen = False
+        self.test_case_order = test_case_order
+        self.seed = seed
+
+        # with an index, discovery works from descriptions of the TestCases rather than the classes
+        self.index = TestIndex(index_file) if index_file else None
+        self.test_case_descriptions = None
+
     @classmethod
     def get_test_method_name(cls, test_method):
         return '%s %s.%s' % (test_method.__module__, test_method.im_class.__name__, test_method.__name__)
 
-    def discover(self, test_path, bucket=None, bucket_count=None, bucket_overrides={}):
-        for test_case_class in test_discovery.discover(test_path):
-            override_bucket = bucket_overrides.get(MetaTestCase._cmp_str(test_case_class))
-            if (bucket is None
-                or (override_bucket is None and test_case_class.bucket(bucket_count) == bucket)
-                or (override_bucket is not None and override_bucket == bucket)):
-                if not self.module_method_overrides or test_case_class.__name__ in self.module_method_overrides:
-                    self.add_test_case(test_case_class)
+    def discover(self, test_path, bucket=None, bucket_count=None, bucket_overrides={}, import_test_cases=True, static=False, bucket_by_module=False):
+        """Find the TestCases under test_path that this runner should run.
+
+        With an index, we only import modules that have changed since they were indexed, and then
+        (if import_test_cases is set) those containing TestCases we've selected.  Without one,
+        everything is imported.  If we're only listing tests, static allows changed modules to be
+        parsed instead of imported (see static_discovery), with or without an index.
+
+        Ordinarily we have to know every TestCase before we can pick out our bucket's.  With
+        bucket_by_module, modules the index doesn't know are bucketed whole before any of them are
+        imported, so we only import our own.  Every bucket has to start out with the same index
+        (or none) for them to agree on who gets what, so bucketing by module only reads the index:
+        a bucket that saved what it imported would change how the buckets starting after it divide
+        things up.
+
+        When profiling by phase, discovery is profiled too, and when sampling, sampling starts here.
+        """
+        if self.sampler is not None:
+            self.sampler.start()
+        return self.profile_block('discovery', ('discovery',),
+            lambda: self._discover(test_path, bucket, bucket_count, bucket_overrides, import_test_cases, static, bucket_by_module))
+
+    def _discover(self, test_path, bucket, bucket_count, bucket_overrides, import_test_cases, static, bucket_by_module):
+        bucket_by_module = bucket_by_module and bucket is not None
+        index = self.index
+        if index is None and (static or bucket_by_module):
+            index = TestIndex()
+        if index is not None:
+            buckets = {}
+            select_modules = None
+            if bucket_by_module:
+                def select_modules(module_test_cases):
+                    buckets.update(self.assign_module_buckets(module_test_cases, bucket_count, bucket_overrides))
+                    return [module_name for module_name, test_cases in module_test_cases.iteritems() if test_cases is None and buckets[module_name] == bucket]
+
+            test_cases = test_discovery.discover_indexed(test_path, index, static=static, select_modules=select_modules)
+            if test_cases is not None:
+                if not bucket_by_module:
+                    index.save()
+                test_case_names = ["%s.%s" % (test_case['module'], test_case['name']) for test_case in test_cases]
+                if bucket_by_module:
+                    # whatever we found in the modules we imported is ours, unless it belongs to a module bucketed elsewhere
+                    buckets = dict(
+                        (test_case_name, buckets.get(test_case_name, buckets.get(test_case['module'], bucket)))
+                        for test_case_name, test_case in zip(test_case_names, test_cases))
+                else:
+                    buckets = None
+                selected = set(self.select_test_cases(test_case_names, bucket, bucket_count, bucket_overrides, buckets=buckets))
+                self.test_case_descriptions = [test_case for test_case_name, test_case in zip(test_case_names, test_cases) if test_case_name in selected]
+                if import_test_cases:
+                    self.test_case_descriptions = self.import_test_cases(self.test_case_descriptions, index)
+                return
+
+        test_case_classes = list(test_discovery.discover(test_path))
+        selected = set(self.select_test_cases([MetaTestCase._cmp_str(test_case_class) for test_case_class in test_case_classes], bucket, bucket_count, bucket_overrides))
+        for test_case_class in test_case_classes:
+            if MetaTestCase._cmp_str(test_case_class) in selected:
+                self.add_test_case(test_case_class)
+
+    def assign_module_buckets(self, module_test_cases, bucket_count, bucket_overrides={}):
+        """Bucket the TestCases in indexed modules individually, and unindexed modules (given as None in module_test_cases) whole.
+
+        An override for any TestCase in an unindexed module moves the whole module.
+        """
+        names = set()
+        for module_name, test_cases in module_test_cases.iteritems():
+            if test_cases is None:
+                names.add(module_name)
+            else:
+                names.update("%s.%s" % (test_case['module'], test_case['name']) for test_case in test_cases)
+
+        overrides = dict(bucket_overrides)
+        for test_case_name, override in sorted(bucket_overrides.iteritems()):
+            module_name = test_case_name.rsplit('.', 1)[0]
+            if module_name in module_test_cases and module_test_cases[module_name] is None:
+                overrides.setdefault(module_name, override)
+
+        return assign_buckets(sorted(names), bucket_count, history=self.bucket_history(bucket_overrides), bucket_overrides=overrides)
+
+    def bucket_history(self, bucket_overrides):
+        """Return the run history to balance buckets with, if any.
+
+        Every bucket has to divide the TestCases up the same way, whenever it starts, so a bucket
+        either balances from the history or adds to it, never both.  Given bucket overrides (say,
+        written by --write-bucket-overrides from the history), they're what we go by, TestCases
+        they don't cover are hashed, and we save our run times as usual.  Without them we balance
+        from the history, and leave it as we found it.
+
+        So buckets that only ever balance from the history never refresh it.  To keep it current,
+        bucketed runs should be two steps: write overrides from the history with
+        --write-bucket-overrides, then run every bucket with --bucket-overrides-file.  The buckets
+        then divide the TestCases as the history says, and each saves its run times to it.
+        """
+        if self.history is None or bucket_overrides:
+            return None
+        self.history_frozen = True
+        return self.history
+
+    def select_test_cases(self, test_case_names, bucket=None, bucket_count=None, bucket_overrides={}, buckets=None):
+        """Return those of the named ("module.ClassName") TestCases that this runner should run.
+
+        buckets may map each name to its bucket already, rather than leaving it to assign_buckets.
+        """
+        if bucket is not None and buckets is None:
+            # buckets are balanced using the run history, so every TestCase has to be placed at once
+            buckets = assign_buckets(test_case_names, bucket_count, history=self.bucket_history(bucket_overrides), bucket_overrides=bucket_overrides)
+
+        selected = []
+        for test_case_name in test_case_names:
+            if bucket is None or buckets[test_case_name] == bucket:
+                if not self.module_method_overrides or test_case_name.rsplit('.', 1)[-1] in self.module_method_overrides:
+                    if self.is_affected(test_case_name):
+                        selected.append(test_case_name)
+        return selected
+
+    def find_affected_test_cases(self, diff_filename):
+        """Return the names of the TestCases a unified diff (in diff_filename, or - for stdin) affects, according to our coverage index."""
+        if diff_filename == '-':
+            changed_lines = diff_changed_lines(sys.stdin)
+        else:
+            diff_file = open(diff_filename)
+            try:
+                changed_lines = diff_changed_lines(diff_file)
+            finally:
+                diff_file.close()
+        return self.coverage_index.affected_test_cases(changed_lines)
+
+    def is_affected(self, test_case_name):
+        """Return whether the named TestCase is affected by the diff we were given, if any.
+
+        The index knows nothing about new TestCases, so anything might affect them.
+        """
+        if self.affected_test_case_names is None:
+            return True
+        return test_case_name in self.affected_test_case_names or test_case_name not in self.coverage_index.test_case_names()
+
+    def import_test_cases(self, test_case_descriptions, index=None):
+        """Import and add the TestCase classes described, importing each module only once.
+
+        Returns the descriptions of the TestCases we added.  One that no longer exists is skipped,
+        and (given an index) its module is described afresh, so the next run doesn't look for it.
+        """
+        modules = {}
+        imported = []
+        for test_case in test_case_descriptions:
+            if test_case['module'] not in modules:
+                modules[test_case['module']] = dict(
+                    (test_case_class.__name__, test_case_class) for test_case_class in test_discovery.discover_module(test_case['module']))
+            if test_case['name'] not in modules[test_case['module']]:
+                _log.warning("Indexed TestCase %s.%s no longer exists; skipping it" % (test_case['module'], test_case['name']))
+                source_file = test_discovery.module_source_file(test_case['module'])
+                if index is not None and source_file is not None:
+                    test_discovery.index_module(test_case['module'], source_file, index)
+                    index.save()
+                continue
+            self.add_test_case(modules[test_case['module']][test_case['name']])
+            imported.append(test_case)
+        return imported
+
+    def test_case_names(self):
+        """Return the "module.ClassName" names of the TestCases we've discovered, whether or not they've been imported."""
+        if self.test_case_descriptions is not None:
+            return ["%s.%s" % (test_case['module'], test_case['name']) for test_case in self.test_case_descriptions]
+        return [MetaTestCase._cmp_str(test_case_class) for test_case_class in self.test_case_classes]
 
     def add_test_case(self, module):
+        # build its test method table now, so that the suite index is complete before we start
+        # selecting test methods from it
+        module._test_methods()
         self.test_case_classes.append(module)
 
+    def scheduled_test_case_classes(self):
+        """Return our TestCase classes in the order they should be run."""
+        test_case_classes = self.test_case_classes_by_name()
+        return [test_case_classes[test_case_name] for test_case_name in order_test_cases(
+            [MetaTestCase._cmp_str(test_case_class) for test_case_class in self.test_case_classes],
+            self.test_case_order,
+            history=self.history,
+            seed=self.seed)]
+
+    def test_case_classes_by_name(self):
+        return dict((MetaTestCase._cmp_str(test_case_class), test_case_class) for test_case_class in self.test_case_classes)
+
     def run(self):
         """Instantiate our found test case classes and run their test methods.
 
@@ -92,97 +331,299 @@ class TestRunner(object):
         testing exceptions and summaries printed out.
         """
 
-        results = []
+        if self.sampler is not None:
+            self.sampler.start()
+        results = self.create_results_log()
+        test_case_classes = self.scheduled_test_case_classes()
+        # so each shared fixture is torn down as soon as the last TestCase using it is done
+        for test_case_class in test_case_classes:
+            self.shared_fixtures.expect(test_case_class)
         try:
-            for test_case_class in self.test_case_classes:
-                name_overrides = self.module_method_overrides.setdefault(test_case_class.__name__, None)
-                test_case = test_case_class(
-                    suites_include=self.suites_include,
-                    suites_exclude=self.suites_exclude,
-                    name_overrides=name_overrides)
-                if not any(test_case.runnable_test_methods()):
-                    continue
-
-                # the TestCase on_run_test_method callback calls its registrants with
-                # the test method as the argument.
-                def _log_real_test_method_names(test_method):
-                    """Log the names of test methods before they are executed"""
-                    if not test_case.is_fixture_method(test_method) and not test_case.method_excluded(test_method):
-                        self.logger.report_test_name(test_method)
-
-                test_case.register_callback(test_case.EVENT_ON_RUN_TEST_METHOD, _log_real_test_method_names)
-
-                # The TestCase on_complete_test_method callback calls its registrants
-                # with the result object as the argument.
-                def _append_relevant_results_and_log_relevant_failures(result):
-                    """Log the results of test methods."""
-                    if not test_case.is_fixture_method(result.test_method):
-                        if not test_case.method_excluded(result.test_method):
-                            self.logger.report_test_result(result)
-                        results.append(result)
-                    elif result.test_method._fixture_type == 'class_teardown' and (result.failure or result.error):
-                        # For a class_teardown failure, log the name too (since it wouldn't have 
-                        # already been logged by on_run_test_method).
-                        self.logger.report_test_name(result.test_method)
-                        self.logger.report_test_result(result)
-                        results.append(result)
-                    if not result.success and not TestCase.in_suite(result.test_method, 'expected-failure'):
-                        self.logger.failure(result)
-
-                test_case.register_callback(test_case.EVENT_ON_COMPLETE_TEST_METHOD, _append_relevant_results_and_log_relevant_failures)
-
-                # Now that we are going to run the actually test case, start tracking coverage if requested.
-                if self.coverage:
-                    code_coverage.start(test_case.__class__.__module__ + "." + test_case.__class__.__name__)
-                    
-                # callbacks registered, this will actually run the TestCase's fixture and test methods
-                if self.profile:
-                    cprofile_filename = test_case.__class__.__module__ + "." + test_case.__class__.__name__ + '.cprofile'
-                    cProfile.runctx('test_case.run()', globals(), locals(), cprofile_filename)
-                else:
-                    test_case.run()
-                
-                # Stop tracking and save the coverage info
-                if self.coverage:
-                    code_coverage.stop()
-
+            for test_case_class in test_case_classes:
+                self.run_test_case(test_case_class, results)
         except (KeyboardInterrupt, SystemExit), e:
             # we'll catch and pass a keyboard interrupt so we can cancel in the middle of a run
             # but still get a testing summary.
             pass
+        self.tear_down_shared_fixtures(results)
+        self.save_coverage()
+        self.update_coverage_index()
 
-        # All the TestCases have been run - now collate results by status and log them
-        results_by_status = defaultdict(list)
-        for result in results:
-            if result.success:
-                if result.unexpected_success:
-                    results_by_status['unexpected_success'].append(result)
-                else:
-                    results_by_status['successful'].append(result)
-            elif result.failure or result.error:
-                results_by_status['failed'].append(result)
-            elif result.incomplete:
-                results_by_status['incomplete'].append(result)
+        return self.report_results(results)
+
+    def run_test_case(self, test_case_class, results):
+        """Instantiate and run a single TestCase class, logging as we go and appending its results to results.
+
+        results may be a list or a TestResultLog.
+        """
+        test_case, test_case_failed = self.create_test_case(test_case_class, results)
+        if not any(test_case.runnable_test_methods()):
+            # it won't be needing its shared fixtures, which may leave them unneeded altogether
+            test_case._release_shared_fixtures()
+            return
+
+        # Now that we are going to run the actually test case, start tracking coverage if requested.
+        if self.coverage:
+            import code_coverage
+            code_coverage.start(test_case.__class__.__module__ + "." + test_case.__class__.__name__, self.coverage_source_roots)
+            
+        # callbacks registered, this will actually run the TestCase's fixture and test methods
+        start_time = time.time()
+        self.profile_block('run', (MetaTestCase._cmp_str(test_case_class), 'run'), test_case.run)
+        run_time = time.time() - start_time
+        self.record_test_case(test_case_class, run_time, test_case_failed[0])
+        
+        # Stop tracking and save the coverage info
+        if self.coverage:
+            import code_coverage
+            code_coverage.stop()
+
+    def profile_block(self, section, labels, block_fxn):
+        """Call block_fxn under whichever profilers we have: profiled under section, and with stack samples labelled with labels.
+
+        Discovery is only profiled when profiling by phase.
+        """
+        if self.sampler is not None:
+            sampled_block_fxn = block_fxn
+            block_fxn = lambda: self.sampler.label(labels, sampled_block_fxn)
+        if self.profiler is not None and (self.profiler.by_phase or section != 'discovery'):
+            return self.profiler.profile(section, block_fxn)
+        return block_fxn()
+
+    def wrap_phase(self, result, phase, block_fxn):
+        """A TestCase phase_wrapper, handing each phase to whichever profilers want to know about it."""
+        if self.sampler is not None:
+            sampled_block_fxn = block_fxn
+            block_fxn = lambda: self.sampler.phase_wrapper(result, phase, sampled_block_fxn)
+        if self.profiler is not None and self.profiler.by_phase:
+            return self.profiler.phase_wrapper(result, phase, block_fxn)
+        return block_fxn()
+
+    def create_profiler(self):
+        import profiling
+        return profiling.RunProfiler(by_phase=self.profile_phases)
+
+    def report_profile(self):
+        """Save everything we profiled to one pstats file, and report on the functions that took the most time."""
+        if self.profiler is not None:
+            import profiling
+            self.profiler.save(self.profile_file or profiling.PROFILE_FILE)
+            summary = self.profiler.summary(self.profile_top)
+            if summary is not None:
+                self.logger.report_profile(summary)
+
+    def create_sampler(self):
+        import sampling_profiler
+        return sampling_profiler.SamplingProfiler(self.sampling_interval or sampling_profiler.DEFAULT_INTERVAL)
+
+    def report_sampling(self):
+        """Stop sampling, write out the collapsed stacks sampled, and say what sampling cost."""
+        if self.sampler is not None:
+            import sampling_profiler
+            self.sampler.stop()
+            self.sampler.save(self.sampling_file or sampling_profiler.SAMPLES_FILE)
+            self.logger.report_sampling(self.sampler.overhead())
+
+    def save_coverage(self, suffix=None):
+        """Write out the coverage data collected in this process, if we're collecting any."""
+        if self.coverage:
+            import code_coverage
+            code_coverage.save(self.coverage_data_file(suffix))
+
+    def report_coverage_overhead(self):
+        """Hand our logger what the coverage tracer cost the run, according to the data file we saved."""
+        if self.coverage and os.path.exists(self.coverage_data_file()):
+            import code_coverage
+            overhead = code_coverage.read_overhead(self.coverage_data_file())
+            if overhead is not None:
+                self.logger.report_coverage_overhead(overhead)
+
+    def update_coverage_index(self, contexts=None):
+        """Update our coverage index with the lines each test ran in this process (or in contexts, if given), if we're keeping one."""
+        if self.coverage and self.coverage_index is not None:
+            import code_coverage
+            if contexts is None:
+                contexts = code_coverage.contexts()
+            self.coverage_index.update(contexts, self.test_case_names())
+
+    def switch_coverage_context(self, test_case, test_method=None):
+        """File the coverage collected from now on under the test method about to run, or with none, under its TestCase."""
+        if self.coverage:
+            import code_coverage
+            context = MetaTestCase._cmp_str(type(test_case))
+            if test_method is not None:
+                context += '.' + test_method.__name__
+            code_coverage.switch_context(context)
+
+    def coverage_data_file(self, suffix=None):
+        """Return where coverage data is saved, or with a suffix, where a worker process saves its share."""
+        import code_coverage
+        filename = self.coverage_file or code_coverage.DATA_FILE
+        if suffix is not None:
+            filename = "%s.%s" % (filename, suffix)
+        return filename
+
+    def create_test_case(self, test_case_class, results):
+        """Instantiate test_case_class, with callbacks registered to log its results and append them to results.
+
+        Return the TestCase, and a list whose one item is set to True if any of its results fail unexpectedly.
+        """
+        name_overrides = self.module_method_overrides.setdefault(test_case_class.__name__, None)
+        test_case = test_case_class(
+            suites_include=self.suites_include,
+            suites_exclude=self.suites_exclude,
+            suite_expression=self.suite_expression,
+            name_overrides=name_overrides,
+            timeout=self.timeout,
+            exception_formatter=self.logger.format_exception_info,
+            shared_fixtures=self.shared_fixtures,
+            # a forked test method mustn't inherit our background output thread mid-write
+            before_fork=self.logger.flush,
+            phase_wrapper=self.wrap_phase if self.sampler is not None or (self.profiler is not None and self.profiler.by_phase) else None)
+
+        # the TestCase on_run_test_method callback calls its registrants with
+        # the test method as the argument.
+        def _log_real_test_method_names(test_method):
+            """Log the names of test methods before they are executed"""
+            # test methods only get here if they were selected, so there's no need to check their suites again
+            if not test_case.is_fixture_method(test_method):
+                self.logger.report_test_name(test_method)
+                self.switch_coverage_context(test_case, test_method)
+            else:
+                self.switch_coverage_context(test_case)
+
+        test_case.register_callback(test_case.EVENT_ON_RUN_TEST_METHOD, _log_real_test_method_names)
+
+        # whether any of this TestCase's results failed unexpectedly, for the run history
+        test_case_failed = [False]
+
+        # The TestCase on_complete_test_method callback calls its registrants
+        # with the result object as the argument.
+        def _append_relevant_results_and_log_relevant_failures(result):
+            """Log the results of test methods."""
+            self.record_phase_times(result.phase_times)
+            relevant = False
+            if not test_case.is_fixture_method(result.test_method):
+                self.switch_coverage_context(test_case)
+                self.logger.report_test_result(result)
+                relevant = True
+            elif result.test_method._fixture_type in TEARDOWN_FIXTURE_TYPES and (result.failure or result.error):
+                # For a teardown failure, log the name too (since it wouldn't have
+                # already been logged by on_run_test_method).
+                self.logger.report_test_name(result.test_method, result.start_time)
+                self.logger.report_test_result(result)
+                relevant = True
+            if not result.success and not TestCase.in_suite(result.test_method, 'expected-failure'):
+                self.logger.failure(result)
+
+            # everything that needs the traceback has seen it now
+            result.compact(self.logger.format_exception_info)
+            if relevant:
+                results.append(result)
+                if (result.failure or result.error) and not result.expected_failure:
+                    test_case_failed[0] = True
+
+        test_case.register_callback(test_case.EVENT_ON_COMPLETE_TEST_METHOD, _append_relevant_results_and_log_relevant_failures)
+        return test_case, test_case_failed
+
+    def tear_down_shared_fixtures(self, results):
+        """Tear down the shared fixtures still up at the end of a run, each with the TestCase class that set it up."""
+        for key, test_case_class in self.shared_fixtures.leftovers():
+            test_case, _ = self.create_test_case(test_case_class, results)
+            test_case._tear_down_shared_fixture(key)
+
+    def record_test_case(self, test_case_class, run_time, failed):
+        """Remember how a TestCase went in the run history, if we're keeping one."""
+        if self.history is not None:
+            test_case_name = MetaTestCase._cmp_str(test_case_class)
+            self.history.record_run_time(test_case_name, run_time)
+            self.history.record_failed(test_case_name, failed)
+
+    def record_phase_times(self, phase_times):
+        """Add a result's time in each phase of running a TestCase to the totals for the run."""
+        for phase, phase_time in phase_times.iteritems():
+            self.phase_times[phase] += phase_time
+
+    def create_results_log(self):
+        return TestResultLog(self.results_log_file)
+
+    def report_results(self, results):
+        """Hand the run's failures and counts from a TestResultLog to our logger, close it, and return whether the run succeeded.
+
+        This is also where we save whatever we've recorded in the run history, unless we balanced
+        buckets from it, and where whatever coverage, profiling and sampling cost and found is
+        reported, ahead of the counts.
+        """
+        if self.history is not None:
+            if self.history_frozen:
+                _log.info("not saving run times to %s, since buckets were balanced from it; see --write-bucket-overrides", self.history.filename)
             else:
-                results_by_status['unknown'].append(result)
+                self.history.save()
+
+        try:
+            if self.summary_mode:
+                self.logger.report_failures(results.failed_results(self.test_case_classes_by_name()))
+            self.logger.report_phase_times(self.phase_times)
+            self.report_coverage_overhead()
+            self.report_profile()
+            self.report_sampling()
+            self.logger.report_stats(len(self.test_case_classes), results.counts)
+            # the logger may still be reading failures back from results
+            self.logger.flush()
+        finally:
+            results.close()
+
+        return results.counts.succeeded()
+
+    def report_results_log(self, filename):
+        """Report on the results logged to filename by an earlier run, which may not have finished."""
+        counts = TestResultLog.load(filename)
+        self.logger.report_failures(TestResultLog.failed_results_in(filename))
+        self.logger.report_stats(len(counts.test_cases), counts)
+        self.logger.flush()
+        return counts.succeeded()
+
+    def listable_test_methods(self):
+        """Yield (module, TestCase name, test method name, suites) for each test method we would run.
+
+        When discovery went through the index, this works from the index alone.
+        """
+        if self.test_case_descriptions is not None:
+            suite_index, selected = self.described_suite_index()
+            for test_method_id in sorted(selected):
+                module, test_case_name, test_method_name = suite_index.keys[test_method_id]
+                yield module, test_case_name, test_method_name, set(suite_index.test_method_suites[test_method_id])
+        else:
+            for test_case_class in self.test_case_classes:
+                test_instance = test_case_class(
+                    suites_include=self.suites_include,
+                    suites_exclude=self.suites_exclude,
+                    suite_expression=self.suite_expression)
+                for test_method in test_instance.runnable_test_methods():
+                    yield test_method.__module__, test_method.im_class.__name__, test_method.__name__, test_method._suites
 
-        if self.summary_mode:
-            self.logger.report_failures(results_by_status['failed'])
-        self.logger.report_stats(len(self.test_case_classes), **results_by_status)
+    def described_suite_index(self):
+        """Return a SuiteIndex of the test methods in our TestCase descriptions, and the IDs of the ones we'd run."""
+        suite_index = SuiteIndex()
+        for test_case in self.test_case_descriptions:
+            # the index is JSON, which gives us back unicode
+            module, test_case_name = str(test_case['module']), str(test_case['name'])
+            suite_index.update((module, test_case_name), [
+                ((module, test_case_name, str(test_method_name)), [str(suite_name) for suite_name in suites])
+                for test_method_name, suites in sorted(test_case['test_methods'].iteritems())])
+        return suite_index, suite_index.select(self.suites_include, self.suites_exclude, self.suite_expression)
 
-        return bool((len(results_by_status['failed']) + len(results_by_status['unknown'])) == 0)
-    
     def list_suites(self):
         """List the suites represented by this TestRunner's tests."""
-        suites = defaultdict(list)
-        for test_case_class in self.test_case_classes:
-            test_instance = test_case_class(
-                suites_include=self.suites_include,
-                suites_exclude=self.suites_exclude)
-            for test_method in test_instance.runnable_test_methods():
-                for suite_name in test_method._suites:
-                    suites[suite_name].append(test_method)
-        suite_counts = dict((suite_name, "%d tests" % len(suite_members)) for suite_name, suite_members in suites.iteritems())
+        if self.test_case_descriptions is not None:
+            suite_index, selected = self.described_suite_index()
+            suite_counts = suite_index.counts(selected)
+        else:
+            suite_counts = defaultdict(int)
+            for module, test_case_name, test_method_name, test_method_suites in self.listable_test_methods():
+                for suite_name in test_method_suites:
+                    suite_counts[suite_name] += 1
+        suite_counts = dict((suite_name, "%d tests" % count) for suite_name, count in suite_counts.iteritems())
 
         pp = pprint.PrettyPrinter(indent=2)
         print(pp.pformat(dict(suite_counts)))
@@ -190,13 +631,9 @@ class TestRunner(object):
     def list_tests(self, selected_suite_name=None):
         """Lists all tests, optionally scoped to a single suite."""
         test_list = []
-        for test_case_class in self.test_case_classes:
-            test_instance = test_case_class(
-                suites_include=self.suites_include,
-                suites_exclude=self.suites_exclude)
-            for test_method in test_instance.runnable_test_methods():
-                if not selected_suite_name or TestCase.in_suite(test_method, selected_suite_name):
-                    test_list.append(test_method)
+        for module, test_case_name, test_method_name, test_method_suites in self.listable_test_methods():
+            if not selected_suite_name or selected_suite_name in test_method_suites:
+                test_list.append('%s %s.%s' % (module, test_case_name, test_method_name))
 
         pp = pprint.PrettyPrinter(indent=2)
-        print(pp.pformat([self.get_test_method_name(test) for test in test_list]))
+        print(pp.pformat(test_list))
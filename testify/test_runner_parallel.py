@@ -0,0 +1,221 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the ParallelTestRunner class, which runs TestCases in a pool of worker processes."""
+__testify = 1
+
+import multiprocessing
+import os
+import Queue
+import time
+
+from test_case import MetaTestCase
+from test_logger import _log, TestLoggerBase
+from test_result import RemoteTestMethod, TestResult
+from test_runner import TestRunner
+
+class ForwardingTestLogger(TestLoggerBase):
+    """A TestLogger for worker processes.
+
+    Rather than writing anything itself, it ships each event to the process that owns the real
+    logger.  send_event is called with the name of the logger method to call over there and a
+    picklable payload.
+    """
+
+    def __init__(self, verbosity, send_event, traceback_formater):
+        super(ForwardingTestLogger, self).__init__(verbosity)
+        self.send_event = send_event
+        # format exceptions the same way the real logger would have
+        self.traceback_formater = traceback_formater
+
+    def report_test_name(self, test_method, start_time=None):
+        self.send_event('report_test_name', (RemoteTestMethod.describe(test_method), start_time if start_time is not None else time.time()))
+
+    def report_test_result(self, result):
+        self.send_event('report_test_result', self._result_to_dict(result))
+
+    def failure(self, result):
+        self.send_event('failure', self._result_to_dict(result))
+
+    def _result_to_dict(self, result):
+        formatted_exception_info = None
+        if result.exception_info is not None:
+            formatted_exception_info = self._format_result_exception_info(result)
+        return result.to_dict(formatted_exception_info)
+
+class ParallelTestRunner(TestRunner):
+    """A TestRunner that farms its TestCases out to a pool of worker processes.
+
+    Workers are forked after discovery, so every TestCase class is already imported in them.  Each
+    worker pulls class names off a shared queue, runs them, and streams its logger events back to
+    this process, which does all the reporting just as TestRunner.run would.
+    """
+
+    # how long to block waiting on a worker event before checking that the workers are still alive
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, *args, **kwargs):
+        self.processes = kwargs.pop('processes', 1)
+        super(ParallelTestRunner, self).__init__(*args, **kwargs)
+        self._pending_test_names = {}
+        self.workers_lost = False
+        # set in worker processes, which ship everything back to the parent
+        self.send_event = None
+
+    def run(self):
+        tasks = multiprocessing.Queue()
+        events = multiprocessing.Queue()
+        for test_case_class in self.scheduled_test_case_classes():
+            tasks.put(MetaTestCase._cmp_str(test_case_class))
+
+        workers = []
+        for worker_id in range(self.processes):
+            # one sentinel per worker, so each of them knows when to stop
+            tasks.put(None)
+            worker = multiprocessing.Process(target=self._run_worker_process, args=(worker_id, tasks, events))
+            worker.start()
+            workers.append(worker)
+
+        results = self.create_results_log()
+        try:
+            self.collect_events(events, results, workers)
+        except (KeyboardInterrupt, SystemExit), e:
+            # as in TestRunner.run, an interrupted run still gets a summary
+            pass
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        self.merge_worker_coverage([self.coverage_data_file(worker.pid) for worker in workers])
+
+        return self.report_results(results) and not self.workers_lost
+
+    def _run_worker_process(self, worker_id, tasks, events):
+        self.run_worker(tasks.get, lambda event, payload: events.put((worker_id, event, payload)))
+
+    def run_worker(self, get_test_case_name, send_event):
+        """Run TestCases by name until get_test_case_name returns None, shipping logger events through send_event."""
+        test_case_classes = self.test_case_classes_by_name()
+        self.send_event = send_event
+        self.logger = ForwardingTestLogger(self.verbosity, send_event, self.logger.traceback_formater)
+        if self.profiler is not None:
+            # start afresh, rather than with whatever was profiled before we were forked
+            self.profiler = self.create_profiler()
+        if self.sampler is not None:
+            # and we'd only be counting the parent's samples twice
+            self.sampler = self.create_sampler()
+            self.sampler.start()
+        try:
+            while True:
+                test_case_name = get_test_case_name()
+                if test_case_name is None:
+                    break
+                if test_case_name not in test_case_classes:
+                    raise ValueError("Unknown TestCase %s: was this worker pointed at the same tests?" % test_case_name)
+                self.run_test_case(test_case_classes[test_case_name], [])
+        except (KeyboardInterrupt, SystemExit), e:
+            pass
+        # we don't know which TestCases we'll be given, so shared fixtures stay up until we're done
+        self.tear_down_shared_fixtures([])
+        self.save_coverage(suffix=os.getpid())
+        self.update_coverage_index()
+        coverage_file = None
+        if self.coverage:
+            coverage_file = os.path.abspath(self.coverage_data_file(os.getpid()))
+        if self.profiler is not None:
+            send_event('record_profile', self.profiler.stats_by_section())
+        if self.sampler is not None:
+            self.sampler.stop()
+            send_event('record_samples', self.sampler.summary())
+        send_event('done', coverage_file)
+
+    def merge_worker_coverage(self, worker_coverage_files):
+        """Merge the coverage data files our workers saved into ours, and remove them."""
+        if not self.coverage:
+            return
+        import code_coverage
+        worker_coverage_files = [filename for filename in worker_coverage_files if os.path.exists(filename)]
+        code_coverage.merge(self.coverage_data_file(), worker_coverage_files)
+        for filename in worker_coverage_files:
+            os.unlink(filename)
+
+    def record_test_case(self, test_case_class, run_time, failed):
+        if self.send_event is not None:
+            self.send_event('record_test_case', (MetaTestCase._cmp_str(test_case_class), run_time, failed))
+        else:
+            super(ParallelTestRunner, self).record_test_case(test_case_class, run_time, failed)
+
+    def record_phase_times(self, phase_times):
+        if self.send_event is not None:
+            self.send_event('record_phase_times', phase_times)
+        else:
+            super(ParallelTestRunner, self).record_phase_times(phase_times)
+
+    def collect_events(self, events, results, workers):
+        """Hand worker events to our logger until every worker is done."""
+        test_case_classes = self.test_case_classes_by_name()
+        finished = set()
+        while not self.workers_finished(workers, finished):
+            try:
+                worker_id, event, payload = events.get(timeout=self.POLL_INTERVAL)
+            except Queue.Empty:
+                self.check_workers(workers, finished)
+                continue
+
+            if event == 'done':
+                finished.add(worker_id)
+            else:
+                self.handle_event(worker_id, event, payload, test_case_classes, results)
+
+    def workers_finished(self, workers, finished):
+        return len(finished) == len(workers)
+
+    def check_workers(self, workers, finished):
+        """Notice workers that died before finishing their share of the work."""
+        for worker_id, worker in enumerate(workers):
+            # a worker that exited cleanly has already queued its 'done'
+            if worker_id not in finished and not worker.is_alive() and worker.exitcode != 0:
+                _log.error("worker %d died with exit code %s", worker_id, worker.exitcode)
+                finished.add(worker_id)
+                self.workers_lost = True
+
+    def handle_event(self, worker_id, event, payload, test_case_classes, results):
+        """Replay a single logger event shipped from a worker against our real logger."""
+        if event == 'report_test_name':
+            # In verbose mode a test's name and result share a line of output, so hold on to the
+            # name until its result arrives rather than let other workers' output land in between.
+            description, start_time = payload
+            self._pending_test_names[worker_id] = (RemoteTestMethod.from_description(description, test_case_classes), start_time)
+        elif event == 'report_test_result':
+            result = TestResult.from_dict(payload, test_case_classes)
+            pending_test_name = self._pending_test_names.pop(worker_id, None)
+            if pending_test_name is not None:
+                self.logger.report_test_name(*pending_test_name)
+            self.logger.report_test_result(result)
+            results.append(result)
+        elif event == 'failure':
+            self.logger.failure(TestResult.from_dict(payload, test_case_classes))
+        elif event == 'record_test_case':
+            test_case_name, run_time, failed = payload
+            self.record_test_case(test_case_classes[test_case_name], run_time, failed)
+        elif event == 'record_phase_times':
+            self.record_phase_times(payload)
+        elif event == 'record_profile':
+            self.profiler.add_shipped_stats(payload)
+        elif event == 'record_samples':
+            self.sampler.add_shipped_samples(payload)
+        else:
+            raise ValueError("Invalid worker event: %s" % event)
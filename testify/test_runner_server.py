@@ -0,0 +1,240 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""This module contains the TestRunnerServer and TestRunnerClient classes.
+
+Rather than statically splitting TestCases into buckets, a server owns the queue of discovered
+TestCases and any number of clients (separate testify processes pointed at the same tests) pull
+from it over a local socket until it's empty.  Clients ship their results back, and the server
+produces a single report for the whole run.
+
+Everything sent over the socket is pickled, so whoever can connect to it can run code in the server.
+A unix socket is only open to its owner, and a TCP socket needs both ends to share an authkey (from
+$TESTIFY_AUTHKEY), which connections must present.  A server on TCP without one makes one up, and
+logs it for its clients.
+"""
+__testify = 1
+
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+import os
+import Queue
+import threading
+import time
+
+from test_case import MetaTestCase
+from test_logger import _log
+from test_runner_parallel import ParallelTestRunner
+
+# the environment variable holding the key servers and clients authenticate each other with
+AUTHKEY_ENVIRONMENT_VARIABLE = 'TESTIFY_AUTHKEY'
+
+LOOPBACK_HOST = '127.0.0.1'
+
+def get_authkey():
+    """Return the authkey set in the environment, or None."""
+    return os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE) or None
+
+def parse_address(address):
+    """Turn a command line address into one for multiprocessing.connection.
+
+    'host:port' means a TCP socket, and ':port' or a bare port a TCP socket on the loopback
+    interface; anything else is taken to be the path of a unix socket.
+    """
+    if address.isdigit():
+        return (LOOPBACK_HOST, int(address))
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return (host or LOOPBACK_HOST, int(port))
+    return address
+
+class TestRunnerServer(ParallelTestRunner):
+    """Hands out discovered TestCases to connecting TestRunnerClients and reports on their results."""
+
+    # how long to wait for a client to take TestCases requeued from a lost one, once every other client is done
+    REQUEUE_TIMEOUT = 60.0
+
+    def __init__(self, *args, **kwargs):
+        self.address = parse_address(kwargs.pop('address'))
+        self.authkey = kwargs.pop('authkey', None)
+        if self.authkey is None and isinstance(self.address, tuple):
+            # even on the loopback interface, anyone on this machine could connect
+            self.authkey = os.urandom(16).encode('hex')
+            _log.warning("serving on TCP without $%s set; run clients with %s=%s",
+                AUTHKEY_ENVIRONMENT_VARIABLE, AUTHKEY_ENVIRONMENT_VARIABLE, self.authkey)
+        super(TestRunnerServer, self).__init__(*args, **kwargs)
+        self.clients = set()
+        # the coverage data files clients have told us they saved
+        self.client_coverage_files = []
+        # clients are added on the accepting thread while the main thread checks on them
+        self.clients_lock = threading.Lock()
+        # when TestCases were last requeued with no client left to take them, if they still haven't been
+        self._requeued_at = None
+
+    def run(self):
+        self.tasks = Queue.Queue()
+        for test_case_class in self.scheduled_test_case_classes():
+            self.tasks.put(MetaTestCase._cmp_str(test_case_class))
+
+        events = Queue.Queue()
+        # a unix socket is created with our umask; only we should be able to connect to it
+        old_umask = os.umask(0077)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(old_umask)
+        _log.info("serving %d test cases on %s", len(self.test_case_classes), listener.address)
+
+        accept_thread = threading.Thread(target=self._accept_clients, args=(listener, events))
+        accept_thread.setDaemon(True)
+        accept_thread.start()
+
+        results = self.create_results_log()
+        try:
+            self.collect_events(events, results, self.clients)
+        except (KeyboardInterrupt, SystemExit), e:
+            pass
+        listener.close()
+        self.merge_worker_coverage(self.client_coverage_files)
+        if self.coverage and self.coverage_index is not None:
+            # our clients may not have been keeping the index themselves
+            import code_coverage
+            self.update_coverage_index(code_coverage.read_data_file(self.coverage_data_file()))
+
+        return self.report_results(results) and not self.workers_lost
+
+    def _accept_clients(self, listener, events):
+        client_id = 0
+        while True:
+            try:
+                connection = listener.accept()
+            except multiprocessing.AuthenticationError, e:
+                _log.error("refused a client: %s", e)
+                continue
+            except (EOFError, IOError):
+                # the listener was closed out from under us at the end of the run
+                return
+            self.clients_lock.acquire()
+            try:
+                self.clients.add(client_id)
+            finally:
+                self.clients_lock.release()
+            client_thread = threading.Thread(target=self._serve_client, args=(client_id, connection, events))
+            client_thread.setDaemon(True)
+            client_thread.start()
+            client_id += 1
+
+    def _serve_client(self, client_id, connection, events):
+        """Answer one client's requests for work, passing along its logger events until it's done."""
+        # the TestCase the client is running: the last one we handed it, until it asks for another
+        current_test_case_name = None
+        try:
+            try:
+                while True:
+                    event, payload = connection.recv()
+                    if event == 'get_test_case':
+                        try:
+                            current_test_case_name = self.tasks.get_nowait()
+                        except Queue.Empty:
+                            current_test_case_name = None
+                        connection.send(current_test_case_name)
+                    else:
+                        if event == 'done' and payload is not None:
+                            # where the client saved its coverage data, for us to merge once everyone's done
+                            self.client_coverage_files.append(payload)
+                        if event == 'done':
+                            # acknowledge it first: once it's queued, we may report and exit at any moment
+                            connection.send('done')
+                        events.put((client_id, event, payload))
+                        if event == 'done':
+                            return
+            except (EOFError, IOError):
+                _log.error("client %d went away before finishing its test cases", client_id)
+                self.workers_lost = True
+                if current_test_case_name is not None:
+                    # Give it to another client.  Whatever results this one sent for it still
+                    # count, so the run fails either way, but the TestCase doesn't go unrun.
+                    # (It has to be back on the queue before we say this client is done.)
+                    _log.error("requeueing %s", current_test_case_name)
+                    self.tasks.put(current_test_case_name)
+                events.put((client_id, 'done', None))
+        finally:
+            connection.close()
+
+    def workers_finished(self, clients, finished):
+        # Nothing is finished until every TestCase has been handed out, and every client that
+        # took one has told us it's done.
+        self.clients_lock.acquire()
+        try:
+            clients = set(clients)
+        finally:
+            self.clients_lock.release()
+        return self.tasks.empty() and clients.issubset(finished)
+
+    def check_workers(self, clients, finished):
+        # Client threads notice disconnects themselves, but if the last clients were lost, or the
+        # others finished before their TestCases were requeued, we may be left waiting for a client
+        # that never comes.  Give up on those TestCases rather than hang.
+        if not self.workers_lost or self.tasks.empty():
+            self._requeued_at = None
+            return
+        self.clients_lock.acquire()
+        try:
+            clients = set(clients)
+        finally:
+            self.clients_lock.release()
+        if not clients.issubset(finished):
+            self._requeued_at = None
+        elif self._requeued_at is None:
+            self._requeued_at = time.time()
+        elif time.time() - self._requeued_at > self.REQUEUE_TIMEOUT:
+            while not self.tasks.empty():
+                _log.error("giving up on %s: no client came to run it in %gs", self.tasks.get_nowait(), self.REQUEUE_TIMEOUT)
+
+class TestRunnerClient(ParallelTestRunner):
+    """Runs TestCases handed out by a TestRunnerServer, sending all results back to it."""
+
+    def __init__(self, *args, **kwargs):
+        self.address = parse_address(kwargs.pop('address'))
+        self.authkey = kwargs.pop('authkey', None)
+        super(TestRunnerClient, self).__init__(*args, **kwargs)
+
+    def run(self):
+        try:
+            connection = Client(self.address, authkey=self.authkey)
+        except (EnvironmentError, multiprocessing.AuthenticationError), e:
+            _log.error("couldn't connect to the server on %s: %s", self.address, e)
+            return False
+
+        def get_test_case_name():
+            connection.send(('get_test_case', None))
+            return connection.recv()
+
+        acknowledged = []
+        def send_event(event, payload):
+            connection.send((event, payload))
+            if event == 'done':
+                acknowledged.append(connection.recv())
+
+        try:
+            try:
+                self.run_worker(get_test_case_name, send_event)
+            except (EOFError, EnvironmentError), e:
+                _log.error("lost the server on %s: %s", self.address, e)
+        finally:
+            connection.close()
+
+        # the server reports on the run as a whole; all we can say is whether it heard from us
+        return bool(acknowledged)
@@ -0,0 +1,55 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Helpers for JSON files that several testify processes may be reading and updating at once."""
+
+import fcntl
+import json
+import os
+import tempfile
+
+def load_json_file(filename, default):
+    """Return the contents of a JSON file, or default if it doesn't exist yet."""
+    if not os.path.exists(filename):
+        return default
+    json_file = open(filename)
+    try:
+        return json.load(json_file)
+    finally:
+        json_file.close()
+
+def update_json_file(filename, update, default):
+    """Apply update to the current contents of a JSON file and write the result back.
+
+    Updates are serialized with a lock file, so concurrent updates are merged rather than lost, and
+    the new contents are written to a temporary file and renamed into place, so readers never see
+    a half-written file.  Returns the updated contents.
+    """
+    lock_file = open(filename + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        contents = load_json_file(filename, default)
+        update(contents)
+
+        fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+        temp_file = os.fdopen(fd, 'w')
+        try:
+            json.dump(contents, temp_file, indent=1, sort_keys=True)
+        finally:
+            temp_file.close()
+        os.rename(temp_filename, filename)
+        return contents
+    finally:
+        lock_file.close()
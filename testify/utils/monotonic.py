@@ -0,0 +1,67 @@
+# Copyright 2009 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""A monotonic clock, for timing things without being thrown off by the system clock being set.
+
+Python 2 doesn't come with one, so on Linux we call clock_gettime(CLOCK_MONOTONIC) through ctypes.
+Elsewhere, or if that isn't available, monotonic() falls back to time.time().
+
+Everything we'd import testify for uses this, so the clock isn't looked up until the first call:
+even importing ctypes takes a while.
+"""
+
+import os
+import sys
+import time
+
+CLOCK_MONOTONIC = 1 # from <linux/time.h>
+
+# The libraries clock_gettime may be in (librt, before glibc 2.17).  We name them outright, because
+# ctypes.util.find_library runs ldconfig, or even gcc, to find them.
+CLOCK_GETTIME_LIBRARIES = ('librt.so.1', 'libc.so.6')
+
+def _find_clock():
+    """Return a function reading CLOCK_MONOTONIC in seconds, or None if we can't call clock_gettime."""
+    if not sys.platform.startswith('linux'):
+        return None
+    import ctypes
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    for library in CLOCK_GETTIME_LIBRARIES:
+        try:
+            clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+
+        def read_clock():
+            value = timespec()
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(value)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return value.tv_sec + value.tv_nsec / 1000000000.0
+        return read_clock
+    return None
+
+# set by the first call to monotonic()
+_clock = None
+
+def monotonic():
+    """Return the time in seconds, as a float, from a clock that never goes backwards."""
+    global _clock
+    if _clock is None:
+        _clock = _find_clock() or time.time
+    return _clock()